@@ -10,6 +10,8 @@ from mongoengine.errors import DoesNotExist, ValidationError
 from .models import CalibrationTest
 from authentication.decorators import any_authenticated_user
 from lims_backend.utilities.pagination import get_pagination_params, create_pagination_response, paginate_queryset
+from lims_backend.utilities.due_dates import DUE_SOON_DAYS, due_window, in_order, refresh_due_item
+from lims_backend.utilities.aggregation import facet_count
 
 
 def safe_datetime_format(dt_value):
@@ -175,6 +177,7 @@ def calibration_test_list(request):
                 updated_by=data.get('updated_by', data['created_by'])
             )
             calibration_test.save()
+            refresh_due_item('calibration_test', calibration_test.id)
             
             return JsonResponse({
                 'status': 'success',
@@ -303,6 +306,7 @@ def calibration_test_detail(request, test_id):
                 if update_doc:
                     test.update(**update_doc)
                     test.reload()
+                    refresh_due_item('calibration_test', test.id)
                 
                 return JsonResponse({
                     'status': 'success',
@@ -340,6 +344,7 @@ def calibration_test_detail(request, test_id):
         elif request.method == 'DELETE':
             # Soft delete
             test.update(is_active=False)
+            refresh_due_item('calibration_test', test.id)
             
             return JsonResponse({
                 'status': 'success',
@@ -485,35 +490,48 @@ def calibration_test_stats(request):
     GET: Returns statistics about calibration tests
     """
     try:
-        # Get basic counts
-        total_tests = CalibrationTest.objects(is_active=True).count()
-        
-        # Get overdue calibrations
-        overdue_tests = CalibrationTest.objects(
-            is_active=True,
-            calibration_due_date__lt=datetime.now()
-        ).count()
-        
-        # Get calibrations due in next 30 days
-        next_30_days = datetime.now() + timedelta(days=30)
-        due_soon_tests = CalibrationTest.objects(
-            is_active=True,
-            calibration_due_date__lte=next_30_days,
-            calibration_due_date__gte=datetime.now()
-        ).count()
-        
-        # Get calibrations done in last 30 days
-        last_30_days = datetime.now() - timedelta(days=30)
-        recent_calibrations = CalibrationTest.objects(
-            is_active=True,
-            calibration_date__gte=last_30_days
-        ).count()
-        
-        # Get unique vendors count
-        unique_vendors = len(CalibrationTest.objects(is_active=True).distinct('calibration_vendor'))
-        
-        # Get unique equipment count
-        unique_equipment = len(CalibrationTest.objects(is_active=True).distinct('equipment_serial'))
+        now = datetime.now()
+        
+        # All counts of active calibration tests in one aggregation
+        facets = next(CalibrationTest.objects(is_active=True).aggregate([
+            {
+                '$facet': {
+                    'total': [{'$count': 'count'}],
+                    'overdue': [
+                        {'$match': {'calibration_due_date': {'$lt': now}}},
+                        {'$count': 'count'}
+                    ],
+                    # Due in the next 30 days
+                    'due_soon': [
+                        {'$match': {'calibration_due_date': {'$gte': now, '$lte': now + timedelta(days=DUE_SOON_DAYS)}}},
+                        {'$count': 'count'}
+                    ],
+                    # Calibrated in the last 30 days
+                    'recent': [
+                        {'$match': {'calibration_date': {'$gte': now - timedelta(days=30)}}},
+                        {'$count': 'count'}
+                    ],
+                    # Missing/empty values are not a vendor or piece of equipment
+                    'vendors': [
+                        {'$match': {'calibration_vendor': {'$nin': [None, '']}}},
+                        {'$group': {'_id': '$calibration_vendor'}},
+                        {'$count': 'count'}
+                    ],
+                    'equipment': [
+                        {'$match': {'equipment_serial': {'$nin': [None, '']}}},
+                        {'$group': {'_id': '$equipment_serial'}},
+                        {'$count': 'count'}
+                    ]
+                }
+            }
+        ]), {})
+        
+        total_tests = facet_count(facets, 'total')
+        overdue_tests = facet_count(facets, 'overdue')
+        due_soon_tests = facet_count(facets, 'due_soon')
+        recent_calibrations = facet_count(facets, 'recent')
+        unique_vendors = facet_count(facets, 'vendors')
+        unique_equipment = facet_count(facets, 'equipment')
         
         return JsonResponse({
             'status': 'success',
@@ -547,14 +565,9 @@ def calibration_test_overdue(request):
         # Get pagination parameters
         page, limit, offset = get_pagination_params(request)
         
-        # Get overdue tests
-        query = {
-            'is_active': True,
-            'calibration_due_date__lt': datetime.now()
-        }
-        
-        calibration_tests_queryset = CalibrationTest.objects(**query).order_by('calibration_due_date')
-        paginated_tests, total_records = paginate_queryset(calibration_tests_queryset, page, limit)
+        # Get overdue tests from the due items, then load the page
+        test_ids, total_records = due_window('calibration_test', due_before=datetime.now(), offset=offset, limit=limit)
+        paginated_tests = in_order(CalibrationTest.objects(id__in=test_ids), test_ids)
         
         data = []
         for test in paginated_tests:
@@ -597,16 +610,12 @@ def calibration_test_due_soon(request):
         # Get pagination parameters
         page, limit, offset = get_pagination_params(request)
         
-        # Get tests due soon
-        next_30_days = datetime.now() + timedelta(days=30)
-        query = {
-            'is_active': True,
-            'calibration_due_date__lte': next_30_days,
-            'calibration_due_date__gte': datetime.now()
-        }
-        
-        calibration_tests_queryset = CalibrationTest.objects(**query).order_by('calibration_due_date')
-        paginated_tests, total_records = paginate_queryset(calibration_tests_queryset, page, limit)
+        # Get tests due soon from the due items, then load the page
+        now = datetime.now()
+        test_ids, total_records = due_window(
+            'calibration_test', due_from=now, due_through=now + timedelta(days=DUE_SOON_DAYS), offset=offset, limit=limit
+        )
+        paginated_tests = in_order(CalibrationTest.objects(id__in=test_ids), test_ids)
         
         data = []
         for test in paginated_tests:
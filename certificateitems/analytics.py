@@ -0,0 +1,375 @@
+"""
+Columnar test result analytics
+
+Numeric test values are extracted once per certificate item and stored in the
+test_result_columns collection as row-aligned arrays, one document per
+(test method, certificate item). Each worker keeps a NumPy copy of the
+columns per test method and extends it incrementally: only documents updated
+since the last load are fetched, new rows are appended and replaced rows
+masked out. updated_at is set by the server ($currentDate) and the last
+WATERMARK_WINDOW before the watermark is re-read, so writes committed out of
+order are not missed. Statistics are computed with vectorized NumPy
+operations over the cached arrays.
+"""
+
+import re
+import threading
+from datetime import timedelta
+
+from bson import ObjectId
+from mongoengine import connection
+
+try:
+    import numpy as np
+except ImportError:  # NumPy not installed: analytics endpoint is disabled
+    np = None
+
+from .models import TestResultColumns
+from .test_results import parse_test_results, rows_from_parsed
+
+
+GROUP_BY_FIELDS = ('material_grade', 'heat_no', 'equipment_name')
+PERCENTILES = (5, 25, 50, 75, 95)
+SAMPLE_ID_COLUMN = 'Sample ID'
+
+# Documents re-read before the watermark on every incremental load
+WATERMARK_WINDOW = timedelta(minutes=1)
+# Rebuild a cached frame once masked-out rows outnumber live rows
+COMPACT_MIN_DEAD_ROWS = 1000
+
+NUMBER_PATTERN = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+_column_cache = {}
+_cache_lock = threading.Lock()
+
+
+def parse_numeric(value):
+    """
+    Extract a number from a test value ('512', '512 MPa', '1,204.5', 48.2)
+    Returns: float or None
+    """
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = NUMBER_PATTERN.search(str(value).replace(',', ''))
+    if not match:
+        return None
+    try:
+        return float(match.group(0))
+    except ValueError:
+        return None
+
+
+def _section_rows(section):
+    parsed = section.get('parsed_test_results')
+    if parsed is not None and section.get('test_results_summary'):
+        return rows_from_parsed(parsed)
+    return parse_test_results(section.get('test_results', '[]')) or []
+
+
+def resolve_specimen_test_methods(db, item_doc):
+    """
+    Map each specimen of a certificate item to the test method it was prepared for
+    (certificate -> sample preparation -> sample lots)
+    Returns: dict specimen ObjectId -> test method ObjectId
+    """
+    specimen_oids = [section.get('specimen_id') for section in item_doc.get('specimen_sections', []) if section.get('specimen_id')]
+    if not specimen_oids:
+        return {}
+
+    sample_prep_docs = []
+    cert_doc = db.complete_certificates.find_one({'_id': item_doc.get('certificate_id')}, {'request_id': 1})
+    if cert_doc and cert_doc.get('request_id'):
+        sample_prep_doc = db.sample_preparations.find_one({'_id': cert_doc['request_id']}, {'sample_lots': 1})
+        if sample_prep_doc:
+            sample_prep_docs.append(sample_prep_doc)
+
+    mapping = {}
+    for sample_prep_doc in sample_prep_docs:
+        for sample_lot in sample_prep_doc.get('sample_lots', []):
+            for specimen_oid in sample_lot.get('specimen_oids', []):
+                mapping.setdefault(specimen_oid, sample_lot.get('test_method_oid'))
+
+    # Specimens not listed on the certificate's own request
+    missing = [oid for oid in specimen_oids if oid not in mapping]
+    if missing:
+        for sample_prep_doc in db.sample_preparations.find({'sample_lots.specimen_oids': {'$in': missing}}, {'sample_lots': 1}):
+            for sample_lot in sample_prep_doc.get('sample_lots', []):
+                for specimen_oid in sample_lot.get('specimen_oids', []):
+                    if specimen_oid in missing:
+                        mapping.setdefault(specimen_oid, sample_lot.get('test_method_oid'))
+
+    return {oid: test_method_oid for oid, test_method_oid in mapping.items() if test_method_oid}
+
+
+def build_item_column_blocks(db, item_doc):
+    """
+    Extract numeric columns of a certificate item, grouped by test method
+    Returns: dict test method ObjectId -> block (row-aligned arrays)
+    """
+    test_methods = resolve_specimen_test_methods(db, item_doc)
+    blocks = {}
+
+    for section in item_doc.get('specimen_sections', []):
+        test_method_oid = test_methods.get(section.get('specimen_id'))
+        if not test_method_oid:
+            continue
+
+        block = blocks.setdefault(test_method_oid, {'sample_ids': [], 'equipment': [], 'columns': {}})
+        equipment = section.get('equipment_name') or item_doc.get('equipment_name') or ''
+
+        for row in _section_rows(section):
+            row_index = len(block['sample_ids'])
+            block['sample_ids'].append(str(row.get(SAMPLE_ID_COLUMN, '')))
+            block['equipment'].append(str(equipment))
+            for name, value in row.items():
+                if name == SAMPLE_ID_COLUMN:
+                    continue
+                number = parse_numeric(value)
+                if number is None:
+                    continue
+                values = block['columns'].setdefault(str(name), [])
+                # Pad columns missing from earlier rows
+                values.extend([None] * (row_index - len(values)))
+                values.append(number)
+
+    for block in blocks.values():
+        row_count = len(block['sample_ids'])
+        block['row_count'] = row_count
+        block['columns'] = [
+            {'name': name, 'values': values + [None] * (row_count - len(values))}
+            for name, values in block['columns'].items()
+        ]
+    return blocks
+
+
+def refresh_item_columns(item_id, db=None):
+    """
+    Rewrite the numeric column documents of one certificate item
+    Deleted/inactive items (or test methods the item no longer uses) are kept as
+    inactive tombstones so cached workers drop them on their next incremental load.
+    Never raises, so callers can use it after a successful write.
+    """
+    try:
+        db = db or connection.get_db()
+        item_oid = item_id if isinstance(item_id, ObjectId) else ObjectId(item_id)
+        item_doc = db.certificate_items.find_one({'_id': item_oid})
+        collection = TestResultColumns._get_collection()
+
+        blocks = {}
+        if item_doc and item_doc.get('is_active', True) is not False:
+            blocks = build_item_column_blocks(db, item_doc)
+
+        for test_method_oid, block in blocks.items():
+            collection.update_one(
+                {'test_method_oid': test_method_oid, 'certificate_item_id': item_oid},
+                {'$set': {
+                    'certificate_id': item_doc.get('certificate_id'),
+                    'material_grade': item_doc.get('material_grade') or '',
+                    'heat_no': item_doc.get('heat_no') or '',
+                    'sample_ids': block['sample_ids'],
+                    'equipment': block['equipment'],
+                    'columns': block['columns'],
+                    'row_count': block['row_count'],
+                    'is_active': True
+                }, '$currentDate': {'updated_at': True}},
+                upsert=True
+            )
+
+        collection.update_many(
+            {'certificate_item_id': item_oid, 'test_method_oid': {'$nin': list(blocks.keys())}, 'is_active': True},
+            {'$set': {'is_active': False, 'columns': [], 'sample_ids': [], 'equipment': [], 'row_count': 0},
+             '$currentDate': {'updated_at': True}}
+        )
+        return len(blocks)
+    except Exception as e:
+        print(f"Error refreshing test result columns for item {item_id}: {e}")
+        return 0
+
+
+def _empty_frame():
+    return {
+        'row_count': 0,
+        'live': np.zeros(0, dtype=bool),
+        'columns': {},
+        'dimensions': {field: np.array([], dtype=str) for field in GROUP_BY_FIELDS},
+        'spans': {}
+    }
+
+
+def _append_blocks(frame, blocks):
+    """
+    New frame with the rows of blocks (item ObjectId -> block) appended
+    Existing arrays are not modified, so readers of the previous frame are unaffected.
+    """
+    blocks = {item_oid: block for item_oid, block in blocks.items() if block.get('row_count')}
+    added = sum(block['row_count'] for block in blocks.values())
+    if not added:
+        return frame
+
+    offset = frame['row_count']
+    total = offset + added
+    columns = {name: np.concatenate([values, np.full(added, np.nan)]) for name, values in frame['columns'].items()}
+    spans = dict(frame['spans'])
+    material_grade = []
+    heat_no = []
+    equipment = []
+
+    for item_oid, block in blocks.items():
+        row_count = block['row_count']
+        for column in block.get('columns', []):
+            values = columns.setdefault(column['name'], np.full(total, np.nan))
+            values[offset:offset + row_count] = np.array(
+                [np.nan if value is None else value for value in column['values']], dtype=float
+            )
+        material_grade.extend([block.get('material_grade') or ''] * row_count)
+        heat_no.extend([block.get('heat_no') or ''] * row_count)
+        equipment.extend(block.get('equipment') or [''] * row_count)
+        spans[item_oid] = (offset, offset + row_count)
+        offset += row_count
+
+    new_dimensions = {'material_grade': material_grade, 'heat_no': heat_no, 'equipment_name': equipment}
+    return {
+        'row_count': total,
+        'live': np.concatenate([frame['live'], np.ones(added, dtype=bool)]),
+        'columns': columns,
+        'dimensions': {
+            field: np.concatenate([frame['dimensions'][field], np.array(new_dimensions[field], dtype=str)])
+            for field in GROUP_BY_FIELDS
+        },
+        'spans': spans
+    }
+
+
+def _build_frame(blocks):
+    """
+    Concatenate cached blocks into NumPy arrays
+    """
+    return _append_blocks(_empty_frame(), blocks)
+
+
+def _update_frame(frame, blocks, changed_items):
+    """
+    Mask out the rows of changed items and append their current blocks
+    """
+    live = frame['live'].copy()
+    spans = dict(frame['spans'])
+    for item_oid in changed_items:
+        span = spans.pop(item_oid, None)
+        if span:
+            live[span[0]:span[1]] = False
+
+    dead_rows = int(live.size - np.count_nonzero(live))
+    if dead_rows >= COMPACT_MIN_DEAD_ROWS and dead_rows > live.size - dead_rows:
+        return _build_frame(blocks)
+
+    frame = {**frame, 'live': live, 'spans': spans}
+    return _append_blocks(frame, {item_oid: blocks[item_oid] for item_oid in changed_items if item_oid in blocks})
+
+
+def get_column_frame(test_method_oid):
+    """
+    Return the cached NumPy columns of a test method, loading only documents
+    changed since the previous call
+    """
+    collection = TestResultColumns._get_collection()
+    with _cache_lock:
+        entry = _column_cache.setdefault(test_method_oid, {'watermark': None, 'blocks': {}, 'frame': None})
+
+        query = {'test_method_oid': test_method_oid}
+        if entry['watermark']:
+            # Re-read a window before the watermark: a write can commit after a later one
+            query['updated_at'] = {'$gte': entry['watermark'] - WATERMARK_WINDOW}
+
+        changed_items = set()
+        projection = {'certificate_item_id': 1, 'material_grade': 1, 'heat_no': 1, 'equipment': 1,
+                      'columns': 1, 'row_count': 1, 'is_active': 1, 'updated_at': 1}
+        for doc in collection.find(query, projection).sort('updated_at', 1):
+            item_oid = doc['certificate_item_id']
+            if doc.get('is_active', True):
+                if entry['blocks'].get(item_oid) != doc:
+                    entry['blocks'][item_oid] = doc
+                    changed_items.add(item_oid)
+            elif entry['blocks'].pop(item_oid, None) is not None:
+                changed_items.add(item_oid)
+            if doc.get('updated_at') and (entry['watermark'] is None or doc['updated_at'] > entry['watermark']):
+                entry['watermark'] = doc['updated_at']
+
+        if entry['frame'] is None:
+            entry['frame'] = _build_frame(entry['blocks'])
+        elif changed_items:
+            entry['frame'] = _update_frame(entry['frame'], entry['blocks'], changed_items)
+        return entry['frame']
+
+
+def describe_values(values, sigma=3.0):
+    """
+    Vectorized descriptive statistics and control limits for one column
+    """
+    values = values[~np.isnan(values)]
+    count = int(values.size)
+    if count == 0:
+        return {'count': 0}
+
+    mean = float(values.mean())
+    std = float(values.std(ddof=1)) if count > 1 else 0.0
+    percentiles = np.percentile(values, PERCENTILES)
+    upper = mean + sigma * std
+    lower = mean - sigma * std
+
+    return {
+        'count': count,
+        'mean': round(mean, 6),
+        'std': round(std, 6),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'percentiles': {f'p{p}': round(float(v), 6) for p, v in zip(PERCENTILES, percentiles)},
+        'control_limits': {
+            'sigma': sigma,
+            'ucl': round(upper, 6),
+            'lcl': round(lower, 6),
+            'out_of_control': int(np.count_nonzero((values > upper) | (values < lower)))
+        }
+    }
+
+
+def compute_statistics(frame, columns, filters=None, group_by=None, sigma=3.0, max_groups=50):
+    """
+    Compute statistics for the selected columns, optionally filtered and grouped
+    filters: dict of dimension name -> exact value
+    group_by: one of GROUP_BY_FIELDS
+    """
+    mask = frame['live'].copy()
+    for field, value in (filters or {}).items():
+        if value:
+            mask &= frame['dimensions'][field] == value
+
+    def describe_mask(row_mask):
+        return {name: describe_values(frame['columns'][name][row_mask], sigma) for name in columns}
+
+    result = {
+        'total_results': int(np.count_nonzero(frame['live'])),
+        'filtered_results': int(np.count_nonzero(mask))
+    }
+
+    if not group_by:
+        result['statistics'] = describe_mask(mask)
+        return result
+
+    keys, inverse, counts = np.unique(frame['dimensions'][group_by][mask], return_inverse=True, return_counts=True)
+    filtered_indices = np.flatnonzero(mask)
+    groups = []
+    for group_index in np.argsort(-counts)[:max_groups]:
+        row_mask = np.zeros(frame['row_count'], dtype=bool)
+        row_mask[filtered_indices[inverse == group_index]] = True
+        groups.append({
+            'key': str(keys[group_index]),
+            'count': int(counts[group_index]),
+            'statistics': describe_mask(row_mask)
+        })
+
+    result['group_by'] = group_by
+    result['total_groups'] = int(keys.size)
+    result['groups'] = groups
+    return result
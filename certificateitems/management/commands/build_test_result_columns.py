@@ -0,0 +1,47 @@
+"""
+Build the numeric test result columns used by the analytics endpoint
+
+Usage:
+    python manage.py build_test_result_columns
+    python manage.py build_test_result_columns --since 2025-01-01
+"""
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from mongoengine import connection
+
+from certificateitems.analytics import refresh_item_columns
+
+
+class Command(BaseCommand):
+    help = 'Extract numeric test result columns for certificate items (backfill or rebuild)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', default='', help='Only items updated on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--include-inactive', action='store_true', help='Also process soft-deleted items (writes tombstones)')
+
+    def handle(self, *args, **options):
+        db = connection.get_db()
+
+        query = {} if options['include_inactive'] else {'is_active': {'$ne': False}}
+        if options['since']:
+            try:
+                query['updated_at'] = {'$gte': datetime.strptime(options['since'], '%Y-%m-%d')}
+            except ValueError:
+                raise CommandError('--since must be in YYYY-MM-DD format')
+
+        total = db.certificate_items.count_documents(query)
+        self.stdout.write(f'Processing {total} certificate items...')
+
+        processed = 0
+        blocks = 0
+        for item_doc in db.certificate_items.find(query, {'_id': 1}).batch_size(1000):
+            blocks += refresh_item_columns(item_doc['_id'], db)
+            processed += 1
+            if processed % 500 == 0:
+                self.stdout.write(f'  {processed}/{total}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} certificate items ({blocks} test method column blocks).'
+        ))
@@ -0,0 +1,75 @@
+"""
+Backfill structured test results on existing certificate items
+
+Parses every specimen section's test_results JSON string once and stores
+parsed_test_results and test_results_summary next to it.
+
+Usage:
+    python manage.py migrate_test_results
+    python manage.py migrate_test_results --all --batch-size 200
+"""
+
+from django.core.management.base import BaseCommand
+from mongoengine import connection
+from pymongo import UpdateOne
+
+from certificateitems.test_results import structure_test_results
+
+
+class Command(BaseCommand):
+    help = 'Store parsed test results and summaries for existing certificate item specimen sections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-parse items that were already migrated')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of items written per bulk update')
+        parser.add_argument('--dry-run', action='store_true', help='Only count items that need migrating')
+
+    def handle(self, *args, **options):
+        db = connection.get_db()
+        certificate_items_collection = db.certificate_items
+
+        query = {'specimen_sections.0': {'$exists': True}}
+        if not options['all']:
+            query['specimen_sections'] = {'$elemMatch': {'test_results_summary': {'$exists': False}}}
+
+        total = certificate_items_collection.count_documents(query)
+        self.stdout.write(f'{total} certificate items to migrate')
+        if options['dry_run'] or not total:
+            return
+
+        migrated = 0
+        parse_errors = 0
+        operations = []
+        cursor = certificate_items_collection.find(
+            query,
+            {'specimen_sections': 1, 'updated_at': 1}
+        ).batch_size(options['batch_size'])
+
+        for item_doc in cursor:
+            sections = item_doc.get('specimen_sections', [])
+            for section in sections:
+                section.update(structure_test_results(section.get('test_results', '[]')))
+                if section['test_results_summary']['parse_error']:
+                    parse_errors += 1
+
+            # Skip the item if it was edited while we were parsing it
+            operations.append(UpdateOne(
+                {'_id': item_doc['_id'], 'updated_at': item_doc.get('updated_at')},
+                {'$set': {'specimen_sections': sections}}
+            ))
+
+            if len(operations) >= options['batch_size']:
+                migrated += self.flush(certificate_items_collection, operations)
+                operations = []
+
+        if operations:
+            migrated += self.flush(certificate_items_collection, operations)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Migrated {migrated} certificate items ({parse_errors} sections with unparseable test_results).'
+        ))
+
+    def flush(self, collection, operations):
+        result = collection.bulk_write(operations, ordered=False)
+        self.stdout.write(f'  Updated {result.modified_count} items')
+        return result.modified_count
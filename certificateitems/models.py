@@ -17,6 +17,9 @@ class SpecimenSection(EmbeddedDocument):
     Contains test results and images for each specimen tested
     """
     test_results = fields.StringField(required=True)  # JSON string containing test data
+    # Derived from test_results on write (see certificateitems/test_results.py)
+    parsed_test_results = fields.ListField(fields.DictField())  # [{sample_id, values: [{name, value}]}]
+    test_results_summary = fields.DictField()  # row_count, sample_ids, parameters, rows, parse_error
     images_list = fields.ListField(fields.EmbeddedDocumentField(ImageInfo))
     specimen_id = fields.ObjectIdField(required=True)  # Reference to Specimen._id
     equipment_name = fields.StringField(max_length=200)  # Equipment used for testing
@@ -62,4 +65,33 @@ class CertificateItem(Document):
         return super().save(*args, **kwargs)
     
     def __str__(self):
-        return f"{self.certificate_id} - {len(self.specimen_sections)} specimens - {self.material_grade}"
\ No newline at end of file
+        return f"{self.certificate_id} - {len(self.specimen_sections)} specimens - {self.material_grade}"
+
+class TestResultColumns(Document):
+    """
+    Numeric test result columns of one certificate item for one test method
+    Row-aligned arrays used by the analytics endpoint (see certificateitems/analytics.py)
+    """
+    test_method_oid = fields.ObjectIdField(required=True)  # Reference to TestMethod._id
+    certificate_item_id = fields.ObjectIdField(required=True)  # Reference to CertificateItem._id
+    certificate_id = fields.ObjectIdField()  # Reference to Certificate._id
+    material_grade = fields.StringField(max_length=200)
+    heat_no = fields.StringField(max_length=100)
+    sample_ids = fields.ListField(fields.StringField())
+    equipment = fields.ListField(fields.StringField())  # Equipment name per row
+    columns = fields.ListField(fields.DictField())  # [{name, values: [float|None, ...]}]
+    row_count = fields.IntField(default=0)
+    is_active = fields.BooleanField(default=True)
+    updated_at = fields.DateTimeField(default=datetime.now)
+
+    meta = {
+        'collection': 'test_result_columns',
+        'indexes': [
+            {'fields': ['test_method_oid', 'certificate_item_id'], 'unique': True},
+            ('test_method_oid', 'updated_at'),
+            'certificate_item_id'
+        ]
+    }
+
+    def __str__(self):
+        return f"{self.test_method_oid} - {self.certificate_item_id} - {self.row_count} rows"
@@ -0,0 +1,108 @@
+"""
+Structured storage for specimen section test results
+
+SpecimenSection.test_results is a JSON string (a list of rows shaped like
+{"data": {"Sample ID": "...", "<column>": <value>, ...}}). The string is kept
+as sent by the client; on every write it is also parsed once into
+parsed_test_results (one subdocument per row, columns stored as name/value
+pairs so column names containing '.' or '$' are safe) and a precomputed
+test_results_summary, so list endpoints never have to json.loads it.
+"""
+
+import json
+
+
+SUMMARY_PARAMETERS_PER_ROW = 5  # Parameters listed per row in list summaries
+
+
+def parse_test_results(raw_test_results):
+    """
+    Parse a test_results value (JSON string or already decoded list)
+    Returns: list of row data dicts, or None if the value cannot be parsed
+    """
+    try:
+        rows = json.loads(raw_test_results) if isinstance(raw_test_results, str) else raw_test_results
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(rows, list):
+        return None
+
+    return [
+        row['data'] for row in rows
+        if isinstance(row, dict) and isinstance(row.get('data'), dict)
+    ]
+
+
+def build_test_results_summary(rows):
+    """
+    Build the precomputed summary for parsed rows (None means a parse error)
+    """
+    if rows is None:
+        return {
+            'row_count': 0,
+            'sample_ids': [],
+            'parameters': [],
+            'rows': [{'sample_id': 'Parse Error', 'test_parameters': []}],
+            'parse_error': True
+        }
+
+    parameters = []
+    seen = set()
+    summary_rows = []
+    for data in rows:
+        keys = list(data.keys())
+        for key in keys:
+            if key not in seen:
+                seen.add(key)
+                parameters.append(key)
+        summary_rows.append({
+            'sample_id': data.get('Sample ID', 'Unknown'),
+            'test_parameters': keys[:SUMMARY_PARAMETERS_PER_ROW]
+        })
+
+    return {
+        'row_count': len(rows),
+        'sample_ids': [row['sample_id'] for row in summary_rows],
+        'parameters': parameters,
+        'rows': summary_rows,
+        'parse_error': False
+    }
+
+
+def structure_test_results(raw_test_results):
+    """
+    Derive the structured fields stored next to a section's test_results string
+    Returns: dict with parsed_test_results and test_results_summary
+    """
+    rows = parse_test_results(raw_test_results)
+    return {
+        'parsed_test_results': [
+            {
+                'sample_id': str(data.get('Sample ID', '')),
+                'values': [{'name': str(name), 'value': value} for name, value in data.items()]
+            }
+            for data in (rows or [])
+        ],
+        'test_results_summary': build_test_results_summary(rows)
+    }
+
+
+def get_section_summary(section):
+    """
+    Return the stored summary of a specimen section, computing it for sections
+    written before structured storage existed
+    """
+    summary = section.get('test_results_summary')
+    if summary:
+        return summary
+    return build_test_results_summary(parse_test_results(section.get('test_results', '[]')))
+
+
+def rows_from_parsed(parsed_test_results):
+    """
+    Rebuild plain row dicts ({column: value}) from parsed_test_results
+    """
+    return [
+        {pair.get('name'): pair.get('value') for pair in row.get('values', [])}
+        for row in parsed_test_results or []
+    ]
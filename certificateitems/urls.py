@@ -10,6 +10,7 @@ urlpatterns = [
     # Additional endpoints - these must come BEFORE the detail endpoint
     path('search/', views.certificate_item_search, name='certificate_item_search'),               # GET: Search certificate items
     path('stats/', views.certificate_item_stats, name='certificate_item_stats'),                 # GET: Certificate item statistics
+    path('analytics/', views.certificate_item_analytics, name='certificate_item_analytics'),     # GET: Test result column statistics
     path('upload-image/', views.upload_image, name='upload_image'),                              # POST: Upload image and get URL
     path('certificate/<str:certificate_oid>/', views.certificate_item_by_certificate, name='certificate_item_by_certificate'), # GET: Items by certificate
     
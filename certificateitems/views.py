@@ -3,6 +3,8 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
+import math
+import re
 from datetime import datetime
 from bson import ObjectId
 from mongoengine import connection
@@ -13,6 +15,112 @@ from certificates.models import Certificate
 from specimens.models import Specimen
 from samplepreperation.models import SamplePreparation
 from authentication.decorators import any_authenticated_user
+from lims_backend.utilities.images import generate_derivatives, get_thumbnail_url, delete_derivatives, media_relative_path
+from mediastore.storage import store_file, release_file
+from certificates.snapshots import invalidate_certificate_snapshot
+from .test_results import structure_test_results, get_section_summary
+from .analytics import np, GROUP_BY_FIELDS, get_column_frame, compute_statistics, refresh_item_columns
+from lims_backend.utilities.soft_delete import active_filter
+from lims_backend.utilities.media_urls import media_url, unsigned_media_url
+from lims_backend.utilities.pagination import get_pagination_params, create_pagination_response
+from dbmonitor.index_registry import CASE_INSENSITIVE
+
+
+# ============= UTILITY FUNCTIONS =============
+
+def apply_item_filters(request, query):
+    """
+    Add the material_grade / equipment filters to a certificate item query
+    Both are case-insensitive partial matches by default; match=exact makes them
+    exact, case-insensitive matches served by the collation indexes of
+    certificate_items (dbmonitor/index_registry.py). equipment matches the item
+    or any of its specimen sections.
+    Returns: collation the query must run with, or None
+    """
+    material_grade = request.GET.get('material_grade', '').strip()
+    equipment = request.GET.get('equipment', '').strip()
+    exact = request.GET.get('match', 'contains') == 'exact'
+
+    def condition(value):
+        return value if exact else {'$regex': re.escape(value), '$options': 'i'}
+
+    if material_grade:
+        query['material_grade'] = condition(material_grade)
+    if equipment:
+        # $and keeps any $or already in the query (e.g. the legacy active filter)
+        query.setdefault('$and', []).append(
+            {'$or': [{'equipment_name': condition(equipment)}, {'specimen_sections.equipment_name': condition(equipment)}]}
+        )
+    return CASE_INSENSITIVE if exact and (material_grade or equipment) else None
+
+
+def include_results_param(request):
+    """
+    include_results=false leaves test results (raw and summaries) out of a list
+    """
+    return request.GET.get('include_results', 'true').lower() != 'false'
+
+
+def specimen_names(db, item_docs):
+    """
+    Specimen names of every section of a page of certificate items, in one query
+    Returns: {specimen ObjectId: specimen_id}
+    """
+    specimen_ids = set()
+    for item_doc in item_docs:
+        for section in item_doc.get('specimen_sections', []):
+            try:
+                specimen_ids.add(ObjectId(section.get('specimen_id')))
+            except Exception:
+                continue
+    if not specimen_ids:
+        return {}
+    return {
+        specimen_doc['_id']: specimen_doc.get('specimen_id', 'Unknown')
+        for specimen_doc in db.specimens.find({'_id': {'$in': list(specimen_ids)}}, {'specimen_id': 1})
+    }
+
+
+def section_specimen_name(section, names):
+    try:
+        return names.get(ObjectId(section.get('specimen_id')), 'Unknown')
+    except Exception:
+        return 'Unknown'
+
+
+def section_images(sections):
+    """
+    {image_url: specimen ObjectId} of the images of specimen sections
+    """
+    images = {}
+    for section in sections or []:
+        for image in section.get('images_list', []):
+            if image.get('image_url'):
+                images[image['image_url']] = section.get('specimen_id')
+    return images
+
+
+def release_item_images(db, item_oid, images):
+    """
+    Release stored images no longer referenced by any active certificate item
+    images: {image_url: specimen ObjectId} dropped from item_oid
+    Never raises, so callers can use it after a successful write.
+    """
+    for image_url, specimen_id in images.items():
+        try:
+            specimen_oid = ObjectId(specimen_id)
+            still_used = db.certificate_items.find_one({
+                '_id': {'$ne': item_oid},
+                'is_active': {'$ne': False},
+                'specimen_sections.specimen_id': specimen_oid,
+                'specimen_sections.images_list.image_url': image_url
+            }, {'_id': 1})
+            relative_path = media_relative_path(image_url)
+            if not still_used and relative_path:
+                release_file(relative_path)
+                delete_derivatives(relative_path)
+        except Exception as e:
+            print(f"Error releasing certificate item image {image_url}: {e}")
 
 
 # ============= CERTIFICATE ITEMS CRUD ENDPOINTS =============
@@ -23,92 +131,89 @@ from authentication.decorators import any_authenticated_user
 def certificate_item_list(request):
     """
     List all certificate items or create a new certificate item
-    GET: Returns list of all certificate items with related data
+    GET: Returns a page of certificate items (newest first) with related data
+         Optional filters: certificate_id, material_grade, equipment (case-insensitive partial
+         matches; match=exact for index-backed exact matches)
+         include_results=false omits the test result summaries
     POST: Creates a new certificate item with validation
     """
     if request.method == 'GET':
         try:
-            # Use raw query to get all certificate items
             db = connection.get_db()
             certificate_items_collection = db.certificate_items
+            page, limit, offset = get_pagination_params(request)
             
-            # Apply filters if provided
-            # query = {'is_active': True}
-            query = {'$or': [{'is_active': True}, {'is_active': {'$exists': False}}]}
-
-            # Filter by certificate_id if provided
-            certificate_id = request.GET.get('certificate_id')
+            query = active_filter('certificate_items')
+            
+            # Filter by certificate (Certificate ObjectId) if provided
+            certificate_id = request.GET.get('certificate_id', '').strip()
             if certificate_id:
-                query['certificate_id'] = certificate_id
+                try:
+                    query['certificate_id'] = ObjectId(certificate_id)
+                except Exception:
+                    return JsonResponse({
+                        'status': 'error',
+                        'message': f'Invalid certificate ID format: {certificate_id}'
+                    }, status=400)
             
-            # Filter by material_grade if provided
-            material_grade = request.GET.get('material_grade')
-            if material_grade:
-                query['material_grade'] = {'$regex': material_grade, '$options': 'i'}
+            collation = apply_item_filters(request, query)
+            include_results = include_results_param(request)
             
-            certificate_items = certificate_items_collection.find(query).sort('created_at', -1)
-            data = []
+            # Only the precomputed test result summaries are needed, not the raw/parsed rows
+            projection = {
+                'specimen_sections.test_results': 0,
+                'specimen_sections.parsed_test_results': 0
+            }
+            if not include_results:
+                projection['specimen_sections.test_results_summary'] = 0
+            
+            total_records = certificate_items_collection.count_documents(query, collation=collation)
+            certificate_items = list(
+                certificate_items_collection.find(query, projection, collation=collation)
+                .sort('created_at', -1).skip(offset).limit(limit)
+            )
             
+            # Specimens and certificates of the whole page in two queries
+            names = specimen_names(db, certificate_items)
+            certificate_ids = list({item_doc.get('certificate_id') for item_doc in certificate_items if item_doc.get('certificate_id')})
+            certificates_by_id = {
+                cert_doc['_id']: cert_doc
+                for cert_doc in db.complete_certificates.find(
+                    {'_id': {'$in': certificate_ids}},
+                    {'certificate_id': 1, 'issue_date': 1, 'customers_name_no': 1}
+                )
+            } if certificate_ids else {}
+            
+            data = []
             for item_doc in certificate_items:
-                # Process specimen sections with enhanced data
                 specimen_sections_data = []
-                total_specimens = 0
-                
                 for section in item_doc.get('specimen_sections', []):
-                    # Get specimen information
-                    specimen_info = {
-                        'specimen_id': str(section.get('specimen_id', '')),
-                        'specimen_name': 'Unknown'
-                    }
-                    try:
-                        specimens_collection = db.specimens
-                        specimen_doc = specimens_collection.find_one({'_id': ObjectId(section.get('specimen_id'))})
-                        if specimen_doc:
-                            specimen_info['specimen_name'] = specimen_doc.get('specimen_id', 'Unknown')
-                    except Exception:
-                        pass
-                    
-                    # Parse test results for summary
-                    test_results_summary = []
-                    try:
-                        import json as json_parser
-                        test_results = json_parser.loads(section.get('test_results', '[]'))
-                        for result in test_results:
-                            if isinstance(result, dict) and 'data' in result:
-                                data_keys = list(result['data'].keys())
-                                test_results_summary.append({
-                                    'sample_id': result['data'].get('Sample ID', 'Unknown'),
-                                    'test_parameters': data_keys[:5]  # First 5 parameters
-                                })
-                    except Exception:
-                        test_results_summary = [{'sample_id': 'Parse Error', 'test_parameters': []}]
-                    
-                    specimen_sections_data.append({
-                        'specimen_info': specimen_info,
-                        'test_results_count': len(test_results_summary),
-                        'test_results_summary': test_results_summary,
+                    section_data = {
+                        'specimen_info': {
+                            'specimen_id': str(section.get('specimen_id', '')),
+                            'specimen_name': section_specimen_name(section, names)
+                        },
                         'images_count': len(section.get('images_list', []))
-                    })
-                    total_specimens += 1
+                    }
+                    if include_results:
+                        # Test results summary precomputed at write time
+                        test_results_summary = get_section_summary(section).get('rows', [])
+                        section_data['test_results_count'] = len(test_results_summary)
+                        section_data['test_results_summary'] = test_results_summary
+                    specimen_sections_data.append(section_data)
                 
-                # Get certificate information
                 certificate_info = {
                     'certificate_id': str(item_doc.get('certificate_id', '')),
                     'issue_date': 'Unknown',
                     'customers_name_no': 'Unknown'
                 }
-                try:
-                    # Try to find certificate by ObjectId
-                    db_certificates = db.complete_certificates
-                    cert_doc = db_certificates.find_one({'_id': item_doc.get('certificate_id')})
-                    if cert_doc:
-                        certificate_info.update({
-                            'certificate_id': cert_doc.get('certificate_id', 'Unknown'),
-                            'issue_date': cert_doc.get('issue_date', 'Unknown'),
-                            'customers_name_no': cert_doc.get('customers_name_no', 'Unknown')
-                        })
-                except Exception:
-                    pass
+                cert_doc = certificates_by_id.get(item_doc.get('certificate_id'))
+                if cert_doc:
+                    certificate_info.update({
+                        'certificate_id': cert_doc.get('certificate_id', 'Unknown'),
+                        'issue_date': cert_doc.get('issue_date', 'Unknown'),
+                        'customers_name_no': cert_doc.get('customers_name_no', 'Unknown')
+                    })
                 
                 data.append({
                     'id': str(item_doc.get('_id', '')),
@@ -124,19 +229,23 @@ def certificate_item_list(request):
                     'equipment_name': item_doc.get('equipment_name', ''),
                     'equipment_calibration': item_doc.get('equipment_calibration', ''),
                     'specimen_sections': specimen_sections_data,
-                    'total_specimens': total_specimens,
+                    'total_specimens': len(specimen_sections_data),
                     'comments': item_doc.get('comments', ''),
                     'created_at': item_doc.get('created_at').isoformat() if item_doc.get('created_at') else '',
                     'updated_at': item_doc.get('updated_at').isoformat() if item_doc.get('updated_at') else ''
                 })
             
+            response_data = create_pagination_response(data, total_records, page, limit)
+            
             return JsonResponse({
                 'status': 'success',
-                'data': data,
-                'total': len(data),
+                **response_data,
+                'total': total_records,
                 'filters_applied': {
                     'certificate_id': certificate_id,
-                    'material_grade': material_grade
+                    'material_grade': request.GET.get('material_grade', ''),
+                    'equipment': request.GET.get('equipment', ''),
+                    'include_results': include_results
                 }
             })
         except Exception as e:
@@ -225,7 +334,7 @@ def certificate_item_list(request):
                     for j, image_data in enumerate(section_data['images_list']):
                         if isinstance(image_data, dict):
                             image_info = ImageInfo(
-                                image_url=image_data.get('image_url', ''),
+                                image_url=unsigned_media_url(image_data.get('image_url', '')),
                                 caption=image_data.get('caption', '')
                             )
                             images_list.append(image_info)
@@ -233,6 +342,7 @@ def certificate_item_list(request):
                 # Create validated specimen section
                 specimen_section = SpecimenSection(
                     test_results=section_data['test_results'],
+                    **structure_test_results(section_data['test_results']),
                     images_list=images_list,
                     specimen_id=ObjectId(section_data['specimen_id'])
                 )
@@ -254,6 +364,8 @@ def certificate_item_list(request):
                 specimen_sections=validated_specimen_sections
             )
             certificate_item.save()
+            invalidate_certificate_snapshot(certificate_item.certificate_id)
+            refresh_item_columns(certificate_item.id, db)
             
             return JsonResponse({
                 'status': 'success',
@@ -345,7 +457,8 @@ def certificate_item_detail(request, item_id):
                 images_data = []
                 for image in section.get('images_list', []):
                     images_data.append({
-                        'image_url': image.get('image_url', ''),
+                        'image_url': media_url(image.get('image_url', '')) or '',
+                        'thumbnail_url': get_thumbnail_url(image.get('image_url', '')),
                         'caption': image.get('caption', '')
                     })
                 
@@ -471,7 +584,11 @@ def certificate_item_detail(request, item_id):
                         processed_section = {
                             'specimen_id': specimen_obj_id,
                             'test_results': section.get('test_results', ''),
-                            'images_list': section.get('images_list', [])
+                            'images_list': [
+                                {**image, 'image_url': unsigned_media_url(image.get('image_url', ''))}
+                                for image in section.get('images_list', [])
+                            ],
+                            **structure_test_results(section.get('test_results', ''))
                         }
                         
                         # Validate images_list if provided
@@ -507,6 +624,15 @@ def certificate_item_detail(request, item_id):
                         'message': 'No changes made or certificate item not found'
                     }, status=400)
                 
+                invalidate_certificate_snapshot(item_doc.get('certificate_id'))
+                refresh_item_columns(item_doc['_id'], db)
+                if 'specimen_sections' in update_doc:
+                    old_images = section_images(item_doc.get('specimen_sections'))
+                    new_images = section_images(update_doc['specimen_sections'])
+                    release_item_images(db, item_doc['_id'], {
+                        image_url: specimen_id for image_url, specimen_id in old_images.items() if image_url not in new_images
+                    })
+                
                 return JsonResponse({
                     'status': 'success',
                     'message': 'Certificate item updated successfully',
@@ -535,6 +661,10 @@ def certificate_item_detail(request, item_id):
                     'message': 'Certificate item not found or already deleted'
                 }, status=404)
             
+            invalidate_certificate_snapshot(item_doc.get('certificate_id'))
+            refresh_item_columns(item_doc['_id'], db)
+            release_item_images(db, item_doc['_id'], section_images(item_doc.get('specimen_sections')))
+            
             return JsonResponse({
                 'status': 'success',
                 'message': 'Certificate item deleted successfully',
@@ -572,7 +702,7 @@ def certificate_item_search(request):
         
         # Build query for raw MongoDB
         # query = {'is_active': True}
-        query = {'$or': [{'is_active': True}, {'is_active': {'$exists': False}}]}
+        query = active_filter('certificate_items')
         
         if certificate_id_query:
             try:
@@ -636,7 +766,11 @@ def certificate_item_search(request):
 @require_http_methods(["GET"])
 def certificate_item_by_certificate(request, certificate_oid):
     """
-    Get all certificate items for a specific certificate by ObjectId
+    Get the certificate items of a specific certificate by ObjectId (paginated)
+    Query parameters:
+    - summary: 'true' returns the precomputed test results summary instead of the raw test_results string
+    - include_results: 'false' omits test results (raw and summary) altogether
+    - material_grade / equipment: case-insensitive partial matches (match=exact for exact matches)
     """
     try:
         # Validate ObjectId format
@@ -665,8 +799,23 @@ def certificate_item_by_certificate(request, certificate_oid):
             'certificate_id': obj_id,
             # 'is_active': True
         }
+        collation = apply_item_filters(request, query)
+        page, limit, offset = get_pagination_params(request)
         
-        certificate_items = certificate_items_collection.find(query).sort('created_at', -1)
+        summary_only = request.GET.get('summary', '').lower() == 'true'
+        include_results = include_results_param(request)
+        projection = {'specimen_sections.parsed_test_results': 0}
+        if summary_only or not include_results:
+            projection['specimen_sections.test_results'] = 0
+        if not include_results:
+            projection['specimen_sections.test_results_summary'] = 0
+        
+        total_records = certificate_items_collection.count_documents(query, collation=collation)
+        certificate_items = list(
+            certificate_items_collection.find(query, projection, collation=collation)
+            .sort('created_at', -1).skip(offset).limit(limit)
+        )
+        names = specimen_names(db, certificate_items)
         data = []
         
         for item_doc in certificate_items:
@@ -674,33 +823,27 @@ def certificate_item_by_certificate(request, certificate_oid):
             specimen_sections_data = []
             
             for section in item_doc.get('specimen_sections', []):
-                # Get specimen information
-                specimen_info = {
-                    'specimen_id': str(section.get('specimen_id', '')),
-                    'specimen_name': 'Unknown'
-                }
-                try:
-                    specimens_collection = db.specimens
-                    specimen_doc = specimens_collection.find_one({'_id': ObjectId(section.get('specimen_id'))})
-                    if specimen_doc:
-                        specimen_info['specimen_name'] = specimen_doc.get('specimen_id', 'Unknown')
-                except Exception:
-                    pass
-                
                 # Get images data with caption field
                 images_data = []
                 for image in section.get('images_list', []):
                     images_data.append({
-                        'image_url': image.get('image_url', ''),
+                        'image_url': media_url(image.get('image_url', '')) or '',
+                        'thumbnail_url': get_thumbnail_url(image.get('image_url', '')),
                         'caption': image.get('caption', '')
                     })
                 
-                specimen_sections_data.append({
-                    'test_results': section.get('test_results', ''),  # Keep as JSON string
+                if not include_results:
+                    section_data = {}
+                elif summary_only:
+                    section_data = {'test_results_summary': get_section_summary(section)}
+                else:
+                    section_data = {'test_results': section.get('test_results', '')}  # Keep as JSON string
+                section_data.update({
                     'images_list': images_data,
                     'specimen_id': str(section.get('specimen_id')),  # Convert ObjectId to string
-                    'specimen_name': specimen_info['specimen_name']
+                    'specimen_name': section_specimen_name(section, names)
                 })
+                specimen_sections_data.append(section_data)
             
             data.append({
                 '_id': str(item_doc.get('_id')),  # Convert ObjectId to string
@@ -721,10 +864,12 @@ def certificate_item_by_certificate(request, certificate_oid):
                 'is_active': item_doc.get('is_active', True)
             })
         
+        response_data = create_pagination_response(data, total_records, page, limit)
+        
         return JsonResponse({
             'status': 'success',
-            'data': data,
-            'total': len(data),
+            **response_data,
+            'total': total_records,
             'certificate_oid': certificate_oid,
             'certificate_id': cert_doc.get('certificate_id', '')
         })
@@ -748,11 +893,11 @@ def certificate_item_stats(request):
         db = connection.get_db()
         certificate_items_collection = db.certificate_items
         
-        total_items = certificate_items_collection.count_documents({'$or': [{'is_active': True}, {'is_active': {'$exists': False}}]})  #{'is_active': True}
+        total_items = certificate_items_collection.count_documents(active_filter('certificate_items'))
         
         # Calculate statistics using aggregation
         pipeline = [
-            {'$match': {'$or': [{'is_active': True}, {'is_active': {'$exists': False}}]}},
+            {'$match': active_filter('certificate_items')},
             {
                 '$project': {
                     'certificate_id': 1,
@@ -820,6 +965,97 @@ def certificate_item_stats(request):
         }, status=500)
 
 
+@csrf_exempt
+@require_http_methods(["GET"])
+@any_authenticated_user
+def certificate_item_analytics(request):
+    """
+    Statistics of numeric test result columns for one test method
+    Query parameters:
+    - test_method_id: Test method ObjectId (required)
+    - columns: Comma-separated column names (default: the test method's numeric test_columns)
+    - group_by: material_grade, heat_no or equipment_name
+    - material_grade, heat_no, equipment_name: Exact-match filters
+    - sigma: Control limit width in standard deviations (default 3)
+    """
+    if np is None:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Analytics are not available: NumPy is not installed'
+        }, status=503)
+    
+    try:
+        test_method_id = request.GET.get('test_method_id', '')
+        try:
+            test_method_oid = ObjectId(test_method_id)
+        except Exception:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'Invalid or missing test_method_id: {test_method_id}'
+            }, status=400)
+        
+        group_by = request.GET.get('group_by', '')
+        if group_by and group_by not in GROUP_BY_FIELDS:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'group_by must be one of: {", ".join(GROUP_BY_FIELDS)}'
+            }, status=400)
+        
+        try:
+            sigma = float(request.GET.get('sigma', 3))
+        except ValueError:
+            sigma = None
+        if sigma is None or not math.isfinite(sigma) or sigma < 0:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'sigma must be a finite, non-negative number'
+            }, status=400)
+        
+        db = connection.get_db()
+        test_method_doc = db.test_methods.find_one({'_id': test_method_oid}, {'test_name': 1, 'test_columns': 1})
+        if not test_method_doc:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Test method not found'
+            }, status=404)
+        
+        frame = get_column_frame(test_method_oid)
+        
+        requested_columns = [c.strip() for c in request.GET.get('columns', '').split(',') if c.strip()]
+        if requested_columns:
+            columns = [c for c in requested_columns if c in frame['columns']]
+        else:
+            declared = test_method_doc.get('test_columns') or []
+            columns = [c for c in declared if c in frame['columns']] or list(frame['columns'].keys())
+        
+        filters = {field: request.GET.get(field, '') for field in GROUP_BY_FIELDS}
+        statistics = compute_statistics(frame, columns, filters=filters, group_by=group_by or None, sigma=sigma)
+        
+        return JsonResponse({
+            'status': 'success',
+            'data': {
+                'test_method': {
+                    'id': str(test_method_oid),
+                    'test_name': test_method_doc.get('test_name', '')
+                },
+                'columns': columns,
+                'available_columns': list(frame['columns'].keys()),
+                **statistics
+            },
+            'filters_applied': {
+                **filters,
+                'group_by': group_by,
+                'sigma': sigma
+            }
+        })
+        
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 @any_authenticated_user
@@ -832,7 +1068,7 @@ def upload_image(request):
         import uuid
         from datetime import datetime
         from django.core.files.storage import default_storage
-        from django.core.files.base import ContentFile
+        from django.conf import settings
         
         # Check if image file is provided
         if 'image' not in request.FILES:
@@ -911,14 +1147,17 @@ def upload_image(request):
         # Create file path with specimen_id folder structure
         file_path = f"certificate_images/{specimen_id}/{unique_filename}"
         
-        # Save file
-        image_file.seek(0)  # Reset file pointer to beginning
-        file_content = image_file.read()
-        saved_path = default_storage.save(file_path, ContentFile(file_content))
+        # Save file through the content-addressed store (duplicates write no bytes)
+        stored = store_file(image_file, file_path)
+        saved_path = stored['path']
         
         # Generate URL
         file_url = default_storage.url(saved_path)
         
+        # Generate the thumbnail up front
+        derivatives = generate_derivatives(saved_path)
+        thumbnail_path = derivatives.get('thumbnail')
+        
         # Get file info
         file_size = default_storage.size(saved_path)
         
@@ -932,7 +1171,8 @@ def upload_image(request):
             'status': 'success',
             'message': 'Image uploaded successfully',
             'data': {
-                'image_url': file_url,
+                'image_url': media_url(file_url),
+                'thumbnail_url': media_url(thumbnail_path),
                 'filename': unique_filename,
                 'original_filename': image_file.name,
                 'file_size': file_size,
@@ -940,7 +1180,8 @@ def upload_image(request):
                 'specimen_id': specimen_id,
                 'specimen_info': specimen_info,
                 'uploaded_at': now.strftime("%Y-%m-%d %H:%M:%S"),
-                'file_path': saved_path
+                'file_path': saved_path,
+                'deduplicated': stored['deduplicated']
             }
         })
         
@@ -2,6 +2,12 @@ from mongoengine import Document, fields
 from datetime import datetime
 from bson import ObjectId
 
+from lims_backend.utilities.dates import parse_date_string
+
+
+# Date string fields with a '<field>_dt' DateTimeField shadow
+CERTIFICATE_DATE_FIELDS = ('date_of_sampling', 'date_of_testing', 'issue_date')
+
 
 class Certificate(Document):
     """
@@ -15,6 +21,9 @@ class Certificate(Document):
     date_of_sampling = fields.StringField(max_length=20)  # Date as string (YYYY-MM-DD format)
     date_of_testing = fields.StringField(max_length=20)   # Date as string (YYYY-MM-DD format)
     issue_date = fields.StringField(max_length=20)       # Date as string (YYYY-MM-DD format)
+    date_of_sampling_dt = fields.DateTimeField()         # Parsed shadows of the date strings
+    date_of_testing_dt = fields.DateTimeField()
+    issue_date_dt = fields.DateTimeField()
     
     # Certificate details
     revision_no = fields.StringField(max_length=50)      # Revision number
@@ -35,12 +44,50 @@ class Certificate(Document):
     
     meta = {
         'collection': 'complete_certificates',
-        'indexes': ['certificate_id', 'request_id', 'issue_date']
+        'indexes': ['certificate_id', 'request_id', 'issue_date', 'issue_date_dt', 'date_of_testing_dt']
     }
     
     def save(self, *args, **kwargs):
+        for field in CERTIFICATE_DATE_FIELDS:
+            setattr(self, f'{field}_dt', parse_date_string(getattr(self, field)))
         self.updated_at = datetime.now()
         return super().save(*args, **kwargs)
         
     def __str__(self):
         return f"{self.certificate_id} - {self.customers_name_no}"
+
+
+class CertificateSnapshot(Document):
+    """
+    Denormalized, versioned view of a certificate (see certificates/snapshots.py)
+    Rebuilt when the certificate is issued/revised or after one of its dependencies changes
+    """
+    certificate_oid = fields.ObjectIdField(required=True, unique=True)  # Reference to Certificate._id
+    certificate_id = fields.StringField(max_length=100)
+    revision_no = fields.StringField(max_length=50)
+    version = fields.IntField(default=1)  # Incremented on every rebuild
+    data = fields.DictField()  # Certificate detail payload
+    certificate_items = fields.ListField(fields.DictField())
+    # ObjectIds of every document the snapshot was built from, keyed by dependency type
+    dependencies = fields.DictField()
+    is_stale = fields.BooleanField(default=False)
+    generation = fields.IntField(default=0)  # Incremented on every invalidation
+    generated_at = fields.DateTimeField(default=datetime.now)
+    created_at = fields.DateTimeField(default=datetime.now)
+
+    meta = {
+        'collection': 'certificate_snapshots',
+        'indexes': [
+            'certificate_id',
+            'dependencies.sample_preparation_ids',
+            'dependencies.sample_lot_ids',
+            'dependencies.job_ids',
+            'dependencies.client_ids',
+            'dependencies.test_method_ids',
+            'dependencies.specimen_ids',
+            'dependencies.certificate_item_ids'
+        ]
+    }
+
+    def __str__(self):
+        return f"{self.certificate_id} - v{self.version}"
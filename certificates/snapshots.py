@@ -0,0 +1,416 @@
+"""
+Certificate snapshots
+
+A snapshot is the fully denormalized, versioned view of a certificate
+(certificate fields, sample preparation, sample lots, jobs, clients, test
+methods, specimens and certificate items) stored as a single document in
+the certificate_snapshots collection. It is written when a certificate is
+issued or revised, and marked stale when one of the documents it was built
+from changes, so reads (certificate detail, print/export) are one find_one
+and only rebuild after a dependency actually changed.
+"""
+
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from lims_backend.utilities.images import get_thumbnail_url
+from lims_backend.utilities.media_urls import media_url
+
+from .models import CertificateSnapshot
+
+
+# Dependency keys recorded on every snapshot (see CertificateSnapshot.dependencies)
+SNAPSHOT_DEPENDENCIES = (
+    'sample_preparation_ids',
+    'sample_lot_ids',
+    'job_ids',
+    'client_ids',
+    'test_method_ids',
+    'specimen_ids',
+    'certificate_item_ids',
+)
+
+# Rebuilds of a snapshot that keeps being invalidated while it is built
+SNAPSHOT_WRITE_ATTEMPTS = 3
+
+
+def _to_object_id(value):
+    """
+    Convert a stored reference (ObjectId or string) to an ObjectId, or None if invalid
+    """
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(value)
+    except Exception:
+        return None
+
+
+def _isoformat(value):
+    return value.isoformat() if value else ''
+
+
+def _find_by_ids(collection, ids, projection=None):
+    """
+    Fetch documents for a set of ObjectIds in one query
+    Returns: dict mapping _id to document
+    """
+    ids = [object_id for object_id in ids if object_id]
+    if not ids:
+        return {}
+    return {doc['_id']: doc for doc in collection.find({'_id': {'$in': list(set(ids))}}, projection)}
+
+
+def build_certificate_snapshot(db, cert_doc):
+    """
+    Build the denormalized certificate view with batched lookups
+    Returns: (data, certificate_items, dependencies)
+    """
+    dependencies = {key: set() for key in SNAPSHOT_DEPENDENCIES}
+
+    request_info = {
+        'request_id': str(cert_doc.get('request_id', '')),
+        'request_no': 'Unknown',
+        'sample_lots_count': 0,
+        'total_specimens': 0,
+        'sample_lots': [],
+        'specimens': []
+    }
+    client_name = 'Unknown'
+    job_id = 'Unknown'
+    project_name = 'Unknown'
+
+    sample_prep_oid = _to_object_id(cert_doc.get('request_id'))
+    sample_prep_doc = None
+    if sample_prep_oid:
+        dependencies['sample_preparation_ids'].add(sample_prep_oid)
+        sample_prep_doc = db.sample_preparations.find_one({'_id': sample_prep_oid})
+
+    sample_lots = sample_prep_doc.get('sample_lots', []) if sample_prep_doc else []
+
+    # Resolve every referenced document once per collection
+    lots_by_id = _find_by_ids(db.sample_lots, [_to_object_id(lot.get('sample_lot_id')) for lot in sample_lots])
+    jobs_by_id = _find_by_ids(db.jobs, [_to_object_id(lot.get('job_id')) for lot in lots_by_id.values()])
+    clients_by_id = _find_by_ids(db.clients, [_to_object_id(job.get('client_id')) for job in jobs_by_id.values()])
+    test_methods_by_id = _find_by_ids(db.test_methods, [_to_object_id(lot.get('test_method_oid')) for lot in sample_lots])
+
+    item_docs = list(db.certificate_items.find(
+        {'certificate_id': cert_doc['_id'], 'is_active': {'$ne': False}},
+        {'specimen_sections.parsed_test_results': 0}
+    ).sort('created_at', -1))
+
+    specimen_oids = [_to_object_id(oid) for lot in sample_lots for oid in lot.get('specimen_oids', [])]
+    specimen_oids += [_to_object_id(section.get('specimen_id')) for item in item_docs for section in item.get('specimen_sections', [])]
+    specimens_by_id = _find_by_ids(db.specimens, specimen_oids, {'specimen_id': 1, 'created_at': 1, 'updated_at': 1})
+
+    if sample_prep_doc:
+        sample_lots_details = []
+        all_specimens = []
+
+        for sample_lot in sample_lots:
+            sample_lot_info = {
+                'sample_lot_id': str(sample_lot.get('sample_lot_id', '')),
+                'item_no': 'Unknown',
+                'sample_type': 'Unknown',
+                'material_type': 'Unknown',
+                'description': 'Unknown',
+                'job_id': 'Unknown',
+                'job_details': {}
+            }
+
+            sample_lot_oid = _to_object_id(sample_lot.get('sample_lot_id'))
+            sample_lot_obj = lots_by_id.get(sample_lot_oid)
+            if sample_lot_oid:
+                dependencies['sample_lot_ids'].add(sample_lot_oid)
+            if sample_lot_obj:
+                sample_lot_info.update({
+                    'item_no': sample_lot_obj.get('item_no', 'Unknown'),
+                    'sample_type': sample_lot_obj.get('sample_type', 'Unknown'),
+                    'material_type': sample_lot_obj.get('material_type', 'Unknown'),
+                    'description': sample_lot_obj.get('description', 'Unknown')
+                })
+
+                job_oid = _to_object_id(sample_lot_obj.get('job_id'))
+                job_obj = jobs_by_id.get(job_oid)
+                if job_oid:
+                    dependencies['job_ids'].add(job_oid)
+                if job_obj:
+                    sample_lot_info['job_id'] = job_obj.get('job_id', 'Unknown')
+
+                    lot_client_name = 'Unknown'
+                    client_oid = _to_object_id(job_obj.get('client_id'))
+                    if client_oid:
+                        dependencies['client_ids'].add(client_oid)
+                        client_obj = clients_by_id.get(client_oid)
+                        if client_obj:
+                            lot_client_name = client_obj.get('client_name', 'Unknown')
+
+                    sample_lot_info['job_details'] = {
+                        'project_name': job_obj.get('project_name', ''),
+                        'end_user': job_obj.get('end_user', ''),
+                        'receive_date': job_obj.get('receive_date', ''),
+                        'client_name': lot_client_name
+                    }
+
+                    # Certificate header uses the job of the first sample lot
+                    if not sample_lots_details:
+                        job_id = job_obj.get('job_id', 'Unknown')
+                        project_name = job_obj.get('project_name', 'Unknown')
+                        client_name = lot_client_name
+
+            test_method_info = {
+                'test_method_oid': str(sample_lot.get('test_method_oid', '')),
+                'test_name': 'Unknown Method',
+                'test_description': 'Unknown'
+            }
+            test_method_oid = _to_object_id(sample_lot.get('test_method_oid'))
+            if test_method_oid:
+                dependencies['test_method_ids'].add(test_method_oid)
+            test_method_obj = test_methods_by_id.get(test_method_oid)
+            if test_method_obj:
+                test_method_info.update({
+                    'test_name': test_method_obj.get('test_name', 'Unknown Method'),
+                    'test_description': test_method_obj.get('test_description', 'Unknown'),
+                    'test_columns': test_method_obj.get('test_columns', []),
+                    'hasImage': test_method_obj.get('hasImage', False)
+                })
+
+            sample_lot_specimens = []
+            for specimen_oid in sample_lot.get('specimen_oids', []):
+                specimen_info = {
+                    'specimen_oid': str(specimen_oid),
+                    'specimen_id': 'Unknown',
+                    'created_at': '',
+                    'updated_at': ''
+                }
+                specimen_object_id = _to_object_id(specimen_oid)
+                if specimen_object_id:
+                    dependencies['specimen_ids'].add(specimen_object_id)
+                specimen_obj = specimens_by_id.get(specimen_object_id)
+                if specimen_obj:
+                    specimen_info.update({
+                        'specimen_id': specimen_obj.get('specimen_id', 'Unknown'),
+                        'created_at': _isoformat(specimen_obj.get('created_at')),
+                        'updated_at': _isoformat(specimen_obj.get('updated_at'))
+                    })
+
+                sample_lot_specimens.append(specimen_info)
+                all_specimens.append(specimen_info)
+
+            sample_lots_details.append({
+                'item_description': sample_lot.get('item_description', ''),
+                'planned_test_date': sample_lot.get('planned_test_date'),
+                'dimension_spec': sample_lot.get('dimension_spec'),
+                'request_by': sample_lot.get('request_by'),
+                'remarks': sample_lot.get('remarks'),
+                'sample_lot_info': sample_lot_info,
+                'test_method': test_method_info,
+                'specimens': sample_lot_specimens,
+                'specimens_count': len(sample_lot_specimens)
+            })
+
+        request_info.update({
+            'request_no': sample_prep_doc.get('request_no', 'Unknown'),
+            'sample_lots_count': len(sample_lots),
+            'total_specimens': len(all_specimens),
+            'sample_lots': sample_lots_details,
+            'specimens': all_specimens,
+            'created_at': _isoformat(sample_prep_doc.get('created_at')),
+            'updated_at': _isoformat(sample_prep_doc.get('updated_at'))
+        })
+
+    certificate_items = []
+    for item_doc in item_docs:
+        dependencies['certificate_item_ids'].add(item_doc['_id'])
+        specimen_sections_data = []
+        for section in item_doc.get('specimen_sections', []):
+            specimen_object_id = _to_object_id(section.get('specimen_id'))
+            if specimen_object_id:
+                dependencies['specimen_ids'].add(specimen_object_id)
+            specimen_doc = specimens_by_id.get(specimen_object_id)
+
+            specimen_sections_data.append({
+                'test_results': section.get('test_results', ''),
+                # Stored unsigned; URLs are signed on read (signed_certificate_items)
+                'images_list': [{
+                    'image_url': image.get('image_url', ''),
+                    'caption': image.get('caption', '')
+                } for image in section.get('images_list', [])],
+                'specimen_id': str(section.get('specimen_id')),
+                'specimen_name': specimen_doc.get('specimen_id', 'Unknown') if specimen_doc else 'Unknown',
+                'equipment_name': section.get('equipment_name', ''),
+                'equipment_calibration': section.get('equipment_calibration', '')
+            })
+
+        certificate_items.append({
+            '_id': str(item_doc.get('_id')),
+            'certificate_id': str(item_doc.get('certificate_id')),
+            'sample_preparation_method': item_doc.get('sample_preparation_method', ''),
+            'material_grade': item_doc.get('material_grade', ''),
+            'temperature': item_doc.get('temperature', ''),
+            'humidity': item_doc.get('humidity', ''),
+            'po': item_doc.get('po', ''),
+            'mtc_no': item_doc.get('mtc_no', ''),
+            'heat_no': item_doc.get('heat_no', ''),
+            'comments': item_doc.get('comments', ''),
+            'specimen_sections': specimen_sections_data,
+            'equipment_name': item_doc.get('equipment_name', ''),
+            'equipment_calibration': item_doc.get('equipment_calibration', ''),
+            'created_at': _isoformat(item_doc.get('created_at')),
+            'updated_at': _isoformat(item_doc.get('updated_at'))
+        })
+
+    data = {
+        'id': str(cert_doc.get('_id', '')),
+        'certificate_id': cert_doc.get('certificate_id', ''),
+        'client_name': client_name,
+        'job_id': job_id,
+        'project_name': project_name,
+        'date_of_sampling': cert_doc.get('date_of_sampling', ''),
+        'date_of_testing': cert_doc.get('date_of_testing', ''),
+        'issue_date': cert_doc.get('issue_date', ''),
+        'revision_no': cert_doc.get('revision_no', ''),
+        'customers_name_no': cert_doc.get('customers_name_no', ''),
+        'atten': cert_doc.get('atten', ''),
+        'customer_po': cert_doc.get('customer_po', ''),
+        'tested_by': cert_doc.get('tested_by', ''),
+        'reviewed_by': cert_doc.get('reviewed_by', ''),
+        'request_info': request_info,
+        'created_at': _isoformat(cert_doc.get('created_at')),
+        'updated_at': _isoformat(cert_doc.get('updated_at'))
+    }
+
+    return data, certificate_items, {key: sorted(ids) for key, ids in dependencies.items()}
+
+
+def write_certificate_snapshot(db, certificate_oid, cert_doc=None):
+    """
+    (Re)build the snapshot of a certificate and store it as a new version
+    The snapshot is only marked fresh if no invalidation happened while it was
+    built (its generation is unchanged); otherwise the build is retried.
+    Returns: the stored snapshot document, or None if the certificate does not exist
+    """
+    collection = CertificateSnapshot._get_collection()
+    snapshot_fields = None
+    for attempt in range(SNAPSHOT_WRITE_ATTEMPTS):
+        current = collection.find_one({'certificate_oid': certificate_oid}, {'generation': 1})
+        read_generation = current.get('generation', 0) if current else 0
+
+        if cert_doc is None or attempt:
+            cert_doc = db.complete_certificates.find_one({'_id': certificate_oid})
+        if not cert_doc:
+            delete_certificate_snapshot(db, certificate_oid)
+            return None
+
+        data, certificate_items, dependencies = build_certificate_snapshot(db, cert_doc)
+        now = datetime.now()
+        snapshot_fields = {
+            'certificate_id': cert_doc.get('certificate_id', ''),
+            'revision_no': cert_doc.get('revision_no', ''),
+            'data': data,
+            'certificate_items': certificate_items,
+            'dependencies': dependencies,
+            'generated_at': now
+        }
+
+        # Snapshots written before generations existed have no generation field
+        generation_filter = read_generation if read_generation else {'$in': [0, None]}
+        try:
+            snapshot = collection.find_one_and_update(
+                {'certificate_oid': certificate_oid, 'generation': generation_filter},
+                {
+                    '$set': {**snapshot_fields, 'is_stale': False, 'generation': read_generation},
+                    '$inc': {'version': 1},
+                    '$setOnInsert': {'created_at': now}
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Invalidated (or created by another writer) since the generation was read
+            snapshot = None
+        if snapshot:
+            return snapshot
+
+    # Still being invalidated: store the latest build but leave it stale
+    return collection.find_one_and_update(
+        {'certificate_oid': certificate_oid},
+        {
+            '$set': snapshot_fields,
+            '$inc': {'version': 1},
+            '$setOnInsert': {'created_at': snapshot_fields['generated_at'], 'is_stale': True, 'generation': 0}
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def signed_certificate_items(certificate_items):
+    """
+    Snapshot certificate items with signed image and thumbnail URLs
+    """
+    return [{
+        **item,
+        'specimen_sections': [{
+            **section,
+            'images_list': [{
+                **image,
+                'image_url': media_url(image.get('image_url', '')) or '',
+                'thumbnail_url': get_thumbnail_url(image.get('image_url', ''))
+            } for image in section.get('images_list', [])]
+        } for section in item.get('specimen_sections', [])]
+    } for item in certificate_items]
+
+
+def get_certificate_snapshot(db, certificate_oid):
+    """
+    Return the current snapshot of a certificate, rebuilding it only if missing or stale
+    """
+    snapshot = CertificateSnapshot._get_collection().find_one({'certificate_oid': certificate_oid})
+    if snapshot and not snapshot.get('is_stale'):
+        return snapshot
+    return write_certificate_snapshot(db, certificate_oid)
+
+
+def delete_certificate_snapshot(db, certificate_oid):
+    CertificateSnapshot._get_collection().delete_one({'certificate_oid': certificate_oid})
+
+
+def invalidate_certificate_snapshots(dependency, object_ids):
+    """
+    Mark every snapshot built from the given documents as stale
+    Bumps the generation even if already stale, so a rebuild in progress does not clear it.
+    dependency: one of SNAPSHOT_DEPENDENCIES (e.g. 'client_ids')
+    Never raises, so callers can use it after a successful write.
+    """
+    try:
+        object_ids = [object_id for object_id in (_to_object_id(value) for value in object_ids) if object_id]
+        if dependency not in SNAPSHOT_DEPENDENCIES or not object_ids:
+            return 0
+
+        result = CertificateSnapshot._get_collection().update_many(
+            {f'dependencies.{dependency}': {'$in': object_ids}},
+            {'$set': {'is_stale': True}, '$inc': {'generation': 1}}
+        )
+        return result.modified_count
+    except Exception as e:
+        print(f"Error invalidating certificate snapshots ({dependency}): {e}")
+        return 0
+
+
+def invalidate_certificate_snapshot(certificate_oid):
+    """
+    Mark the snapshot of one certificate as stale (e.g. after a certificate item is added)
+    """
+    try:
+        certificate_oid = _to_object_id(certificate_oid)
+        if certificate_oid:
+            CertificateSnapshot._get_collection().update_one(
+                {'certificate_oid': certificate_oid},
+                {'$set': {'is_stale': True}, '$inc': {'generation': 1}}
+            )
+    except Exception as e:
+        print(f"Error invalidating certificate snapshot {certificate_oid}: {e}")
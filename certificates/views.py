@@ -8,9 +8,12 @@ from bson import ObjectId
 from mongoengine import connection
 from mongoengine.errors import DoesNotExist, ValidationError, NotUniqueError
 
-from .models import Certificate
+from .models import Certificate, CERTIFICATE_DATE_FIELDS
+from .snapshots import get_certificate_snapshot, write_certificate_snapshot, delete_certificate_snapshot, signed_certificate_items
 from samplepreperation.models import SamplePreparation
+from samplejobs.counters import increment_job_counters, request_job_ids
 from authentication.decorators import any_authenticated_user
+from lims_backend.utilities.dates import shadow_dates, apply_date_range_filters, date_range_filter, is_date_backfill_complete
 
 
 # ============= CERTIFICATE CRUD ENDPOINTS =============
@@ -30,7 +33,16 @@ def certificate_list(request):
             db = connection.get_db()
             certificates_collection = db.complete_certificates
             
-            certificates = certificates_collection.find({})
+            query = {}
+            try:
+                apply_date_range_filters(request, query, ('issue_date', 'date_of_testing', 'date_of_sampling'))
+            except ValueError as e:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': str(e)
+                }, status=400)
+            
+            certificates = certificates_collection.find(query)
             data = []
             
             for cert_doc in certificates:
@@ -262,6 +274,13 @@ def certificate_list(request):
                 request_id=ObjectId(data['request_id'])
             )
             certificate.save()
+            increment_job_counters(db, request_job_ids(db, certificate.request_id), certificates=1)
+            
+            # Freeze the issued certificate view
+            try:
+                write_certificate_snapshot(db, certificate.id)
+            except Exception as e:
+                print(f"Error writing certificate snapshot: {e}")
             
             return JsonResponse({
                 'status': 'success',
@@ -301,7 +320,8 @@ def certificate_list(request):
 def certificate_detail(request, certificate_oid):
     """
     Get, update, or delete a specific certificate by ObjectId
-    GET: Returns certificate details with complete sample preparation information
+    GET: Returns certificate details with complete sample preparation information,
+         read from the certificate snapshot (?include_items=true adds certificate items)
     PUT: Updates certificate information
     DELETE: Deletes the certificate (soft delete)
     """
@@ -319,6 +339,26 @@ def certificate_detail(request, certificate_oid):
         db = connection.get_db()
         certificates_collection = db.complete_certificates
         
+        if request.method == 'GET':
+            # Single read of the denormalized snapshot; rebuilt only when missing or stale
+            snapshot = get_certificate_snapshot(db, obj_id)
+            if not snapshot:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': 'Certificate not found'
+                }, status=404)
+            
+            response_data = {
+                'status': 'success',
+                'data': snapshot.get('data', {}),
+                'snapshot_version': snapshot.get('version', 1),
+                'generated_at': snapshot.get('generated_at').isoformat() if snapshot.get('generated_at') else ''
+            }
+            if request.GET.get('include_items', '').lower() == 'true':
+                response_data['certificate_items'] = signed_certificate_items(snapshot.get('certificate_items', []))
+            
+            return JsonResponse(response_data)
+        
         cert_doc = certificates_collection.find_one({'_id': obj_id})
         if not cert_doc:
             return JsonResponse({
@@ -326,221 +366,7 @@ def certificate_detail(request, certificate_oid):
                 'message': 'Certificate not found'
             }, status=404)
         
-        if request.method == 'GET':
-            # Get detailed sample preparation information
-            request_info = {
-                'request_id': str(cert_doc.get('request_id', '')),
-                'request_no': 'Unknown',
-                'sample_lots_count': 0,
-                'total_specimens': 0,
-                'sample_lots': [],
-                'specimens': []
-            }
-            
-            try:
-                # request_id is the ObjectId of the sample preparation
-                sample_prep_id = cert_doc.get('request_id')
-                if sample_prep_id:
-                    # Use raw MongoDB query to find sample preparation
-                    sample_prep_collection = db.sample_preparations
-                    sample_prep_doc = sample_prep_collection.find_one({'_id': ObjectId(sample_prep_id)})
-                    
-                    if sample_prep_doc:
-                        # Get detailed sample lots and specimens information
-                        sample_lots_details = []
-                        all_specimens = []
-                        
-                        for sample_lot in sample_prep_doc.get('sample_lots', []):
-                            # Get sample lot information
-                            sample_lot_obj = None
-                            sample_lot_info = {
-                                'sample_lot_id': str(sample_lot.get('sample_lot_id', '')),
-                                'item_no': 'Unknown',
-                                'sample_type': 'Unknown',
-                                'material_type': 'Unknown',
-                                'description': 'Unknown',
-                                'job_id': 'Unknown',
-                                'job_details': {}
-                            }
-                            
-                            try:
-                                sample_lots_collection = db.sample_lots
-                                sample_lot_obj = sample_lots_collection.find_one({'_id': ObjectId(sample_lot.get('sample_lot_id'))})
-                                if sample_lot_obj:
-                                    sample_lot_info.update({
-                                        'item_no': sample_lot_obj.get('item_no', 'Unknown'),
-                                        'sample_type': sample_lot_obj.get('sample_type', 'Unknown'),
-                                        'material_type': sample_lot_obj.get('material_type', 'Unknown'),
-                                        'description': sample_lot_obj.get('description', 'Unknown')
-                                    })
-                                    
-                                    # Get job information
-                                    try:
-                                        jobs_collection = db.jobs
-                                        job_obj_id = sample_lot_obj.get('job_id')
-                                        if job_obj_id:
-                                            # Handle both ObjectId and string job_id
-                                            if isinstance(job_obj_id, str):
-                                                job_obj_id = ObjectId(job_obj_id)
-                                            
-                                            job_obj = jobs_collection.find_one({'_id': job_obj_id})
-                                            if job_obj:
-                                                sample_lot_info['job_id'] = job_obj.get('job_id', 'Unknown')
-                                                
-                                                # Get client information
-                                                client_name = 'Unknown'
-                                                try:
-                                                    clients_collection = db.clients
-                                                    client_obj_id = job_obj.get('client_id')
-                                                    if client_obj_id:
-                                                        # Handle both ObjectId and string client_id
-                                                        if isinstance(client_obj_id, str):
-                                                            client_obj_id = ObjectId(client_obj_id)
-                                                        client_obj = clients_collection.find_one({'_id': client_obj_id})
-                                                        if client_obj:
-                                                            client_name = client_obj.get('client_name', 'Unknown')
-                                                except Exception as e:
-                                                    print(f"Error fetching client: {e}")
-                                                    pass
-                                                
-                                                sample_lot_info['job_details'] = {
-                                                    'project_name': job_obj.get('project_name', ''),
-                                                    'end_user': job_obj.get('end_user', ''),
-                                                    'receive_date': job_obj.get('receive_date', ''),
-                                                    'client_name': client_name
-                                                }
-                                    except Exception as e:
-                                        print(f"Error fetching job: {e}")
-                                        pass
-                            except Exception:
-                                pass
-                            
-                            # Get test method information
-                            test_method_info = {
-                                'test_method_oid': str(sample_lot.get('test_method_oid', '')),
-                                'test_name': 'Unknown Method',
-                                'test_description': 'Unknown'
-                            }
-                            try:
-                                test_methods_collection = db.test_methods
-                                test_method_obj = test_methods_collection.find_one({'_id': ObjectId(sample_lot.get('test_method_oid'))})
-                                if test_method_obj:
-                                    test_method_info.update({
-                                        'test_name': test_method_obj.get('test_name', 'Unknown Method'),
-                                        'test_description': test_method_obj.get('test_description', 'Unknown'),
-                                        'test_columns': test_method_obj.get('test_columns', []),
-                                        'hasImage': test_method_obj.get('hasImage', False)
-                                    })
-                            except Exception:
-                                pass
-                            
-                            # Get specimens information for this sample lot
-                            sample_lot_specimens = []
-                            for specimen_oid in sample_lot.get('specimen_oids', []):
-                                specimen_info = {
-                                    'specimen_oid': str(specimen_oid),
-                                    'specimen_id': 'Unknown',
-                                    'created_at': '',
-                                    'updated_at': ''
-                                }
-                                try:
-                                    specimens_collection = db.specimens
-                                    specimen_obj = specimens_collection.find_one({'_id': ObjectId(specimen_oid)})
-                                    if specimen_obj:
-                                        specimen_info.update({
-                                            'specimen_id': specimen_obj.get('specimen_id', 'Unknown'),
-                                            'created_at': specimen_obj.get('created_at').isoformat() if specimen_obj.get('created_at') else '',
-                                            'updated_at': specimen_obj.get('updated_at').isoformat() if specimen_obj.get('updated_at') else ''
-                                        })
-                                except Exception:
-                                    pass
-                                
-                                sample_lot_specimens.append(specimen_info)
-                                all_specimens.append(specimen_info)
-                            
-                            sample_lots_details.append({
-                                'item_description': sample_lot.get('item_description', ''),
-                                'planned_test_date': sample_lot.get('planned_test_date'),
-                                'dimension_spec': sample_lot.get('dimension_spec'),
-                                'request_by': sample_lot.get('request_by'),
-                                'remarks': sample_lot.get('remarks'),
-                                'sample_lot_info': sample_lot_info,
-                                'test_method': test_method_info,
-                                'specimens': sample_lot_specimens,
-                                'specimens_count': len(sample_lot_specimens)
-                            })
-                        
-                        request_info.update({
-                            'request_no': sample_prep_doc.get('request_no', 'Unknown'),
-                            'sample_lots_count': len(sample_prep_doc.get('sample_lots', [])),
-                            'total_specimens': len(all_specimens),
-                            'sample_lots': sample_lots_details,
-                            'specimens': all_specimens,
-                            'created_at': sample_prep_doc.get('created_at').isoformat() if sample_prep_doc.get('created_at') else '',
-                            'updated_at': sample_prep_doc.get('updated_at').isoformat() if sample_prep_doc.get('updated_at') else ''
-                        })
-            except (DoesNotExist, Exception) as e:
-                print(f"Error fetching sample preparation: {e}")
-            
-            # Get job information directly from job collection using sample preparation data
-            client_name = 'Unknown'
-            job_id = 'Unknown'
-            project_name = 'Unknown'
-            
-            try:
-                # Get job information from the first sample lot in sample preparation
-                if request_info.get('sample_lots') and len(request_info['sample_lots']) > 0:
-                    first_sample_lot = request_info['sample_lots'][0]
-                    sample_lot_id = first_sample_lot.get('sample_lot_info', {}).get('sample_lot_id')
-                    
-                    if sample_lot_id:
-                        # Get sample lot document
-                        sample_lots_collection = db.sample_lots
-                        sample_lot_doc = sample_lots_collection.find_one({'_id': ObjectId(sample_lot_id)})
-                        
-                        if sample_lot_doc and sample_lot_doc.get('job_id'):
-                            # Get job document
-                            jobs_collection = db.jobs
-                            job_doc = jobs_collection.find_one({'_id': sample_lot_doc.get('job_id')})
-                            
-                            if job_doc:
-                                job_id = job_doc.get('job_id', 'Unknown')
-                                project_name = job_doc.get('project_name', 'Unknown')
-                                
-                                # Get client information
-                                if job_doc.get('client_id'):
-                                    clients_collection = db.clients
-                                    client_doc = clients_collection.find_one({'_id': job_doc.get('client_id')})
-                                    if client_doc:
-                                        client_name = client_doc.get('client_name', 'Unknown')
-            except Exception as e:
-                print(f"Error getting job/client info: {e}")
-                pass
-            
-            return JsonResponse({
-                'status': 'success',
-                'data': {
-                    'id': str(cert_doc.get('_id', '')),
-                    'certificate_id': cert_doc.get('certificate_id', ''),
-                    'client_name': client_name,
-                    'job_id': job_id,
-                    'project_name': project_name,
-                    'date_of_sampling': cert_doc.get('date_of_sampling', ''),
-                    'date_of_testing': cert_doc.get('date_of_testing', ''),
-                    'issue_date': cert_doc.get('issue_date', ''),
-                    'revision_no': cert_doc.get('revision_no', ''),
-                    'customers_name_no': cert_doc.get('customers_name_no', ''),
-                    'atten': cert_doc.get('atten', ''),
-                    'customer_po': cert_doc.get('customer_po', ''),
-                    'tested_by': cert_doc.get('tested_by', ''),
-                    'reviewed_by': cert_doc.get('reviewed_by', ''),
-                    'request_info': request_info,
-                    'created_at': cert_doc.get('created_at').isoformat() if cert_doc.get('created_at') else '',
-                    'updated_at': cert_doc.get('updated_at').isoformat() if cert_doc.get('updated_at') else ''
-                }
-            })
-        
-        elif request.method == 'PUT':
+        if request.method == 'PUT':
             # Check authentication for PUT requests
             auth_header = request.META.get('HTTP_AUTHORIZATION')
             if not auth_header or not auth_header.startswith('Bearer '):
@@ -561,6 +387,7 @@ def certificate_detail(request, certificate_oid):
                 for field in update_fields:
                     if field in data:
                         update_doc[field] = data[field]
+                update_doc.update(shadow_dates(update_doc, CERTIFICATE_DATE_FIELDS))
                 
                 # Add updated timestamp
                 update_doc['updated_at'] = datetime.now()
@@ -586,6 +413,12 @@ def certificate_detail(request, certificate_oid):
                 # Get updated certificate document
                 updated_cert = certificates_collection.find_one({'_id': obj_id})
                 
+                # Revision: store a new snapshot version
+                try:
+                    write_certificate_snapshot(db, obj_id, updated_cert)
+                except Exception as e:
+                    print(f"Error writing certificate snapshot: {e}")
+                
                 return JsonResponse({
                     'status': 'success',
                     'message': 'Certificate updated successfully',
@@ -628,6 +461,9 @@ def certificate_detail(request, certificate_oid):
                     'message': 'Certificate not found'
                 }, status=404)
             
+            delete_certificate_snapshot(db, obj_id)
+            increment_job_counters(db, request_job_ids(db, cert_doc.get('request_id')), certificates=-1)
+            
             return JsonResponse({
                 'status': 'success',
                 'message': 'Certificate deleted successfully',
@@ -656,6 +492,7 @@ def certificate_search(request):
     - customers_name_no: Search by customer name/number (partial match)
     - tested_by: Search by tester name (partial match)
     - issue_date: Search by issue date (exact match)
+    - issue_date_from / issue_date_to (also date_of_testing_*, date_of_sampling_*): Date range, YYYY-MM-DD inclusive
     - q: Global search across all text fields (certificate_id, customers_name_no, tested_by, reviewed_by, request_no)
     """
     try:
@@ -679,6 +516,13 @@ def certificate_search(request):
             query['tested_by'] = {'$regex': tester, '$options': 'i'}
         if issue_date:
             query['issue_date'] = issue_date
+        try:
+            apply_date_range_filters(request, query, ('issue_date', 'date_of_testing', 'date_of_sampling'))
+        except ValueError as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
         
         # Handle global search parameter 'q'
         if q:
@@ -925,6 +769,7 @@ def certificate_search(request):
 def certificate_stats(request):
     """
     Get certificate statistics
+    Optional issue_date_from / issue_date_to (YYYY-MM-DD) limit the monthly issue counts
     """
     try:
         # Use raw query for statistics
@@ -933,24 +778,50 @@ def certificate_stats(request):
         
         total_certificates = certificates_collection.count_documents({})
         
-        # Count by month of issue
-        monthly_stats = certificates_collection.aggregate([
-            {'$match': {'issue_date': {'$ne': ''}}},
-            {
-                '$addFields': {
-                    'issue_year_month': {
-                        '$substr': ['$issue_date', 0, 7]  # Extract YYYY-MM
+        try:
+            issue_date_range = date_range_filter(request, 'issue_date') or {}
+        except ValueError as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
+
+        if is_date_backfill_complete('complete_certificates'):
+            # Count by month of issue (range scan on the issue_date_dt index)
+            monthly_pipeline = [
+                {'$match': {'issue_date_dt': {'$type': 'date', **issue_date_range}}},
+                {
+                    '$group': {
+                        '_id': {'$dateToString': {'format': '%Y-%m', 'date': '$issue_date_dt'}},
+                        'count': {'$sum': 1}
                     }
-                }
-            },
-            {
-                '$group': {
-                    '_id': '$issue_year_month',
-                    'count': {'$sum': 1}
-                }
-            },
-            {'$sort': {'_id': -1}}
-        ])
+                },
+                {'$sort': {'_id': -1}}
+            ]
+        else:
+            # Older certificates may lack issue_date_dt until backfill_date_fields has run:
+            # group on the 'YYYY-MM-DD' string instead
+            issue_date_match = {'$ne': ''}
+            if '$gte' in issue_date_range:
+                issue_date_match['$gte'] = issue_date_range['$gte'].strftime('%Y-%m-%d')
+            if '$lt' in issue_date_range:
+                issue_date_match['$lt'] = issue_date_range['$lt'].strftime('%Y-%m-%d')
+            monthly_pipeline = [
+                {'$match': {'issue_date': issue_date_match}},
+                {
+                    '$addFields': {
+                        'issue_year_month': {'$substr': ['$issue_date', 0, 7]}
+                    }
+                },
+                {
+                    '$group': {
+                        '_id': '$issue_year_month',
+                        'count': {'$sum': 1}
+                    }
+                },
+                {'$sort': {'_id': -1}}
+            ]
+        monthly_stats = certificates_collection.aggregate(monthly_pipeline)
         
         # Count by tested_by
         tester_stats = certificates_collection.aggregate([
@@ -0,0 +1,77 @@
+"""
+Client overview
+
+One aggregation returns a page of clients with their workload: job count,
+active sample lot count, certificate count and last activity date. The page
+is cut before the lookups, so only the page's clients are joined, and every
+lookup follows an indexed key:
+
+    clients._id -> jobs.client_id -> sample_lots.job_id
+        -> sample_preparations.sample_lots.sample_lot_id -> complete_certificates.request_id
+
+The lookups combine localField/foreignField with a projection pipeline,
+which needs MongoDB 5.0+.
+"""
+
+
+def client_overview_pipeline(match, offset, limit):
+    """
+    Aggregation pipeline over the clients collection for one overview page
+    """
+    return [
+        {'$match': match},
+        {'$sort': {'created_at': -1, '_id': -1}},
+        {'$skip': offset},
+        {'$limit': limit},
+        {'$lookup': {
+            'from': 'jobs', 'localField': '_id', 'foreignField': 'client_id', 'as': 'jobs',
+            'pipeline': [{'$project': {'updated_at': 1}}]
+        }},
+        {'$lookup': {
+            'from': 'sample_lots', 'localField': 'jobs._id', 'foreignField': 'job_id', 'as': 'sample_lots',
+            'pipeline': [{'$project': {'is_active': 1, 'updated_at': 1}}]
+        }},
+        {'$lookup': {
+            'from': 'sample_preparations', 'localField': 'sample_lots._id', 'foreignField': 'sample_lots.sample_lot_id',
+            'as': 'requests', 'pipeline': [{'$project': {'_id': 1}}]
+        }},
+        {'$lookup': {
+            'from': 'complete_certificates', 'localField': 'requests._id', 'foreignField': 'request_id', 'as': 'certificates',
+            'pipeline': [{'$project': {'updated_at': 1}}]
+        }},
+        {'$project': {
+            'client_id': 1, 'client_name': 1, 'company_name': 1, 'email': 1, 'phone': 1,
+            'contact_person': 1, 'is_active': 1, 'created_at': 1, 'updated_at': 1,
+            'job_count': {'$size': '$jobs'},
+            # Lots written before is_active existed count as active
+            'active_sample_lot_count': {'$size': {'$filter': {
+                'input': '$sample_lots', 'as': 'lot', 'cond': {'$ne': ['$$lot.is_active', False]}
+            }}},
+            'certificate_count': {'$size': '$certificates'},
+            'last_activity_at': {'$max': [
+                {'$max': '$jobs.updated_at'},
+                {'$max': '$sample_lots.updated_at'},
+                {'$max': '$certificates.updated_at'}
+            ]}
+        }}
+    ]
+
+
+def client_overview_row(client_doc):
+    created_at = client_doc.get('created_at')
+    last_activity_at = client_doc.get('last_activity_at')
+    return {
+        'id': str(client_doc['_id']),
+        'client_id': client_doc.get('client_id'),
+        'client_name': client_doc.get('client_name', ''),
+        'company_name': client_doc.get('company_name', ''),
+        'email': client_doc.get('email', ''),
+        'phone': client_doc.get('phone', ''),
+        'contact_person': client_doc.get('contact_person', ''),
+        'is_active': client_doc.get('is_active', True),
+        'job_count': client_doc.get('job_count', 0),
+        'active_sample_lot_count': client_doc.get('active_sample_lot_count', 0),
+        'certificate_count': client_doc.get('certificate_count', 0),
+        'last_activity_at': last_activity_at.isoformat() if last_activity_at else None,
+        'created_at': created_at.isoformat() if created_at else ''
+    }
@@ -9,6 +9,7 @@ urlpatterns = [
     # Additional endpoints - these must come BEFORE the detail endpoint
     path('search/', views.client_search, name='client_search'),         # GET: Search clients
     path('stats/', views.client_stats, name='client_stats'),           # GET: Client statistics
+    path('overview/', views.client_overview, name='client_overview'),  # GET: Clients with workload counts
     # Detail endpoint - this must come LAST to avoid conflicts
     path('<str:object_id>/', views.client_detail, name='client_detail'), # GET: Detail, PUT: Update, DELETE: Delete
 ]
\ No newline at end of file
@@ -5,9 +5,11 @@ from django.views.decorators.http import require_http_methods
 import json
 from datetime import datetime
 from .models import Client
+from .overview import client_overview_pipeline, client_overview_row
 from mongoengine.errors import DoesNotExist, ValidationError
 from authentication.decorators import any_authenticated_user
 from lims_backend.utilities.pagination import get_pagination_params, create_pagination_response, paginate_queryset
+from certificates.snapshots import invalidate_certificate_snapshots
 
 
 @csrf_exempt
@@ -204,6 +206,7 @@ def client_detail(request, object_id):
                     client.update(**update_doc)
                     # Refresh the client object to get updated data
                     client.reload()
+                    invalidate_certificate_snapshots('client_ids', [client.id])
                 
                 return JsonResponse({
                     'status': 'success',
@@ -235,6 +238,7 @@ def client_detail(request, object_id):
         
         elif request.method == 'DELETE':
             client.delete()
+            invalidate_certificate_snapshots('client_ids', [client.id])
             return JsonResponse({
                 'status': 'success',
                 'message': 'Client deleted successfully'
@@ -340,3 +344,47 @@ def client_stats(request):
             'status': 'error',
             'message': str(e)
         }, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@any_authenticated_user
+def client_overview(request):
+    """
+    Paginated clients with job count, active sample lot count, certificate count
+    and last activity date, computed in one aggregation (see clients/overview.py)
+    Query parameters:
+    - client_name: Search by client name (case-insensitive)
+    - include_inactive: true to include inactive clients
+    """
+    try:
+        # Get pagination parameters
+        page, limit, offset = get_pagination_params(request)
+        
+        client_name = request.GET.get('client_name', '')
+        include_inactive = request.GET.get('include_inactive', '').lower() == 'true'
+        
+        match = {} if include_inactive else {'is_active': True}
+        if client_name:
+            match['client_name'] = {'$regex': client_name, '$options': 'i'}
+        
+        clients_collection = Client._get_collection()
+        total_records = clients_collection.count_documents(match)
+        data = [
+            client_overview_row(client_doc)
+            for client_doc in clients_collection.aggregate(client_overview_pipeline(match, offset, limit))
+        ]
+        
+        # Create paginated response
+        response_data = create_pagination_response(data, total_records, page, limit)
+        
+        return JsonResponse({
+            'status': 'success',
+            **response_data
+        })
+        
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
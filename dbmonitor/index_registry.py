@@ -0,0 +1,193 @@
+"""
+Declarative index registry
+
+Compound, partial and collation indexes that back the API's query shapes are
+declared here, one list per collection, and applied by
+`python manage.py sync_indexes`. Single field indexes stay in each model's
+meta['indexes']; indexes that need options mongoengine meta cannot express
+cleanly (partial filters, collations, explicit names, sort direction pairs)
+belong here so there is one place to review them.
+
+Each entry:
+    name                     index name (drift is detected by name)
+    keys                     list of (field, direction)
+    unique                   optional, bool
+    partialFilterExpression  optional, filter document
+    collation                optional, collation document
+"""
+
+# Case-insensitive ordering/matching for names shown in lists and searches
+CASE_INSENSITIVE = {'locale': 'en', 'strength': 2}
+
+# Soft delete predicate; partial indexes on it only serve queries that use the
+# plain {'is_active': True} filter (see lims_backend/utilities/soft_delete.py)
+ACTIVE = {'is_active': True}
+
+
+INDEX_REGISTRY = {
+    'jobs': [
+        {'name': 'client_created', 'keys': [('client_id', 1), ('created_at', -1)]},
+        {'name': 'created_desc', 'keys': [('created_at', -1)]},
+    ],
+    'sample_lots': [
+        # Full index kept next to active_job_created: job counters and job document
+        # numbers (samplejobs) read every lot of a job, and the legacy $or active
+        # filter cannot use the partial index until backfill_is_active has run
+        {'name': 'job_created', 'keys': [('job_id', 1), ('created_at', -1)]},
+        {'name': 'active_created', 'keys': [('created_at', -1)], 'partialFilterExpression': ACTIVE},
+        {'name': 'active_job_created', 'keys': [('job_id', 1), ('created_at', -1)], 'partialFilterExpression': ACTIVE},
+        {'name': 'active_sample_type_created', 'keys': [('sample_type', 1), ('created_at', -1)], 'partialFilterExpression': ACTIVE},
+        {'name': 'active_material_type_created', 'keys': [('material_type', 1), ('created_at', -1)], 'partialFilterExpression': ACTIVE},
+    ],
+    'sample_preparations': [
+        {'name': 'created_desc', 'keys': [('created_at', -1)]},
+        {'name': 'sample_lot', 'keys': [('sample_lots.sample_lot_id', 1)]},
+    ],
+    'complete_certificates': [
+        {'name': 'request_created', 'keys': [('request_id', 1), ('created_at', -1)]},
+        {'name': 'created_desc', 'keys': [('created_at', -1)]},
+    ],
+    'certificate_items': [
+        # Full index kept next to active_certificate_created: certificate snapshots
+        # load items with {'is_active': {'$ne': False}}, and the legacy $or active
+        # filter cannot use the partial index either
+        {'name': 'certificate_created', 'keys': [('certificate_id', 1), ('created_at', -1)]},
+        {'name': 'active_created', 'keys': [('created_at', -1)], 'partialFilterExpression': ACTIVE},
+        {'name': 'active_certificate_created', 'keys': [('certificate_id', 1), ('created_at', -1)], 'partialFilterExpression': ACTIVE},
+        # material_grade / equipment list filters with match=exact are case-insensitive exact matches
+        {'name': 'material_grade_created_ci', 'keys': [('material_grade', 1), ('created_at', -1)], 'collation': CASE_INSENSITIVE},
+        {'name': 'equipment_created_ci', 'keys': [('equipment_name', 1), ('created_at', -1)], 'collation': CASE_INSENSITIVE},
+        {'name': 'section_equipment_created_ci', 'keys': [('specimen_sections.equipment_name', 1), ('created_at', -1)], 'collation': CASE_INSENSITIVE},
+    ],
+    'test_methods': [
+        {'name': 'active_created', 'keys': [('createdAt', -1)], 'partialFilterExpression': ACTIVE},
+    ],
+    'clients': [
+        {'name': 'client_name_ci', 'keys': [('client_name', 1)], 'collation': CASE_INSENSITIVE},
+        {'name': 'active_email', 'keys': [('email', 1)], 'partialFilterExpression': {'is_active': True}},
+        {'name': 'active_created', 'keys': [('is_active', 1), ('created_at', -1)]},
+    ],
+    'welders': [
+        {'name': 'active_created', 'keys': [('is_active', 1), ('created_at', -1)]},
+        {'name': 'operator_name_ci', 'keys': [('operator_name', 1)], 'collation': CASE_INSENSITIVE},
+    ],
+    'welder_cards': [
+        {'name': 'welder_created', 'keys': [('welder_id', 1), ('created_at', -1)]},
+        {'name': 'active_created', 'keys': [('is_active', 1), ('created_at', -1)]},
+    ],
+    'welder_certificates': [
+        {'name': 'card_created', 'keys': [('welder_card_id', 1), ('created_at', -1)]},
+        {'name': 'active_created', 'keys': [('is_active', 1), ('created_at', -1)]},
+    ],
+    'welder_performance_records': [
+        {'name': 'card_created', 'keys': [('welder_card_id', 1), ('created_at', -1)]},
+        {'name': 'active_created', 'keys': [('is_active', 1), ('created_at', -1)]},
+    ],
+    'pqrs': [
+        {'name': 'welder_created', 'keys': [('welder_id', 1), ('created_at', -1)]},
+        {'name': 'active_created', 'keys': [('is_active', 1), ('created_at', -1)]},
+    ],
+    'testing_reports': [
+        {'name': 'active_created', 'keys': [('is_active', 1), ('created_at', -1)]},
+    ],
+    'testing_report_results': [
+        {'name': 'welder_oid_inspection', 'keys': [('welder_oid', 1), ('date_of_inspection_dt', -1)]},
+        {'name': 'welder_id_inspection', 'keys': [('welder_id', 1), ('date_of_inspection_dt', -1)]},
+        {'name': 'iqama_inspection', 'keys': [('iqama_norm', 1), ('date_of_inspection_dt', -1)]},
+        {'name': 'status_inspection', 'keys': [('result_status_norm', 1), ('date_of_inspection_dt', -1)]},
+        # Rows are upserted on this key (testingreports/results_index.py)
+        {'name': 'report_index', 'keys': [('report_id', 1), ('result_index', 1)], 'unique': True},
+    ],
+    'equipment': [
+        {'name': 'active_verification_due', 'keys': [('verification_due', 1)], 'partialFilterExpression': {'is_active': True}},
+        {'name': 'active_created', 'keys': [('is_active', 1), ('created_at', -1)]},
+    ],
+    'calibration_tests': [
+        {'name': 'active_due_date', 'keys': [('calibration_due_date', 1)], 'partialFilterExpression': {'is_active': True}},
+        {'name': 'active_created', 'keys': [('is_active', 1), ('created_at', -1)]},
+    ],
+    'proficiency_tests': [
+        {'name': 'active_due_date', 'keys': [('due_date', 1)], 'partialFilterExpression': {'is_active': True}},
+        {'name': 'active_status_created', 'keys': [('is_active', 1), ('status', 1), ('created_at', -1)]},
+    ],
+    # Due-date engine (lims_backend/utilities/due_dates.py)
+    'due_items': [
+        {'name': 'entity_item', 'keys': [('entity', 1), ('entity_id', 1)], 'unique': True},
+        {'name': 'entity_due', 'keys': [('entity', 1), ('due_date', 1), ('entity_id', 1)]},
+        {'name': 'entity_bucket_due', 'keys': [('entity', 1), ('bucket', 1), ('due_date', 1)]},
+    ],
+}
+
+# Options compared when checking an existing index against its declaration
+INDEX_OPTIONS = ('unique', 'partialFilterExpression', 'collation')
+
+
+def get_registry(collection_name=None):
+    """
+    Return the registry, or the entries of one collection
+    """
+    if collection_name:
+        return {collection_name: INDEX_REGISTRY.get(collection_name, [])}
+    return INDEX_REGISTRY
+
+
+def normalize_keys(keys):
+    """
+    Key list as [(field, int direction)] for comparisons (index_information returns floats)
+    """
+    normalized = []
+    for field, direction in keys:
+        normalized.append((field, int(direction) if isinstance(direction, (int, float)) else direction))
+    return normalized
+
+
+def option_differences(spec, existing):
+    """
+    List the options where an existing index differs from its declaration
+    Only the collation fields named in the declaration are compared, since the
+    server fills in defaults for the rest.
+    """
+    differences = []
+    if normalize_keys(spec['keys']) != normalize_keys(existing.get('key', [])):
+        differences.append('keys')
+    if bool(spec.get('unique')) != bool(existing.get('unique')):
+        differences.append('unique')
+    if spec.get('partialFilterExpression') != existing.get('partialFilterExpression'):
+        differences.append('partialFilterExpression')
+
+    declared_collation = spec.get('collation')
+    existing_collation = existing.get('collation')
+    if declared_collation or existing_collation:
+        if not declared_collation or not existing_collation or any(
+            existing_collation.get(key) != value for key, value in declared_collation.items()
+        ):
+            differences.append('collation')
+    return differences
+
+
+def create_options(spec):
+    """
+    Keyword arguments for Collection.create_index
+    """
+    options = {'name': spec['name'], 'background': True}
+    for option in INDEX_OPTIONS:
+        if spec.get(option):
+            options[option] = spec[option]
+    return options
+
+
+def index_covers(index_keys, candidate_keys, equality_count=0):
+    """
+    True when an index can serve a candidate key pattern: the candidate is a
+    prefix of the index and, after the first equality_count fields (whose
+    direction does not matter), directions are all equal or all reversed
+    """
+    index_keys = normalize_keys(index_keys)
+    candidate_keys = normalize_keys(candidate_keys)
+    if len(candidate_keys) > len(index_keys):
+        return False
+    prefix = index_keys[:len(candidate_keys)]
+    if [field for field, _ in prefix] != [field for field, _ in candidate_keys]:
+        return False
+    pairs = [(a, b) for (_, a), (_, b) in zip(prefix[equality_count:], candidate_keys[equality_count:])]
+    return all(a == b for a, b in pairs) or all(a == -b for a, b in pairs if isinstance(a, int) and isinstance(b, int))
@@ -0,0 +1,115 @@
+"""
+Backfill the '<field>_dt' DateTimeField shadows of date string fields
+
+New writes set the shadows themselves; this command fills them in for
+existing documents, in batches. A document changed while the command runs
+is skipped (its write already set the shadows). Each completed collection is
+recorded in data_migrations (see lims_backend.utilities.dates).
+
+Usage:
+    python manage.py backfill_date_fields
+    python manage.py backfill_date_fields --collection testing_reports --batch-size 200 --sleep 0.2
+    python manage.py backfill_date_fields --dry-run
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from mongoengine import connection
+from pymongo import UpdateOne
+
+from lims_backend.utilities.dates import mark_date_backfill_complete, parse_date_string, shadow_field
+from certificates.models import CERTIFICATE_DATE_FIELDS
+from welderperformancerecords.models import PERFORMANCE_RECORD_DATE_FIELDS
+
+
+# collection -> date string fields, and the embedded list holding them (if any)
+DATE_FIELD_TARGETS = {
+    'complete_certificates': {'fields': CERTIFICATE_DATE_FIELDS},
+    'welder_certificates': {'fields': ('date_of_test',)},
+    'welder_performance_records': {'fields': PERFORMANCE_RECORD_DATE_FIELDS},
+    'sample_preparations': {'fields': ('planned_test_date',), 'list_field': 'sample_lots'},
+    'testing_reports': {'fields': ('date_of_inspection',), 'list_field': 'results'},
+}
+
+
+class Command(BaseCommand):
+    help = 'Populate DateTimeField shadows of date string fields, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collection', default='', help=f"One of: {', '.join(DATE_FIELD_TARGETS)}")
+        parser.add_argument('--batch-size', type=int, default=500, help='Documents per bulk write (default 500)')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Count documents that need updating without writing')
+
+    def handle(self, *args, **options):
+        targets = DATE_FIELD_TARGETS
+        if options['collection']:
+            if options['collection'] not in DATE_FIELD_TARGETS:
+                raise CommandError(f"--collection must be one of: {', '.join(DATE_FIELD_TARGETS)}")
+            targets = {options['collection']: DATE_FIELD_TARGETS[options['collection']]}
+
+        db = connection.get_db()
+        for collection_name, target in targets.items():
+            updated = self.backfill(db[collection_name], collection_name, target, options)
+            if not options['dry_run']:
+                mark_date_backfill_complete(db, collection_name, updated)
+
+    def backfill(self, collection, collection_name, target, options):
+        fields = target['fields']
+        list_field = target.get('list_field')
+        projection = {'updated_at': 1}
+        if list_field:
+            projection[list_field] = 1
+        else:
+            for field in fields:
+                projection[field] = 1
+                projection[shadow_field(field)] = 1
+
+        operations = []
+        pending = 0
+        updated = 0
+        unparseable = 0
+        for doc in collection.find({}, projection).sort('_id', 1).batch_size(options['batch_size']):
+            changes = {}
+            if list_field:
+                for index, element in enumerate(doc.get(list_field) or []):
+                    if not isinstance(element, dict):
+                        continue
+                    for field in fields:
+                        value = parse_date_string(element.get(field))
+                        unparseable += 1 if element.get(field) and value is None else 0
+                        if element.get(shadow_field(field)) != value or shadow_field(field) not in element:
+                            changes[f'{list_field}.{index}.{shadow_field(field)}'] = value
+            else:
+                for field in fields:
+                    value = parse_date_string(doc.get(field))
+                    unparseable += 1 if doc.get(field) and value is None else 0
+                    if doc.get(shadow_field(field)) != value or shadow_field(field) not in doc:
+                        changes[shadow_field(field)] = value
+
+            if not changes:
+                continue
+            pending += 1
+            if options['dry_run']:
+                continue
+
+            # Skip documents modified since they were read
+            operations.append(UpdateOne({'_id': doc['_id'], 'updated_at': doc.get('updated_at')}, {'$set': changes}))
+            if len(operations) >= options['batch_size']:
+                updated += collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+                self.stdout.write(f'  {collection_name}: {updated} updated')
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+
+        if operations:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+
+        if options['dry_run']:
+            self.stdout.write(f'{collection_name}: {pending} documents need date shadows ({unparseable} unparseable values)')
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'{collection_name}: {updated} documents updated ({unparseable} unparseable values left empty)'
+            ))
+        return updated
@@ -0,0 +1,68 @@
+"""
+Backfill is_active on legacy documents that were written without it
+
+Runs in small batches with an optional pause between them so it can run
+against a live database. When no legacy documents remain, the collection is
+marked complete and the API switches to the indexed `{'is_active': True}`
+predicate (lims_backend/utilities/soft_delete.py).
+
+Usage:
+    python manage.py backfill_is_active
+    python manage.py backfill_is_active --collection sample_lots --batch-size 500 --sleep 0.2
+    python manage.py backfill_is_active --dry-run
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from mongoengine import connection
+
+from lims_backend.utilities.soft_delete import LEGACY_ACTIVE_COLLECTIONS, mark_backfill_complete
+
+
+class Command(BaseCommand):
+    help = 'Set is_active=True on legacy documents missing the field, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collection', default='', help=f"One of: {', '.join(LEGACY_ACTIVE_COLLECTIONS)}")
+        parser.add_argument('--batch-size', type=int, default=1000, help='Documents per batch (default 1000)')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count legacy documents')
+
+    def handle(self, *args, **options):
+        collections = LEGACY_ACTIVE_COLLECTIONS
+        if options['collection']:
+            if options['collection'] not in LEGACY_ACTIVE_COLLECTIONS:
+                raise CommandError(f"--collection must be one of: {', '.join(LEGACY_ACTIVE_COLLECTIONS)}")
+            collections = (options['collection'],)
+
+        db = connection.get_db()
+        legacy_query = {'is_active': {'$exists': False}}
+
+        for collection_name in collections:
+            collection = db[collection_name]
+            remaining = collection.count_documents(legacy_query)
+            self.stdout.write(f'{collection_name}: {remaining} documents without is_active')
+            if options['dry_run']:
+                continue
+
+            updated = 0
+            while True:
+                batch = [doc['_id'] for doc in collection.find(legacy_query, {'_id': 1}).limit(options['batch_size'])]
+                if not batch:
+                    break
+                # Re-check the field so documents written meanwhile are not overwritten
+                result = collection.update_many(
+                    {'_id': {'$in': batch}, 'is_active': {'$exists': False}},
+                    {'$set': {'is_active': True}}
+                )
+                updated += result.modified_count
+                self.stdout.write(f'  {updated}/{remaining}')
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+
+            if collection.count_documents(legacy_query, limit=1) == 0:
+                mark_backfill_complete(collection_name, updated)
+                self.stdout.write(self.style.SUCCESS(f'{collection_name}: complete ({updated} updated)'))
+            else:
+                self.stdout.write(self.style.WARNING(f'{collection_name}: legacy documents remain, run again'))
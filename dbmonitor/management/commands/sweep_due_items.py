@@ -0,0 +1,33 @@
+"""
+Rebuild the due_items collection (see lims_backend/utilities/due_dates.py)
+
+Schedule daily (e.g. cron) so items move from upcoming to due soon to
+overdue as time passes and items missed by a write are corrected.
+
+Usage:
+    python manage.py sweep_due_items
+    python manage.py sweep_due_items --entity calibration_test
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lims_backend.utilities.due_dates import DUE_ENTITIES, sweep_due_items
+
+
+class Command(BaseCommand):
+    help = 'Recompute due items and their status buckets from the source collections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entity', default='', help=f"One of: {', '.join(DUE_ENTITIES)}")
+        parser.add_argument('--batch-size', type=int, default=500, help='Items per bulk write (default 500)')
+
+    def handle(self, *args, **options):
+        entities = list(DUE_ENTITIES)
+        if options['entity']:
+            if options['entity'] not in DUE_ENTITIES:
+                raise CommandError(f"--entity must be one of: {', '.join(DUE_ENTITIES)}")
+            entities = [options['entity']]
+
+        for entity in entities:
+            open_items = sweep_due_items(entity, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'{entity}: {open_items} open items'))
@@ -0,0 +1,236 @@
+"""
+Synchronize declared indexes (dbmonitor/index_registry.py) with the database
+
+Usage:
+    python manage.py sync_indexes                     # report drift only
+    python manage.py sync_indexes --apply             # build missing indexes, rebuild changed/renamed ones
+    python manage.py sync_indexes --collection jobs
+    python manage.py sync_indexes --advise --hours 72 # suggest indexes for recorded slow query shapes
+"""
+
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from mongoengine import connection
+from mongoengine.base.common import _document_registry
+
+from dbmonitor.index_registry import get_registry, option_differences, create_options, index_covers, normalize_keys
+from dbmonitor.models import SlowQuery
+
+
+# Filter operators that can use an index key
+EQUALITY_OPERATORS = ('eq',)
+RANGE_OPERATORS = ('range', 'in', 'regex')
+
+
+class Command(BaseCommand):
+    help = 'Report and fix drift between the index registry and the database, or suggest missing indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apply', action='store_true', help='Create missing indexes and rebuild changed ones')
+        parser.add_argument('--collection', default='', help='Only this collection')
+        parser.add_argument('--advise', action='store_true', help='Suggest indexes from recorded slow query shapes')
+        parser.add_argument('--hours', type=int, default=168, help='Advisor: look back this many hours (default 168)')
+        parser.add_argument('--limit', type=int, default=20, help='Advisor: maximum suggestions (default 20)')
+
+    def handle(self, *args, **options):
+        db = connection.get_db()
+        if options['advise']:
+            self.advise(db, options)
+        else:
+            self.sync(db, options)
+
+    def sync(self, db, options):
+        registry = get_registry(options['collection'] or None)
+        model_indexes = self.model_index_keys()
+        existing_collections = set(db.list_collection_names())
+        drift = 0
+        built = 0
+
+        for collection_name, specs in registry.items():
+            if not specs:
+                self.stdout.write(self.style.WARNING(f'{collection_name}: no indexes declared in the registry'))
+                continue
+
+            existing = db[collection_name].index_information() if collection_name in existing_collections else {}
+            self.stdout.write(f'{collection_name}:')
+
+            for spec in specs:
+                current = existing.get(spec['name'])
+                if current is None:
+                    same_keys = [name for name, info in existing.items()
+                                 if normalize_keys(info.get('key', [])) == normalize_keys(spec['keys']) and not option_differences(spec, info)]
+                    if same_keys:
+                        drift += 1
+                        self.stdout.write(self.style.WARNING(f"  ~ {spec['name']}: exists as '{same_keys[0]}'"))
+                        if options['apply']:
+                            # MongoDB refuses a second index with the same keys and options
+                            db[collection_name].drop_index(same_keys[0])
+                            built += self.create_index(db, collection_name, spec)
+                        continue
+                    drift += 1
+                    self.stdout.write(self.style.WARNING(f"  + {spec['name']} {spec['keys']} missing"))
+                    if options['apply']:
+                        built += self.create_index(db, collection_name, spec)
+                    continue
+
+                differences = option_differences(spec, current)
+                if not differences:
+                    self.stdout.write(f"  = {spec['name']}")
+                    continue
+
+                drift += 1
+                self.stdout.write(self.style.WARNING(f"  ! {spec['name']} differs: {', '.join(differences)}"))
+                if options['apply']:
+                    db[collection_name].drop_index(spec['name'])
+                    built += self.create_index(db, collection_name, spec)
+
+            declared_names = {spec['name'] for spec in specs} | {'_id_'}
+            declared_keys = [normalize_keys(keys) for keys in model_indexes.get(collection_name, [])]
+            for name, info in existing.items():
+                if name in declared_names or normalize_keys(info.get('key', [])) in declared_keys:
+                    continue
+                # Never dropped automatically: may be created by another deployment
+                self.stdout.write(f"  ? {name} {info.get('key')} not declared in the registry or model meta")
+
+        if drift and not options['apply']:
+            self.stdout.write(self.style.WARNING(f'{drift} index(es) drifted. Run with --apply to build them.'))
+        elif built < drift:
+            self.stdout.write(self.style.ERROR(f'{drift} index(es) drifted, {built} built; see the errors above.'))
+        elif drift:
+            self.stdout.write(self.style.SUCCESS(f'{built} index(es) built.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Indexes match the registry.'))
+
+    def create_index(self, db, collection_name, spec):
+        """
+        Returns: 1 if the index was built, 0 on failure
+        """
+        try:
+            db[collection_name].create_index(spec['keys'], **create_options(spec))
+            self.stdout.write(self.style.SUCCESS(f"    built {spec['name']}"))
+            return 1
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"    failed to build {spec['name']}: {e}"))
+            return 0
+
+    def model_index_keys(self):
+        """
+        Key patterns declared in mongoengine model meta, per collection
+        """
+        keys = {}
+        for document_class in _document_registry.values():
+            meta = getattr(document_class, '_meta', {})
+            collection_name = meta.get('collection')
+            if not collection_name or meta.get('abstract'):
+                continue
+            try:
+                keys.setdefault(collection_name, []).extend(document_class.list_indexes())
+            except Exception:
+                continue
+        return keys
+
+    def advise(self, db, options):
+        match = {'recorded_at': {'$gte': datetime.now() - timedelta(hours=options['hours'])}}
+        if options['collection']:
+            match['collection_name'] = options['collection']
+
+        shapes = SlowQuery._get_collection().aggregate([
+            {'$match': match},
+            {'$group': {
+                '_id': '$shape_hash',
+                'collection_name': {'$first': '$collection_name'},
+                'shape': {'$first': '$shape'},
+                'filter_fields': {'$first': '$filter_fields'},
+                'sort_fields': {'$first': '$sort_fields'},
+                'flags': {'$addToSet': '$flags'},
+                'count': {'$sum': 1},
+                'total_ms': {'$sum': '$duration_ms'}
+            }},
+            {'$sort': {'total_ms': -1}}
+        ])
+
+        index_cache = {}
+        suggestions = {}
+        for shape in shapes:
+            collection_name = shape.get('collection_name')
+            candidate, equality_count = self.candidate_keys(shape.get('filter_fields') or [], shape.get('sort_fields') or [])
+            if not collection_name or not candidate:
+                continue
+
+            if collection_name not in index_cache:
+                index_cache[collection_name] = self.known_indexes(db, collection_name)
+            equality_fields = {field for field, _ in candidate[:equality_count]}
+            covered = any(
+                index_covers(keys, candidate, equality_count)
+                for keys, partial_fields in index_cache[collection_name]
+                if partial_fields <= equality_fields
+            )
+            if covered:
+                continue
+
+            suggestion = suggestions.setdefault((collection_name, tuple(candidate)), {
+                'collection_name': collection_name,
+                'keys': candidate,
+                'shapes': 0,
+                'count': 0,
+                'total_ms': 0.0,
+                'flags': set(),
+                'example': shape.get('shape')
+            })
+            suggestion['shapes'] += 1
+            suggestion['count'] += shape['count']
+            suggestion['total_ms'] += shape['total_ms']
+            for flags in shape.get('flags', []):
+                suggestion['flags'].update(flags or [])
+
+        ranked = sorted(suggestions.values(), key=lambda item: item['total_ms'], reverse=True)[:options['limit']]
+        if not ranked:
+            self.stdout.write(self.style.SUCCESS('No missing indexes found for recorded slow queries.'))
+            return
+
+        for suggestion in ranked:
+            flags = ', '.join(sorted(suggestion['flags'])) or 'no explain flags'
+            self.stdout.write(self.style.WARNING(
+                f"{suggestion['collection_name']}: {suggestion['keys']} - {suggestion['count']} slow commands "
+                f"({suggestion['shapes']} shapes), {suggestion['total_ms']:.0f} ms total, {flags}"
+            ))
+            self.stdout.write(f"  e.g. {suggestion['example']}")
+        self.stdout.write('Add accepted suggestions to dbmonitor/index_registry.py and run sync_indexes --apply.')
+
+    def candidate_keys(self, query_fields, sort_fields):
+        """
+        Build an Equality-Sort-Range key pattern for one query shape
+        Returns: (keys, number of leading equality keys)
+        """
+        keys = []
+        seen = set()
+        for entry in query_fields:
+            if entry['operator'] in EQUALITY_OPERATORS and entry['field'] not in seen:
+                keys.append((entry['field'], 1))
+                seen.add(entry['field'])
+        equality_count = len(keys)
+        for entry in sort_fields:
+            if entry['field'] not in seen:
+                keys.append((entry['field'], entry['direction']))
+                seen.add(entry['field'])
+        for entry in query_fields:
+            if entry['operator'] in RANGE_OPERATORS and entry['field'] not in seen:
+                keys.append((entry['field'], 1))
+                seen.add(entry['field'])
+        return keys, equality_count
+
+    def known_indexes(self, db, collection_name):
+        """
+        Existing and declared key patterns of a collection, with the fields of
+        any partial filter (the index only serves queries that match on them)
+        """
+        indexes = []
+        try:
+            for info in db[collection_name].index_information().values():
+                indexes.append((info.get('key', []), set((info.get('partialFilterExpression') or {}).keys())))
+        except Exception:
+            pass
+        for spec in get_registry(collection_name)[collection_name]:
+            indexes.append((spec['keys'], set((spec.get('partialFilterExpression') or {}).keys())))
+        return indexes
@@ -0,0 +1,31 @@
+from mongoengine import Document, fields
+from datetime import datetime
+
+
+class SlowQuery(Document):
+    """
+    One MongoDB command that exceeded MONGO_SLOW_QUERY_MS
+    Stored in a capped collection, so old entries roll off automatically
+    """
+    shape_hash = fields.StringField(max_length=40, required=True)  # Groups commands with the same shape
+    command_name = fields.StringField(max_length=50)
+    collection_name = fields.StringField(max_length=100)
+    shape = fields.StringField()  # JSON of the command with literal values replaced by '?'
+    filter_fields = fields.ListField(fields.DictField())  # [{field, operator}] from the query filter
+    sort_fields = fields.ListField(fields.DictField())  # [{field, direction}]
+    duration_ms = fields.FloatField()
+    docs_returned = fields.IntField(default=0)
+    request_path = fields.StringField(max_length=500)
+    # Explain summary (captured at most once per shape per MONGO_SLOW_QUERY_EXPLAIN_INTERVAL)
+    explain = fields.DictField()
+    flags = fields.ListField(fields.StringField(max_length=50))  # e.g. COLLSCAN, HIGH_DOCS_EXAMINED_RATIO
+    recorded_at = fields.DateTimeField(default=datetime.now)
+
+    meta = {
+        'collection': 'slow_queries',
+        'max_size': 64 * 1024 * 1024,
+        'indexes': ['shape_hash', 'recorded_at']
+    }
+
+    def __str__(self):
+        return f"{self.command_name} {self.collection_name} - {self.duration_ms}ms"
@@ -0,0 +1,341 @@
+"""
+Slow query recorder
+
+The MongoDB command listener (lims_backend/utilities/mongo_monitoring.py)
+hands every command slower than MONGO_SLOW_QUERY_MS to record_slow_command.
+Commands are queued and written by a background thread, so request threads
+never wait for the recorder. For read commands an explain('executionStats')
+is captured, at most once per query shape per MONGO_SLOW_QUERY_EXPLAIN_INTERVAL
+seconds, and summarized into flags (COLLSCAN, in-memory sort, high
+docsExamined/nReturned ratio).
+"""
+
+import copy
+import hashlib
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from mongoengine import connection
+
+from .models import SlowQuery
+
+
+EXPLAINABLE_COMMANDS = {'find', 'aggregate', 'count', 'distinct'}
+SHAPED_COMMANDS = EXPLAINABLE_COMMANDS | {'findAndModify', 'update', 'delete'}
+# Driver-added fields that explain does not accept
+COMMAND_META_FIELDS = {'lsid', 'txnNumber', '$clusterTime', '$db', '$readPreference', 'autocommit', 'startTransaction'}
+
+_queue = queue.Queue(maxsize=1000)
+_worker = None
+_worker_lock = threading.Lock()
+_last_explained = {}
+
+
+def value_shape(value):
+    """
+    Replace literal values in a query document with '?', keeping field names and operators
+    """
+    if isinstance(value, dict):
+        shaped = {}
+        for key, item in value.items():
+            if key in ('$in', '$nin', '$all'):
+                shaped[key] = '?'
+            elif key in ('$and', '$or', '$nor') and isinstance(item, list):
+                shaped[key] = [value_shape(condition) for condition in item]
+            else:
+                shaped[key] = value_shape(item)
+        return shaped
+    return '?'
+
+
+def pipeline_shape(pipeline):
+    """
+    Shape of an aggregation pipeline: $match values are masked, other stages keep their keys
+    """
+    stages = []
+    for stage in pipeline or []:
+        if not isinstance(stage, dict) or not stage:
+            continue
+        name, body = next(iter(stage.items()))
+        if name == '$match':
+            stages.append({name: value_shape(body)})
+        elif name == '$sort':
+            stages.append({name: dict(body)})
+        elif isinstance(body, dict):
+            stages.append({name: sorted(body.keys())})
+        else:
+            stages.append({name: '?'})
+    return stages
+
+
+def command_shape(command_name, command):
+    """
+    Build the literal-free shape of a command
+    """
+    shape = {'command': command_name, 'collection': command.get(command_name) if isinstance(command.get(command_name), str) else ''}
+    if command_name == 'find':
+        shape['filter'] = value_shape(command.get('filter', {}))
+        if command.get('sort'):
+            shape['sort'] = dict(command['sort'])
+        if command.get('projection'):
+            shape['projection'] = sorted(command['projection'].keys())
+    elif command_name == 'aggregate':
+        shape['pipeline'] = pipeline_shape(command.get('pipeline'))
+    elif command_name == 'count':
+        shape['filter'] = value_shape(command.get('query', {}))
+    elif command_name == 'distinct':
+        shape['key'] = command.get('key')
+        shape['filter'] = value_shape(command.get('query', {}))
+    elif command_name == 'findAndModify':
+        shape['filter'] = value_shape(command.get('query', {}))
+        if command.get('sort'):
+            shape['sort'] = dict(command['sort'])
+    elif command_name in ('update', 'delete'):
+        statements = command.get('updates' if command_name == 'update' else 'deletes') or []
+        if statements:
+            shape['filter'] = value_shape(statements[0].get('q', {}))
+    return shape
+
+
+def shape_json(shape):
+    return json.dumps(shape, sort_keys=True, default=str)
+
+
+def shape_hash(shape):
+    return hashlib.sha1(shape_json(shape).encode('utf-8')).hexdigest()
+
+
+RANGE_OPERATORS = {'$gt', '$gte', '$lt', '$lte'}
+
+
+def _condition_operator(condition):
+    """
+    Classify how a filter condition uses its field (eq, range, in, regex, exists, ne)
+    """
+    if not isinstance(condition, dict):
+        return 'eq'
+    operators = set(condition.keys())
+    if '$regex' in operators:
+        return 'regex'
+    if operators & RANGE_OPERATORS:
+        return 'range'
+    if '$in' in operators or '$elemMatch' in operators:
+        return 'in'
+    if '$exists' in operators:
+        return 'exists'
+    if '$ne' in operators or '$nin' in operators:
+        return 'ne'
+    return 'eq'
+
+
+def filter_fields(filter_shape, fields=None):
+    """
+    Flatten a filter shape into [{field, operator}] (conditions inside $or/$and included)
+    """
+    fields = [] if fields is None else fields
+    if not isinstance(filter_shape, dict):
+        return fields
+    for key, condition in filter_shape.items():
+        if key in ('$and', '$or', '$nor') and isinstance(condition, list):
+            for sub_filter in condition:
+                filter_fields(sub_filter, fields)
+        elif not key.startswith('$'):
+            entry = {'field': key, 'operator': _condition_operator(condition)}
+            if entry not in fields:
+                fields.append(entry)
+    return fields
+
+
+def shape_query_fields(shape):
+    """
+    Return (filter fields, sort fields) of a command shape; for aggregations the
+    leading $match and the first $sort are used
+    """
+    query_filter = shape.get('filter', {})
+    sort = shape.get('sort', {})
+    pipeline = shape.get('pipeline') or []
+    if pipeline and '$match' in pipeline[0]:
+        query_filter = pipeline[0]['$match']
+    for stage in pipeline:
+        if '$sort' in stage:
+            sort = stage['$sort']
+            break
+    return (
+        filter_fields(query_filter),
+        [{'field': field, 'direction': direction} for field, direction in (sort or {}).items()]
+    )
+
+
+def record_slow_command(command_name, command, database_name, duration_ms, docs_returned, request_path=''):
+    """
+    Queue a slow command for recording (called from the command listener)
+    """
+    if command_name not in SHAPED_COMMANDS:
+        return
+    try:
+        # The listener's command document is not ours to keep: copy what we need now
+        _queue.put_nowait({
+            'command_name': command_name,
+            'command': copy.deepcopy(dict(command)) if command_name in EXPLAINABLE_COMMANDS else None,
+            'shape': command_shape(command_name, command),
+            'database_name': database_name,
+            'duration_ms': round(duration_ms, 2),
+            'docs_returned': docs_returned,
+            'request_path': request_path,
+            'recorded_at': datetime.now()
+        })
+    except queue.Full:
+        return
+    _ensure_worker()
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run_worker, name='slow-query-recorder', daemon=True)
+            _worker.start()
+
+
+def _run_worker():
+    while True:
+        entry = _queue.get()
+        try:
+            _store(entry)
+        except Exception as e:
+            print(f"Error recording slow query: {e}")
+        finally:
+            _queue.task_done()
+
+
+def _should_explain(hash_value):
+    if not getattr(settings, 'MONGO_SLOW_QUERY_EXPLAIN', True):
+        return False
+    now = time.monotonic()
+    interval = getattr(settings, 'MONGO_SLOW_QUERY_EXPLAIN_INTERVAL', 600)
+    last = _last_explained.get(hash_value)
+    if last is not None and now - last < interval:
+        return False
+    _last_explained[hash_value] = now
+    return True
+
+
+def _store(entry):
+    hash_value = shape_hash(entry['shape'])
+    explain_summary = {}
+    flags = []
+
+    if entry['command'] and _should_explain(hash_value):
+        explain_summary = run_explain(entry['database_name'], entry['command'])
+        flags = explain_summary.pop('flags', [])
+
+    query_fields, sort_fields = shape_query_fields(entry['shape'])
+    SlowQuery._get_collection().insert_one({
+        'shape_hash': hash_value,
+        'command_name': entry['command_name'],
+        'collection_name': entry['shape'].get('collection', ''),
+        'shape': shape_json(entry['shape']),
+        'filter_fields': query_fields,
+        'sort_fields': sort_fields,
+        'duration_ms': entry['duration_ms'],
+        'docs_returned': entry['docs_returned'],
+        'request_path': entry['request_path'],
+        'explain': explain_summary,
+        'flags': flags,
+        'recorded_at': entry['recorded_at']
+    })
+
+
+def _plan_stages(plan):
+    """
+    Yield every stage name of a query plan tree
+    """
+    if not isinstance(plan, dict):
+        return
+    if plan.get('stage'):
+        yield plan['stage']
+    for key in ('inputStage', 'queryPlan', 'winningPlan'):
+        if isinstance(plan.get(key), dict):
+            yield from _plan_stages(plan[key])
+    for child in plan.get('inputStages', []) or []:
+        yield from _plan_stages(child)
+
+
+def _find_explain_section(explain, key):
+    """
+    Locate queryPlanner / executionStats in plain and aggregation ($cursor stage) explain output
+    """
+    if key in explain:
+        return explain[key]
+    for stage in explain.get('stages', []) or []:
+        cursor_stage = stage.get('$cursor') if isinstance(stage, dict) else None
+        if cursor_stage and key in cursor_stage:
+            return cursor_stage[key]
+    return {}
+
+
+def summarize_explain(explain):
+    """
+    Reduce explain('executionStats') output to the numbers we alert on
+    """
+    planner = _find_explain_section(explain, 'queryPlanner')
+    stats = _find_explain_section(explain, 'executionStats')
+    stages = list(_plan_stages(planner.get('winningPlan', {})))
+
+    docs_examined = stats.get('totalDocsExamined', 0)
+    keys_examined = stats.get('totalKeysExamined', 0)
+    returned = stats.get('nReturned', 0)
+    ratio = docs_examined / max(returned, 1)
+
+    flags = []
+    if 'COLLSCAN' in stages:
+        flags.append('COLLSCAN')
+    if 'SORT' in stages:
+        flags.append('IN_MEMORY_SORT')
+    if docs_examined >= getattr(settings, 'MONGO_SLOW_QUERY_MIN_EXAMINED', 1000) and ratio >= getattr(settings, 'MONGO_SLOW_QUERY_EXAMINED_RATIO', 100):
+        flags.append('HIGH_DOCS_EXAMINED_RATIO')
+
+    return {
+        'stages': stages,
+        'index_names': list(_index_names(planner.get('winningPlan', {}))),
+        'docs_examined': docs_examined,
+        'keys_examined': keys_examined,
+        'n_returned': returned,
+        'docs_examined_ratio': round(ratio, 2),
+        'execution_time_ms': stats.get('executionTimeMillis', 0),
+        'flags': flags
+    }
+
+
+def _index_names(plan):
+    if not isinstance(plan, dict):
+        return
+    if plan.get('indexName'):
+        yield plan['indexName']
+    for key in ('inputStage', 'queryPlan'):
+        if isinstance(plan.get(key), dict):
+            yield from _index_names(plan[key])
+    for child in plan.get('inputStages', []) or []:
+        yield from _index_names(child)
+
+
+def run_explain(database_name, command):
+    """
+    Run explain('executionStats') for a recorded read command
+    Returns: explain summary dict (empty on failure)
+    """
+    cleaned = {key: value for key, value in command.items() if key not in COMMAND_META_FIELDS}
+    if 'pipeline' in cleaned and any(('$out' in stage or '$merge' in stage) for stage in cleaned['pipeline'] if isinstance(stage, dict)):
+        return {}
+    try:
+        db = connection.get_connection()[database_name] if database_name else connection.get_db()
+        explain = db.command({'explain': cleaned, 'verbosity': 'executionStats'})
+        return summarize_explain(explain)
+    except Exception as e:
+        return {'error': str(e)}
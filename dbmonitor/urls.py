@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+app_name = 'dbmonitor'
+
+urlpatterns = [
+    path('slow-queries/', views.slow_query_offenders, name='slow_query_offenders'),    # GET: Top slow query shapes (admin)
+]
@@ -0,0 +1,105 @@
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from datetime import datetime, timedelta
+import json
+
+from authentication.decorators import admin_required
+from .models import SlowQuery
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@admin_required
+def slow_query_offenders(request):
+    """
+    Top slow query shapes by total time
+    Query parameters:
+    - hours: Look-back window in hours (default 24)
+    - limit: Number of shapes to return (default 20, max 100)
+    - collection: Only shapes on this collection
+    - flag: Only shapes flagged with this value (e.g. COLLSCAN)
+    """
+    try:
+        try:
+            hours = float(request.GET.get('hours', 24))
+            limit = max(1, min(int(request.GET.get('limit', 20)), 100))
+        except ValueError:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'hours and limit must be numbers'
+            }, status=400)
+        
+        match = {'recorded_at': {'$gte': datetime.now() - timedelta(hours=hours)}}
+        collection_name = request.GET.get('collection', '')
+        if collection_name:
+            match['collection_name'] = collection_name
+        
+        pipeline = [
+            {'$match': match},
+            # Entries carrying an explain first, so $first picks the latest explain of each shape
+            {'$addFields': {'has_explain': {'$gt': [{'$size': {'$objectToArray': {'$ifNull': ['$explain', {}]}}}, 0]}}},
+            {'$sort': {'has_explain': -1, 'recorded_at': -1}},
+            {
+                '$group': {
+                    '_id': '$shape_hash',
+                    'collection_name': {'$first': '$collection_name'},
+                    'command_name': {'$first': '$command_name'},
+                    'shape': {'$first': '$shape'},
+                    'filter_fields': {'$first': '$filter_fields'},
+                    'sort_fields': {'$first': '$sort_fields'},
+                    'count': {'$sum': 1},
+                    'total_ms': {'$sum': '$duration_ms'},
+                    'avg_ms': {'$avg': '$duration_ms'},
+                    'max_ms': {'$max': '$duration_ms'},
+                    'last_seen': {'$max': '$recorded_at'},
+                    'request_paths': {'$addToSet': '$request_path'},
+                    'flags': {'$addToSet': '$flags'},
+                    'explain': {'$first': '$explain'}
+                }
+            },
+            {'$sort': {'total_ms': -1}},
+            {'$limit': limit}
+        ]
+        flag = request.GET.get('flag', '')
+        if flag:
+            # flags is a list of per-entry flag lists
+            pipeline.insert(-2, {'$match': {'flags': {'$elemMatch': {'$elemMatch': {'$eq': flag}}}}})
+        
+        offenders = []
+        for doc in SlowQuery._get_collection().aggregate(pipeline):
+            flags = sorted({flag for flag_list in doc.get('flags', []) for flag in (flag_list or [])})
+            offenders.append({
+                'shape_hash': doc['_id'],
+                'collection': doc.get('collection_name', ''),
+                'command': doc.get('command_name', ''),
+                'shape': json.loads(doc['shape']) if doc.get('shape') else {},
+                'filter_fields': doc.get('filter_fields', []),
+                'sort_fields': doc.get('sort_fields', []),
+                'count': doc.get('count', 0),
+                'total_ms': round(doc.get('total_ms', 0), 2),
+                'avg_ms': round(doc.get('avg_ms', 0), 2),
+                'max_ms': round(doc.get('max_ms', 0), 2),
+                'last_seen': doc.get('last_seen').isoformat() if doc.get('last_seen') else '',
+                'request_paths': sorted(path for path in doc.get('request_paths', []) if path)[:10],
+                'flags': flags,
+                'explain': doc.get('explain') or {}
+            })
+        
+        return JsonResponse({
+            'status': 'success',
+            'data': offenders,
+            'total': len(offenders),
+            'filters_applied': {
+                'hours': hours,
+                'limit': limit,
+                'collection': collection_name,
+                'flag': flag
+            }
+        })
+        
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
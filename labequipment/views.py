@@ -11,6 +11,8 @@ from mongoengine.errors import DoesNotExist, ValidationError
 from .models import Equipment
 # from authentication.decorators import any_authenticated_user
 from lims_backend.utilities.pagination import get_pagination_params, create_pagination_response, paginate_queryset
+from lims_backend.utilities.due_dates import due_window, in_order, refresh_due_item
+from lims_backend.utilities.aggregation import facet_count, facet_group_counts
 
 
 def safe_datetime_format(dt_value):
@@ -161,6 +163,7 @@ def equipment_list(request):
                 remarks=data.get('remarks', '')
             )
             equipment.save()
+            refresh_due_item('equipment_verification', equipment.id)
             
             return JsonResponse({
                 'status': 'success',
@@ -278,6 +281,7 @@ def equipment_detail(request, equipment_id):
                         equipment.verification_due = None
                 
                 equipment.save()
+                refresh_due_item('equipment_verification', equipment.id)
                 
                 return JsonResponse({
                     'status': 'success',
@@ -306,6 +310,7 @@ def equipment_detail(request, equipment_id):
             # Soft delete by setting is_active to False
             equipment.is_active = False
             equipment.save()
+            refresh_due_item('equipment_verification', equipment.id)
             
             return JsonResponse({
                 'status': 'success',
@@ -412,43 +417,40 @@ def equipment_stats(request):
     Get equipment statistics
     """
     try:
-        # Count total active equipment
-        total_equipment = Equipment.objects(is_active=True).count()
-        
-        # Count by status - get all unique statuses dynamically
-        status_stats = {}
-        unique_statuses = Equipment.objects(is_active=True).distinct('status')
-        for status in unique_statuses:
-            count = Equipment.objects(is_active=True, status=status).count()
-            status_stats[status] = count
-        
-        # Count equipment with verification due
-        verification_due_count = Equipment.objects(
-            is_active=True, 
-            verification_due__lt=datetime.now()
-        ).count()
-        
-        # Count equipment created by month
-        monthly_stats = Equipment.objects(is_active=True).aggregate([
+        # All counts of active equipment in one aggregation
+        facets = next(Equipment.objects(is_active=True).aggregate([
             {
-                '$group': {
-                    '_id': {
-                        'year': {'$year': '$created_at'},
-                        'month': {'$month': '$created_at'}
-                    },
-                    'count': {'$sum': 1}
+                '$facet': {
+                    'total': [{'$count': 'count'}],
+                    'by_status': [{'$group': {'_id': '$status', 'count': {'$sum': 1}}}],
+                    'verification_due': [
+                        {'$match': {'verification_due': {'$lt': datetime.now()}}},
+                        {'$count': 'count'}
+                    ],
+                    # Equipment created by month
+                    'monthly': [
+                        {
+                            '$group': {
+                                '_id': {
+                                    'year': {'$year': '$created_at'},
+                                    'month': {'$month': '$created_at'}
+                                },
+                                'count': {'$sum': 1}
+                            }
+                        },
+                        {'$sort': {'_id.year': -1, '_id.month': -1}}
+                    ]
                 }
-            },
-            {'$sort': {'_id.year': -1, '_id.month': -1}}
-        ])
+            }
+        ]), {})
         
         return JsonResponse({
             'status': 'success',
             'data': {
-                'total_equipment': total_equipment,
-                'status_distribution': status_stats,
-                'verification_due_count': verification_due_count,
-                'monthly_creation_stats': list(monthly_stats)
+                'total_equipment': facet_count(facets, 'total'),
+                'status_distribution': facet_group_counts(facets, 'by_status'),
+                'verification_due_count': facet_count(facets, 'verification_due'),
+                'monthly_creation_stats': facets.get('monthly', [])
             }
         })
         
@@ -467,10 +469,9 @@ def equipment_verification_due(request):
     Get equipment that has verification due
     """
     try:
-        equipment_list = Equipment.objects(
-            is_active=True,
-            verification_due__lt=datetime.now()
-        ).order_by('verification_due')
+        # Equipment past its verification due date from the due items
+        equipment_ids, total = due_window('equipment_verification', due_before=datetime.now())
+        equipment_list = in_order(Equipment.objects(id__in=equipment_ids), equipment_ids)
         
         data = []
         for equipment in equipment_list:
@@ -489,7 +490,7 @@ def equipment_verification_due(request):
         return JsonResponse({
             'status': 'success',
             'data': data,
-            'total': len(data)
+            'total': total
         })
         
     except Exception as e:
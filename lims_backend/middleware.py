@@ -0,0 +1,66 @@
+"""
+Project-wide middleware
+"""
+
+import json
+import logging
+
+from django.conf import settings
+
+from lims_backend.utilities.mongo_monitoring import start_request_stats, end_request_stats
+
+
+logger = logging.getLogger('lims_backend.queries')
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Measure MongoDB usage per request
+    Adds a Server-Timing header (mongo time/command count and total time), writes
+    one structured log line per request and a warning when the request exceeds
+    MONGO_QUERY_BUDGET commands or MONGO_QUERY_TIME_BUDGET_MS of database time.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'MONGO_INSTRUMENTATION_ENABLED', True)
+        self.query_budget = getattr(settings, 'MONGO_QUERY_BUDGET', 50)
+        self.time_budget_ms = getattr(settings, 'MONGO_QUERY_TIME_BUDGET_MS', 500)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        stats, token = start_request_stats(request.path)
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request_stats(token)
+
+        total_ms = stats.elapsed_ms()
+        response['Server-Timing'] = (
+            f'mongo;dur={stats.duration_ms:.1f};desc="{stats.command_count} commands, {stats.docs_returned} docs", '
+            f'app;dur={total_ms:.1f}'
+        )
+
+        over_budget = stats.command_count > self.query_budget or stats.duration_ms > self.time_budget_ms
+        log_entry = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'commands': stats.command_count,
+            'docs_returned': stats.docs_returned,
+            'failed_commands': stats.failed_count,
+            'mongo_ms': round(stats.duration_ms, 2),
+            'total_ms': round(total_ms, 2),
+        }
+
+        if over_budget:
+            log_entry['query_budget'] = self.query_budget
+            log_entry['time_budget_ms'] = self.time_budget_ms
+            log_entry['top_operations'] = stats.top_operations()
+            logger.warning('mongo_query_budget_exceeded %s', json.dumps(log_entry))
+        else:
+            logger.info('mongo_request_stats %s', json.dumps(log_entry))
+
+        return response
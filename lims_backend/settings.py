@@ -72,11 +72,14 @@ INSTALLED_APPS = [
     'welderperformancerecords',
     'weldercards',
     'testingreports',
-    'pqrs'
+    'pqrs',
+    'mediastore',
+    'dbmonitor'
    
 ]
 
 MIDDLEWARE = [
+    'lims_backend.middleware.QueryInstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -128,9 +131,26 @@ MONGODB_SETTINGS = {
     'authentication_source': os.getenv('MONGODB_AUTH_SOURCE', 'admin'),
 }
 
+# Per-request MongoDB command instrumentation (see lims_backend/middleware.py)
+MONGO_INSTRUMENTATION_ENABLED = os.getenv('MONGO_INSTRUMENTATION_ENABLED', 'True') == 'True'
+MONGO_QUERY_BUDGET = int(os.getenv('MONGO_QUERY_BUDGET', 50))  # Commands per request before a warning is logged
+MONGO_QUERY_TIME_BUDGET_MS = float(os.getenv('MONGO_QUERY_TIME_BUDGET_MS', 500))  # Database time per request
+
+# Slow query log (dbmonitor app): commands slower than MONGO_SLOW_QUERY_MS are stored in the
+# capped slow_queries collection with an explain('executionStats') summary
+MONGO_SLOW_QUERY_MS = float(os.getenv('MONGO_SLOW_QUERY_MS', 100))  # 0 disables recording
+MONGO_SLOW_QUERY_EXPLAIN = os.getenv('MONGO_SLOW_QUERY_EXPLAIN', 'True') == 'True'
+MONGO_SLOW_QUERY_EXPLAIN_INTERVAL = 600  # Seconds between explains of the same query shape
+MONGO_SLOW_QUERY_MIN_EXAMINED = 1000  # docsExamined needed before the ratio below is flagged
+MONGO_SLOW_QUERY_EXAMINED_RATIO = 100  # docsExamined / nReturned flagged as HIGH_DOCS_EXAMINED_RATIO
+
 # Connect to MongoDB
 try:
-    mongoengine.connect(**{k: v for k, v in MONGODB_SETTINGS.items() if v})
+    connect_options = {k: v for k, v in MONGODB_SETTINGS.items() if v}
+    if MONGO_INSTRUMENTATION_ENABLED:
+        from lims_backend.utilities.mongo_monitoring import MongoCommandListener
+        connect_options['event_listeners'] = [MongoCommandListener()]
+    mongoengine.connect(**connect_options)
 except Exception as e:
     print(f"MongoDB connection failed: {e}")
 
@@ -176,6 +196,34 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# File upload handling
+# Uploads up to FILE_UPLOAD_MAX_MEMORY_SIZE stay in memory, larger ones are
+# spooled to temporary files (also used for streamed PUT/PATCH multipart bodies)
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv('FILE_UPLOAD_MAX_MEMORY_SIZE', 2621440))  # 2.5MB
+
+# Image derivatives (thumbnails), stored under MEDIA_ROOT/derivatives/
+# Generated on upload; run `python manage.py generate_image_derivatives` for existing images
+IMAGE_DERIVATIVES_DIR = 'derivatives'
+IMAGE_DERIVATIVES = {
+    'thumbnail': {'size': (320, 320), 'format': 'WEBP', 'quality': 75},
+}
+
+# Content-addressed media blobs (deduplicated uploads), stored under MEDIA_ROOT/blobs/
+MEDIA_BLOB_DIR = 'blobs'
+
+# Authenticated media serving
+# When enabled, /media/ requests are authorized by Django and the file transfer is
+# handed to nginx through the internal MEDIA_ACCEL_PREFIX location (see lims-nginx.conf)
+MEDIA_ACCEL_REDIRECT = os.getenv('MEDIA_ACCEL_REDIRECT', 'False' if DEBUG else 'True') == 'True'
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# APIs return media URLs signed for <img src> use (lims_backend/utilities/media_urls.py);
+# a signed URL stays the same for MEDIA_URL_TTL seconds and is valid for up to twice that
+MEDIA_URL_TTL = int(os.getenv('MEDIA_URL_TTL', 86400))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -252,6 +300,11 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        'lims_backend.queries': {
+            'handlers': ['file', 'console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
         'authentication': {
             'handlers': ['file', 'console'],
             'level': 'INFO',
@@ -332,5 +385,15 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'mediastore': {
+            'handlers': ['file', 'console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'dbmonitor': {
+            'handlers': ['file', 'console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
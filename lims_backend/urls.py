@@ -17,7 +17,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from mediastore.views import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -39,8 +39,7 @@ urlpatterns = [
     path('api/welder-cards/', include('weldercards.urls')),
     path('api/testing-reports/', include('testingreports.urls')),
     path('api/pqrs/', include('pqrs.urls')),
+    path('api/db-monitor/', include('dbmonitor.urls')),
+    # Authenticated media: nginx streams the file via X-Accel-Redirect (Django serves it in development)
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", serve_media, name='serve_media'),
 ]
-
-# Serve media files in development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,18 @@
+"""
+Aggregation helpers
+"""
+
+
+def facet_count(facets, name):
+    """
+    Value of a `[{'$count': 'count'}]` sub-pipeline in a $facet result (0 when nothing matched)
+    """
+    results = facets.get(name) or []
+    return results[0].get('count', 0) if results else 0
+
+
+def facet_group_counts(facets, name):
+    """
+    {_id: count} of a `$group` sub-pipeline in a $facet result, skipping missing values
+    """
+    return {item['_id']: item.get('count', 0) for item in facets.get(name) or [] if item.get('_id') is not None}
@@ -0,0 +1,125 @@
+"""
+Date string helpers
+
+Several models store dates as 'YYYY-MM-DD' strings. Each of those fields has
+a DateTimeField shadow named '<field>_dt' that is set on every write (model
+save or raw update) and backfilled by the backfill_date_fields command, so
+date filters and analytics can run as index range scans.
+
+The backfill records each collection it completes in the data_migrations
+collection; code that cannot fall back to the string field for older
+documents checks is_date_backfill_complete first.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+from mongoengine import connection
+
+
+SHADOW_SUFFIX = '_dt'
+DATE_FORMATS = ('%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f', '%Y/%m/%d', '%d/%m/%Y', '%d-%m-%Y')
+MIGRATION_PREFIX = 'date_fields_backfill:'
+STATE_TTL_SECONDS = 60
+
+_backfill_state = {}  # collection name -> (is complete, checked at)
+
+
+def shadow_field(field):
+    return f'{field}{SHADOW_SUFFIX}'
+
+
+def is_date_backfill_complete(collection_name):
+    """
+    True once backfill_date_fields has completed for a collection (cached per worker)
+    """
+    now = time.monotonic()
+    cached = _backfill_state.get(collection_name)
+    if cached is not None and (cached[0] or now - cached[1] < STATE_TTL_SECONDS):
+        return cached[0]
+
+    try:
+        state = connection.get_db().data_migrations.find_one(
+            {'_id': f'{MIGRATION_PREFIX}{collection_name}'}, {'completed_at': 1}
+        )
+        complete = bool(state and state.get('completed_at'))
+    except Exception as e:
+        print(f"Error reading date fields backfill state: {e}")
+        complete = False
+    _backfill_state[collection_name] = (complete, now)
+    return complete
+
+
+def mark_date_backfill_complete(db, collection_name, updated_count):
+    db.data_migrations.update_one(
+        {'_id': f'{MIGRATION_PREFIX}{collection_name}'},
+        {'$set': {'completed_at': datetime.now(), 'updated_count': updated_count}},
+        upsert=True
+    )
+    _backfill_state.pop(collection_name, None)
+
+
+def parse_date_string(value):
+    """
+    Parse a stored date string
+    Returns: datetime or None for empty/unparseable values
+    """
+    if isinstance(value, datetime):
+        return value
+    if not value or not isinstance(value, str):
+        return None
+    value = value.strip()
+    if value.endswith('Z'):
+        value = value[:-1]
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    return None
+
+
+def shadow_dates(values, fields):
+    """
+    Shadow values for the date string fields present in a dict
+    Use with raw updates: update_doc.update(shadow_dates(update_doc, DATE_FIELDS))
+    """
+    return {shadow_field(field): parse_date_string(values.get(field)) for field in fields if field in values}
+
+
+def date_range_filter(request, param):
+    """
+    Build a range condition from '<param>_from' / '<param>_to' query parameters (YYYY-MM-DD, both inclusive)
+    Returns: condition dict or None when neither is given
+    Raises: ValueError with a message suitable for a 400 response
+    """
+    condition = {}
+    date_from = request.GET.get(f'{param}_from', '')
+    date_to = request.GET.get(f'{param}_to', '')
+    try:
+        if date_from:
+            condition['$gte'] = datetime.strptime(date_from, '%Y-%m-%d')
+        if date_to:
+            condition['$lt'] = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
+    except ValueError:
+        raise ValueError(f'{param}_from and {param}_to must be in YYYY-MM-DD format')
+    return condition or None
+
+
+def apply_date_range_filters(request, query, params, list_field=''):
+    """
+    Add '<param>_from'/'<param>_to' range conditions on the shadow fields to a query
+    list_field: embedded list holding the dates (e.g. 'results'); conditions are
+    wrapped in $elemMatch so both bounds apply to the same element
+    Raises: ValueError (see date_range_filter)
+    """
+    conditions = {}
+    for param in params:
+        condition = date_range_filter(request, param)
+        if condition:
+            conditions[shadow_field(param)] = condition
+    if conditions and list_field:
+        query[list_field] = {'$elemMatch': conditions}
+    else:
+        query.update(conditions)
+    return query
@@ -0,0 +1,276 @@
+"""
+Due-date engine
+
+Calibration tests, equipment verifications and proficiency tests each have a
+due date. Every open item (active, with a due date, and for proficiency tests
+not Completed/Cancelled) has one compact document in the due_items
+collection: entity, entity_id, due_date and a status bucket (overdue,
+due_soon, upcoming). The overdue/due soon views page through due_items on
+its (entity, due_date) index and only load the source documents of the page.
+
+Items are refreshed after every write of their source document
+(refresh_due_item) and rebuilt by the daily `python manage.py
+sweep_due_items`, which also moves items between buckets as time passes.
+View filters use due_date ranges, so they stay exact between sweeps; the
+bucket is for grouping and summaries. A sweep never overwrites an item
+refreshed after it started; both rely on the unique (entity, entity_id)
+index, which every worker creates before its first write
+(ensure_due_items_index). An entity that was never swept is swept on first
+read by the one worker holding the sweep lease; other workers wait for it.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from mongoengine import connection
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+
+DUE_ITEMS_COLLECTION = 'due_items'
+DUE_SOON_DAYS = 30
+SWEEP_PREFIX = 'due_items_sweep:'
+STATE_TTL_SECONDS = 60
+SWEEP_LEASE_SECONDS = 300
+SWEEP_WAIT_SECONDS = 10
+
+BUCKET_OVERDUE = 'overdue'
+BUCKET_DUE_SOON = 'due_soon'
+BUCKET_UPCOMING = 'upcoming'
+
+# entity -> source collection, due date field and the filter of open items
+DUE_ENTITIES = {
+    'calibration_test': {
+        'collection': 'calibration_tests',
+        'due_field': 'calibration_due_date',
+        'open_filter': {'is_active': True},
+    },
+    'equipment_verification': {
+        'collection': 'equipment',
+        'due_field': 'verification_due',
+        'open_filter': {'is_active': True},
+    },
+    'proficiency_test': {
+        'collection': 'proficiency_tests',
+        'due_field': 'due_date',
+        'open_filter': {'is_active': True, 'status': {'$nin': ['Completed', 'Cancelled']}},
+    },
+}
+
+_swept = {}  # entity -> (has been swept, checked at)
+_index_ready = []  # non-empty once this worker has created the due_items index
+
+
+def due_bucket(due_date, now=None):
+    now = now or datetime.now()
+    if due_date < now:
+        return BUCKET_OVERDUE
+    if due_date <= now + timedelta(days=DUE_SOON_DAYS):
+        return BUCKET_DUE_SOON
+    return BUCKET_UPCOMING
+
+
+def _open_query(entity):
+    config = DUE_ENTITIES[entity]
+    return {**config['open_filter'], config['due_field']: {'$type': 'date'}}
+
+
+def _remove_duplicate_items(due_items):
+    """
+    Keep the most recently synced item per (entity, entity_id)
+    """
+    duplicates = due_items.aggregate([
+        {'$sort': {'synced_at': -1}},
+        {'$group': {'_id': {'entity': '$entity', 'entity_id': '$entity_id'}, 'ids': {'$push': '$_id'}}},
+        {'$match': {'ids.1': {'$exists': True}}}
+    ], allowDiskUse=True)
+    for group in duplicates:
+        due_items.delete_many({'_id': {'$in': group['ids'][1:]}})
+
+
+def ensure_due_items_index(db):
+    """
+    Create the unique entity_item index (also declared in dbmonitor/index_registry.py)
+    once per worker; duplicates written without it are removed first
+    """
+    if _index_ready:
+        return
+    due_items = db[DUE_ITEMS_COLLECTION]
+    keys = [('entity', 1), ('entity_id', 1)]
+    try:
+        due_items.create_index(keys, name='entity_item', unique=True)
+    except OperationFailure as e:
+        if e.code != 11000:
+            raise
+        _remove_duplicate_items(due_items)
+        due_items.create_index(keys, name='entity_item', unique=True)
+    _index_ready.append(True)
+
+
+def refresh_due_item(entity, object_id):
+    """
+    Recompute the due item of one source document after it was written
+    (removes it when the document is no longer open or has no due date)
+    Never raises, so callers can use it after a successful write.
+    """
+    try:
+        db = connection.get_db()
+        ensure_due_items_index(db)
+        config = DUE_ENTITIES[entity]
+        object_id = object_id if isinstance(object_id, ObjectId) else ObjectId(object_id)
+        source_doc = db[config['collection']].find_one({'_id': object_id, **_open_query(entity)}, {config['due_field']: 1})
+        if not source_doc:
+            db[DUE_ITEMS_COLLECTION].delete_many({'entity': entity, 'entity_id': object_id})
+            return
+
+        due_date = source_doc[config['due_field']]
+        db[DUE_ITEMS_COLLECTION].update_one(
+            {'entity': entity, 'entity_id': object_id},
+            {'$set': {'due_date': due_date, 'bucket': due_bucket(due_date), 'synced_at': datetime.now()}},
+            upsert=True
+        )
+    except Exception as e:
+        print(f"Error refreshing due item for {entity} {object_id}: {e}")
+
+
+def _write_sweep_batch(due_items, operations):
+    """
+    Bulk write sweep upserts, ignoring items refreshed since the sweep started
+    (their conditional upsert hits the unique entity_item index)
+    """
+    try:
+        due_items.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+            raise
+
+
+def sweep_due_items(entity, batch_size=500):
+    """
+    Rebuild the due items of an entity from its source collection
+    Returns: number of open items
+    """
+    db = connection.get_db()
+    config = DUE_ENTITIES[entity]
+    due_items = db[DUE_ITEMS_COLLECTION]
+    ensure_due_items_index(db)
+    started_at = datetime.now()
+
+    operations = []
+    written = 0
+    for source_doc in db[config['collection']].find(_open_query(entity), {config['due_field']: 1}).batch_size(batch_size):
+        due_date = source_doc[config['due_field']]
+        # Items refreshed after the sweep started hold newer data than this cursor
+        operations.append(UpdateOne(
+            {'entity': entity, 'entity_id': source_doc['_id'], 'synced_at': {'$not': {'$gte': started_at}}},
+            {'$set': {'due_date': due_date, 'bucket': due_bucket(due_date, started_at), 'synced_at': started_at}},
+            upsert=True
+        ))
+        if len(operations) >= batch_size:
+            _write_sweep_batch(due_items, operations)
+            written += len(operations)
+            operations = []
+    if operations:
+        _write_sweep_batch(due_items, operations)
+        written += len(operations)
+
+    # Items not touched by this sweep (or a write since it started) are no longer open
+    due_items.delete_many({'entity': entity, 'synced_at': {'$lt': started_at}})
+    db.data_migrations.update_one(
+        {'_id': SWEEP_PREFIX + entity},
+        {'$set': {'completed_at': datetime.now(), 'open_items': written}, '$unset': {'lease_until': ''}},
+        upsert=True
+    )
+    _swept[entity] = (True, time.monotonic())
+    return written
+
+
+def _acquire_sweep_lease(db, entity):
+    """
+    Claim the first sweep of an entity; False if it is done or another worker holds the lease
+    """
+    now = datetime.now()
+    try:
+        db.data_migrations.update_one(
+            {'_id': SWEEP_PREFIX + entity, 'completed_at': {'$exists': False}, 'lease_until': {'$not': {'$gt': now}}},
+            {'$set': {'lease_until': now + timedelta(seconds=SWEEP_LEASE_SECONDS)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+def _is_swept(db, entity):
+    swept = db.data_migrations.find_one({'_id': SWEEP_PREFIX + entity}, {'completed_at': 1})
+    return bool(swept and swept.get('completed_at'))
+
+
+def ensure_swept(entity):
+    """
+    Sweep an entity that has never been swept, so reads never see an empty collection
+    Only the worker holding the sweep lease sweeps; others wait up to SWEEP_WAIT_SECONDS
+    and then read whatever has been written so far.
+    """
+    now = time.monotonic()
+    cached = _swept.get(entity)
+    if cached is not None and (cached[0] or now - cached[1] < STATE_TTL_SECONDS):
+        return
+    db = connection.get_db()
+    if _is_swept(db, entity):
+        _swept[entity] = (True, now)
+        return
+
+    if _acquire_sweep_lease(db, entity):
+        try:
+            sweep_due_items(entity)
+        except Exception:
+            db.data_migrations.update_one({'_id': SWEEP_PREFIX + entity}, {'$unset': {'lease_until': ''}})
+            raise
+        return
+
+    # Another worker is sweeping: wait for it instead of sweeping concurrently
+    deadline = time.monotonic() + SWEEP_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(0.5)
+        if _is_swept(db, entity):
+            _swept[entity] = (True, time.monotonic())
+            return
+    # Still sweeping: don't make every request of this worker wait again
+    _swept[entity] = (False, time.monotonic())
+
+
+def due_window(entity, due_before=None, due_from=None, due_through=None, offset=0, limit=None):
+    """
+    Page of open items of an entity by due date (earliest first)
+    due_before: due_date < due_before (overdue); due_through: due_date <= due_through
+    (due soon); due_from: due_date >= due_from
+    Returns: (entity ObjectIds in due date order, total matching)
+    """
+    ensure_swept(entity)
+    query = {'entity': entity}
+    due_condition = {}
+    if due_before is not None:
+        due_condition['$lt'] = due_before
+    if due_through is not None:
+        due_condition['$lte'] = due_through
+    if due_from is not None:
+        due_condition['$gte'] = due_from
+    if due_condition:
+        query['due_date'] = due_condition
+
+    due_items = connection.get_db()[DUE_ITEMS_COLLECTION]
+    total = due_items.count_documents(query)
+    cursor = due_items.find(query, {'entity_id': 1}).sort([('due_date', 1), ('entity_id', 1)]).skip(offset)
+    if limit is not None:
+        cursor = cursor.limit(limit)
+    return [item['entity_id'] for item in cursor], total
+
+
+def in_order(documents, object_ids):
+    """
+    Source documents (mongoengine or raw) in the order of the given ids
+    """
+    by_id = {getattr(document, 'id', None) or document['_id']: document for document in documents}
+    return [by_id[object_id] for object_id in object_ids if object_id in by_id]
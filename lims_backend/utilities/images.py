@@ -0,0 +1,148 @@
+"""
+Image derivative utility functions
+
+Generates bounded-size, web-optimized copies (thumbnails) of uploaded
+images, as configured by settings.IMAGE_DERIVATIVES. Derivatives are written
+at upload time; images uploaded before this existed get theirs from
+`python manage.py generate_image_derivatives`. Reads never decode images:
+until a derivative exists its URL is None. Derivatives are stored under
+MEDIA_ROOT/<IMAGE_DERIVATIVES_DIR>/<variant>/ mirroring the original path.
+"""
+
+import os
+import uuid
+
+from django.conf import settings
+
+from .media_urls import media_relative_path, media_url
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow not installed: derivatives are disabled
+    Image = None
+    ImageOps = None
+
+
+FORMAT_EXTENSIONS = {
+    'WEBP': '.webp',
+    'JPEG': '.jpg',
+    'PNG': '.png',
+}
+
+
+def get_derivative_variants():
+    """
+    Return the configured derivative variants
+    """
+    return settings.IMAGE_DERIVATIVES
+
+
+def get_derivatives_dir():
+    """
+    Return the media-relative folder holding all derivatives
+    """
+    return getattr(settings, 'IMAGE_DERIVATIVES_DIR', 'derivatives')
+
+
+def derivative_relative_path(image_path, variant):
+    """
+    Build the media-relative path of a derivative for an original image path
+    """
+    options = get_derivative_variants()[variant]
+    extension = FORMAT_EXTENSIONS.get(options.get('format', 'WEBP').upper(), '.webp')
+    return f"{get_derivatives_dir()}/{variant}/{image_path}{extension}"
+
+
+def generate_derivative(image_path, variant):
+    """
+    Create a single derivative of an image stored under MEDIA_ROOT
+    Returns the media-relative derivative path, or None if it could not be generated.
+    """
+    if Image is None:
+        return None
+
+    relative_path = media_relative_path(image_path)
+    if not relative_path or relative_path.startswith(f"{get_derivatives_dir()}/"):
+        return None
+
+    source_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+    if not os.path.isfile(source_path):
+        return None
+
+    options = get_derivative_variants()[variant]
+    output_format = options.get('format', 'WEBP').upper()
+    derivative_path = derivative_relative_path(relative_path, variant)
+    target_path = os.path.join(settings.MEDIA_ROOT, derivative_path)
+
+    try:
+        with Image.open(source_path) as image:
+            # Apply camera orientation before resizing, then bound the size
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(tuple(options.get('size', (320, 320))))
+
+            if output_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+                image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+            # Write to a temporary file first so concurrent readers never see a partial image
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            temp_path = f"{target_path}.{uuid.uuid4().hex[:8]}.tmp"
+            image.save(temp_path, format=output_format, quality=options.get('quality', 80), optimize=True)
+            os.replace(temp_path, target_path)
+    except Exception as e:
+        print(f"Error generating {variant} derivative for {relative_path}: {e}")
+        return None
+
+    return derivative_path
+
+
+def generate_derivatives(image_path):
+    """
+    Create all configured derivatives for an image
+    Returns: dict mapping variant name to media-relative path (None on failure)
+    """
+    return {
+        variant: generate_derivative(image_path, variant)
+        for variant in get_derivative_variants()
+    }
+
+
+def get_derivative_url(image, variant='thumbnail'):
+    """
+    Return the signed URL of an existing image derivative
+    Returns None when the image is missing or its derivative has not been generated yet.
+    """
+    relative_path = media_relative_path(image)
+    if not relative_path or variant not in get_derivative_variants():
+        return None
+
+    derivative_path = derivative_relative_path(relative_path, variant)
+    if not os.path.isfile(os.path.join(settings.MEDIA_ROOT, derivative_path)):
+        return None
+
+    return media_url(derivative_path)
+
+
+def get_thumbnail_url(image):
+    """
+    Return the thumbnail URL for an image path or media URL
+    """
+    return get_derivative_url(image, 'thumbnail')
+
+
+def delete_derivatives(image_path):
+    """
+    Delete all cached derivatives of an image
+    """
+    relative_path = media_relative_path(image_path)
+    if not relative_path:
+        return
+
+    for variant in get_derivative_variants():
+        full_path = os.path.join(settings.MEDIA_ROOT, derivative_relative_path(relative_path, variant))
+        try:
+            if os.path.exists(full_path):
+                os.remove(full_path)
+        except Exception as e:
+            print(f"Error deleting {variant} derivative for {relative_path}: {e}")
@@ -0,0 +1,93 @@
+"""
+Signed media URLs
+
+/media/ is authenticated (mediastore.views.serve_media), but browsers load
+images through plain <img src> without an Authorization header. APIs
+therefore return media URLs signed with an expiring HMAC of the path:
+
+    /media/<path>?expires=<unix time>&signature=<hmac>
+
+Documents keep storing plain media paths/URLs; URLs are signed when a
+response is built, with media_url(). The expiry is rounded to
+MEDIA_URL_TTL, so the same file gets the same URL for a whole period and
+stays cacheable in the browser; a URL is valid for one to two periods.
+"""
+
+import os
+import time
+from urllib.parse import quote, unquote
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+
+SIGNATURE_SALT = 'lims_backend.media_url'
+
+
+def media_relative_path(image):
+    """
+    Normalize a stored image reference to a path relative to MEDIA_ROOT
+    Accepts relative paths ('welders/x.jpg'), media URLs ('/media/welders/x.jpg')
+    and signed media URLs. Returns None for external URLs or paths escaping MEDIA_ROOT.
+    """
+    if not image:
+        return None
+
+    path = str(image)
+    if '://' in path:
+        return None
+    if '?' in path:
+        path = unquote(path.split('?', 1)[0])
+    if path.startswith(settings.MEDIA_URL):
+        path = path[len(settings.MEDIA_URL):]
+    path = path.lstrip('/')
+
+    normalized = os.path.normpath(path)
+    if normalized.startswith('..') or os.path.isabs(normalized) or normalized == '.':
+        return None
+    return normalized.replace(os.sep, '/')
+
+
+def unsigned_media_url(image):
+    """
+    Plain media URL to store for a (possibly signed) media URL sent back by a client
+    """
+    relative_path = media_relative_path(image)
+    return f"{settings.MEDIA_URL}{relative_path}" if relative_path else image
+
+
+def get_media_url_ttl():
+    return getattr(settings, 'MEDIA_URL_TTL', 86400)
+
+
+def _signature(relative_path, expires):
+    return salted_hmac(SIGNATURE_SALT, f"{relative_path}:{expires}").hexdigest()[:32]
+
+
+def media_url(image):
+    """
+    Signed URL of a stored media path or media URL
+    Returns None for empty values; external URLs are returned unchanged.
+    """
+    if not image:
+        return None
+    relative_path = media_relative_path(image)
+    if not relative_path:
+        return image
+
+    ttl = get_media_url_ttl()
+    expires = (int(time.time()) // ttl + 2) * ttl
+    return f"{settings.MEDIA_URL}{quote(relative_path)}?expires={expires}&signature={_signature(relative_path, expires)}"
+
+
+def verify_media_signature(relative_path, expires, signature):
+    """
+    True when a signature is valid for the path and has not expired
+    """
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires < time.time():
+        return False
+    return constant_time_compare(_signature(relative_path, expires), signature or '')
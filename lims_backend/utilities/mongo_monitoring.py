@@ -0,0 +1,152 @@
+"""
+MongoDB command instrumentation
+
+A pymongo CommandListener records every command sent while a request is
+being handled: command count, documents returned and server round-trip
+time, with a per collection/command breakdown. Stats are kept in a context
+variable opened by QueryInstrumentationMiddleware (lims_backend/middleware.py),
+so commands outside a request (management commands, startup) are ignored.
+Commands slower than MONGO_SLOW_QUERY_MS are also passed to the slow query
+recorder (dbmonitor/recorder.py).
+"""
+
+import contextvars
+import threading
+import time
+
+from django.conf import settings
+from pymongo import monitoring
+
+
+# Commands that are driver housekeeping rather than application queries
+IGNORED_COMMANDS = {'hello', 'ismaster', 'isMaster', 'ping', 'buildInfo', 'endSessions', 'saslStart', 'saslContinue'}
+
+_request_stats = contextvars.ContextVar('mongo_request_stats', default=None)
+
+
+class RequestQueryStats:
+    """
+    Mongo command statistics for one request
+    Shared with worker threads that run in a copy of the request context
+    (e.g. welders/profile.py), so updates are made under a lock.
+    """
+
+    def __init__(self, path=''):
+        self.path = path
+        self.started_at = time.perf_counter()
+        self.command_count = 0
+        self.docs_returned = 0
+        self.duration_ms = 0.0
+        self.failed_count = 0
+        self.by_operation = {}  # 'find:sample_lots' -> {'count', 'duration_ms', 'docs'}
+        self.pending = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation, duration_ms, docs_returned, failed=False):
+        with self._lock:
+            self.command_count += 1
+            self.docs_returned += docs_returned
+            self.duration_ms += duration_ms
+            if failed:
+                self.failed_count += 1
+
+            entry = self.by_operation.setdefault(operation, {'count': 0, 'duration_ms': 0.0, 'docs': 0})
+            entry['count'] += 1
+            entry['duration_ms'] += duration_ms
+            entry['docs'] += docs_returned
+
+    def top_operations(self, limit=5):
+        """
+        Operations sorted by number of commands (N+1 patterns show up first)
+        """
+        with self._lock:
+            operations = [(operation, dict(entry)) for operation, entry in self.by_operation.items()]
+        ranked = sorted(operations, key=lambda item: (item[1]['count'], item[1]['duration_ms']), reverse=True)
+        return {
+            operation: {'count': entry['count'], 'duration_ms': round(entry['duration_ms'], 2), 'docs': entry['docs']}
+            for operation, entry in ranked[:limit]
+        }
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started_at) * 1000
+
+
+def start_request_stats(path=''):
+    """
+    Begin collecting command statistics for the current request
+    Returns: (stats, token) - pass the token to end_request_stats
+    """
+    stats = RequestQueryStats(path)
+    return stats, _request_stats.set(stats)
+
+
+def end_request_stats(token):
+    _request_stats.reset(token)
+
+
+def get_request_stats():
+    return _request_stats.get()
+
+
+def get_command_collection(command_name, command):
+    """
+    Return the collection a command targets (the command's first value), if any
+    """
+    value = command.get(command_name)
+    return value if isinstance(value, str) else ''
+
+
+def count_returned_documents(reply):
+    """
+    Number of documents returned in a command reply
+    """
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        batch = cursor.get('firstBatch', cursor.get('nextBatch'))
+        return len(batch) if isinstance(batch, list) else 0
+    if 'value' in reply:  # findAndModify
+        return 1 if reply.get('value') else 0
+    return 0
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Feed command events into the statistics of the request being handled
+    """
+
+    def started(self, event):
+        stats = _request_stats.get()
+        if stats is None or event.command_name in IGNORED_COMMANDS:
+            return
+        stats.pending[(event.connection_id, event.request_id)] = (
+            f"{event.command_name}:{get_command_collection(event.command_name, event.command)}",
+            event.command_name,
+            event.command,
+            event.database_name
+        )
+
+    def succeeded(self, event):
+        stats = _request_stats.get()
+        if stats is None:
+            return
+        pending = stats.pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        operation, command_name, command, database_name = pending
+        duration_ms = event.duration_micros / 1000
+        docs_returned = count_returned_documents(event.reply)
+        stats.record(operation, duration_ms, docs_returned)
+
+        slow_query_ms = getattr(settings, 'MONGO_SLOW_QUERY_MS', 100)
+        if slow_query_ms and duration_ms >= slow_query_ms:
+            from dbmonitor.recorder import record_slow_command
+            record_slow_command(command_name, command, database_name, duration_ms, docs_returned, stats.path)
+
+    def failed(self, event):
+        stats = _request_stats.get()
+        if stats is None:
+            return
+        pending = stats.pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        stats.record(pending[0], event.duration_micros / 1000, 0, failed=True)
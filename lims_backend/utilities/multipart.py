@@ -0,0 +1,57 @@
+"""
+Multipart form data parsing for PUT/PATCH requests
+
+Django only parses multipart bodies for POST. For other methods the views
+used to wrap request.body in BytesIO and parse it with MemoryFileUploadHandler,
+which kept the whole body in memory twice. This parser streams the request
+through the configured upload handlers instead, so uploads larger than
+FILE_UPLOAD_MAX_MEMORY_SIZE are spooled to temporary files.
+"""
+
+from io import BytesIO
+
+from django.http.multipartparser import MultiPartParser, MultiPartParserError
+
+
+def is_multipart(request):
+    """
+    Check if the request carries multipart form data
+    """
+    return bool(request.content_type and 'multipart/form-data' in request.content_type)
+
+
+def flatten_form_data(query_dict):
+    """
+    Convert a QueryDict to a plain dict, keeping the last value for each key
+    """
+    return {key: query_dict.get(key) for key in query_dict.keys()}
+
+
+def parse_multipart_data(request):
+    """
+    Parse multipart form data for any HTTP method
+    Returns: (form_data dict, files MultiValueDict) or (None, None) when the
+    request is not multipart. Raises MultiPartParserError on malformed bodies.
+    """
+    if not is_multipart(request):
+        return None, None
+
+    # POST bodies are already parsed (and streamed) by Django
+    if request.method == 'POST':
+        return flatten_form_data(request.POST), request.FILES
+
+    # If something already read request.body, parse the cached copy;
+    # otherwise read straight from the request stream
+    if hasattr(request, '_body'):
+        stream = BytesIO(request._body)
+    else:
+        stream = request
+
+    parser = MultiPartParser(request.META, stream, request.upload_handlers, request.encoding)
+    parsed_data, files = parser.parse()
+
+    # Let Django close (and delete) temporary upload files when the request ends
+    request._files = files
+
+    return flatten_form_data(parsed_data), files
+
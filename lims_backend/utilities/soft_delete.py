@@ -0,0 +1,64 @@
+"""
+Soft delete filters
+
+Older documents were written before `is_active` existed, so queries had to
+match `{'is_active': True}` or a missing field. The backfill_is_active command
+sets the field on those documents and records completion per collection in
+the data_migrations collection. Once a collection is marked complete,
+active_filter returns the plain `{'is_active': True}` predicate, which the
+partial indexes in dbmonitor/index_registry.py can serve.
+"""
+
+import time
+from datetime import datetime
+
+from mongoengine import connection
+
+
+LEGACY_ACTIVE_COLLECTIONS = ('sample_lots', 'certificate_items', 'test_methods')
+MIGRATION_PREFIX = 'is_active_backfill:'
+STATE_TTL_SECONDS = 60
+
+_completed = {}  # collection name -> (is complete, checked at)
+
+
+def legacy_active_filter():
+    return {'$or': [{'is_active': True}, {'is_active': {'$exists': False}}]}
+
+
+def is_backfill_complete(collection_name):
+    """
+    True once backfill_is_active has finished for a collection (cached per worker)
+    """
+    now = time.monotonic()
+    cached = _completed.get(collection_name)
+    if cached is not None and (cached[0] or now - cached[1] < STATE_TTL_SECONDS):
+        return cached[0]
+
+    try:
+        state = connection.get_db().data_migrations.find_one({'_id': MIGRATION_PREFIX + collection_name}, {'completed_at': 1})
+        complete = bool(state and state.get('completed_at'))
+    except Exception as e:
+        print(f"Error reading migration state for {collection_name}: {e}")
+        complete = False
+    _completed[collection_name] = (complete, now)
+    return complete
+
+
+def active_filter(collection_name):
+    """
+    Return a new query dict matching active documents of a collection
+    Callers may add further conditions to the returned dict.
+    """
+    if is_backfill_complete(collection_name):
+        return {'is_active': True}
+    return legacy_active_filter()
+
+
+def mark_backfill_complete(collection_name, updated_count):
+    connection.get_db().data_migrations.update_one(
+        {'_id': MIGRATION_PREFIX + collection_name},
+        {'$set': {'completed_at': datetime.now(), 'updated_count': updated_count}},
+        upsert=True
+    )
+    _completed.pop(collection_name, None)
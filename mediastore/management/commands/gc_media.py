@@ -0,0 +1,203 @@
+"""
+Garbage-collect media files that are no longer referenced by any document
+
+Usage:
+    python manage.py gc_media --dry-run
+    python manage.py gc_media --quarantine
+    python manage.py gc_media --prefix certificate_images --max-files 5000
+"""
+
+import os
+import shutil
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from mongoengine import connection
+
+from lims_backend.utilities.images import media_relative_path, derivative_relative_path, get_derivative_variants, get_derivatives_dir
+from mediastore.storage import get_blob_dir, release_file
+
+
+QUARANTINE_DIR = '.quarantine'
+
+
+class Command(BaseCommand):
+    help = 'Delete or quarantine media files that are not referenced by any document'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report unreferenced files')
+        parser.add_argument('--quarantine', action='store_true', help=f'Move unreferenced files to MEDIA_ROOT/{QUARANTINE_DIR}/ instead of deleting them')
+        parser.add_argument('--include-inactive', action='store_true', help='Keep media referenced by soft-deleted certificate items')
+        parser.add_argument('--prefix', default='', help='Only scan this folder below MEDIA_ROOT (e.g. certificate_images)')
+        parser.add_argument('--start-after', default='', help='Resume a previous scan after this media path')
+        parser.add_argument('--max-files', type=int, default=0, help='Stop after scanning this many files (0 = no limit)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of files removed per batch')
+        parser.add_argument('--min-age-hours', type=float, default=24, help='Skip files modified more recently (uploads not yet saved on a document)')
+
+    def handle(self, *args, **options):
+        media_root = os.path.abspath(settings.MEDIA_ROOT)
+        if not os.path.isdir(media_root):
+            self.stdout.write(self.style.WARNING(f'MEDIA_ROOT does not exist: {media_root}'))
+            return
+
+        self.stdout.write('Building referenced media set...')
+        referenced = self.build_referenced_paths(options['include_inactive'])
+        self.stdout.write(f'  {len(referenced)} referenced paths')
+
+        min_mtime = time.time() - options['min_age_hours'] * 3600
+        quarantine_root = os.path.join(media_root, QUARANTINE_DIR, datetime.now().strftime('%Y-%m-%d_%H-%M-%S'))
+
+        scanned = 0
+        orphan_count = 0
+        orphan_bytes = 0
+        last_path = ''
+        batch = []
+
+        for relative_path, full_path in self.walk_media(media_root, options['prefix'], options['start_after']):
+            if options['max_files'] and scanned >= options['max_files']:
+                break
+            scanned += 1
+            last_path = relative_path
+
+            if relative_path in referenced:
+                continue
+            try:
+                stat = os.stat(full_path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime > min_mtime:
+                continue
+
+            orphan_count += 1
+            orphan_bytes += stat.st_size
+            batch.append((relative_path, full_path))
+
+            if len(batch) >= options['batch_size']:
+                self.process_batch(batch, options, quarantine_root)
+                batch = []
+
+        if batch:
+            self.process_batch(batch, options, quarantine_root)
+
+        if not options['dry_run']:
+            self.remove_empty_dirs(media_root, options['prefix'])
+
+        action = 'Would remove' if options['dry_run'] else ('Quarantined' if options['quarantine'] else 'Removed')
+        self.stdout.write(self.style.SUCCESS(
+            f'Scanned {scanned} files. {action} {orphan_count} unreferenced files '
+            f'({orphan_bytes / (1024 * 1024):.2f} MB).'
+        ))
+        if options['max_files'] and scanned >= options['max_files'] and last_path:
+            self.stdout.write(f'Scan limit reached. Resume with: --start-after "{last_path}"')
+
+    def build_referenced_paths(self, include_inactive):
+        """
+        Collect every media path referenced by documents, streaming each collection
+        """
+        db = connection.get_db()
+        referenced = set()
+
+        def add(image):
+            relative_path = media_relative_path(image)
+            if relative_path:
+                referenced.add(relative_path)
+
+        for doc in db.welders.find({'profile_image': {'$nin': ['', None]}}, {'profile_image': 1}).batch_size(1000):
+            add(doc.get('profile_image'))
+
+        for doc in db.pqrs.find({'joint_design_sketch.0': {'$exists': True}}, {'joint_design_sketch': 1}).batch_size(1000):
+            for sketch in doc.get('joint_design_sketch', []):
+                add(sketch)
+
+        item_query = {} if include_inactive else {'is_active': {'$ne': False}}
+        item_query['specimen_sections.images_list.0'] = {'$exists': True}
+        for doc in db.certificate_items.find(item_query, {'specimen_sections.images_list.image_url': 1}).batch_size(500):
+            for section in doc.get('specimen_sections', []):
+                for image in section.get('images_list', []):
+                    add(image.get('image_url'))
+
+        # Derivatives live as long as their source image
+        variants = list(get_derivative_variants())
+        for source_path in list(referenced):
+            for variant in variants:
+                referenced.add(derivative_relative_path(source_path, variant))
+
+        # Content blobs are kept while they still have references
+        for doc in db.media_blobs.find({'ref_count': {'$gt': 0}}, {'storage_path': 1}).batch_size(1000):
+            referenced.add(doc['storage_path'])
+
+        return referenced
+
+    def walk_media(self, media_root, prefix, start_after, directory=None):
+        """
+        Yield (relative path, absolute path) for media files in path order, one directory at a time
+        """
+        if directory is None:
+            directory = os.path.join(media_root, prefix) if prefix else media_root
+        try:
+            with os.scandir(directory) as iterator:
+                entries = list(iterator)
+        except OSError:
+            return
+
+        # Sort folders as 'name/' so traversal order matches plain path comparison (used for resuming)
+        entries.sort(key=lambda entry: entry.name + '/' if entry.is_dir(follow_symlinks=False) else entry.name)
+
+        for entry in entries:
+            relative_path = os.path.relpath(entry.path, media_root).replace(os.sep, '/')
+            if entry.is_dir(follow_symlinks=False):
+                if relative_path == QUARANTINE_DIR:
+                    continue
+                # Skip whole folders that sort before the resume point
+                folder = f'{relative_path}/'
+                if start_after and folder < start_after and not start_after.startswith(folder):
+                    continue
+                yield from self.walk_media(media_root, prefix, start_after, entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                if start_after and relative_path <= start_after:
+                    continue
+                yield relative_path, entry.path
+
+    def process_batch(self, batch, options, quarantine_root):
+        """
+        Delete, quarantine or report a batch of unreferenced files
+        """
+        blob_prefix = f'{get_blob_dir()}/'
+        derivatives_prefix = f'{get_derivatives_dir()}/'
+
+        for relative_path, full_path in batch:
+            if options['dry_run']:
+                self.stdout.write(f'  [dry-run] {relative_path}')
+                continue
+            try:
+                if options['quarantine']:
+                    target_path = os.path.join(quarantine_root, relative_path)
+                    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                    shutil.move(full_path, target_path)
+                else:
+                    os.remove(full_path)
+
+                # Drop the content-store reference held by this logical path
+                if not relative_path.startswith(blob_prefix) and not relative_path.startswith(derivatives_prefix):
+                    release_file(relative_path, remove_link=False)
+            except Exception as e:
+                self.stderr.write(f'  Error removing {relative_path}: {e}')
+
+        if not options['dry_run']:
+            self.stdout.write(f'  Processed batch of {len(batch)} files')
+
+    def remove_empty_dirs(self, media_root, prefix):
+        """
+        Remove folders left empty after garbage collection
+        """
+        start_dir = os.path.join(media_root, prefix) if prefix else media_root
+        for directory, subdirs, files in os.walk(start_dir, topdown=False):
+            if directory in (media_root, start_dir) or QUARANTINE_DIR in os.path.relpath(directory, media_root).split(os.sep):
+                continue
+            try:
+                if not os.listdir(directory):
+                    os.rmdir(directory)
+            except OSError:
+                pass
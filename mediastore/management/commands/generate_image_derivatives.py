@@ -0,0 +1,67 @@
+"""
+Generate missing image derivatives (see lims_backend/utilities/images.py)
+
+Uploads generate their derivatives; this command generates them for images
+uploaded before that existed: welder profile images and certificate item
+images. Until an image has its derivative, APIs return a null thumbnail_url.
+
+Usage:
+    python manage.py generate_image_derivatives
+    python manage.py generate_image_derivatives --force
+"""
+
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from mongoengine import connection
+
+from lims_backend.utilities.images import (
+    derivative_relative_path, generate_derivative, get_derivative_variants, media_relative_path
+)
+
+
+def stored_images(db):
+    """
+    Every stored image reference that gets derivatives
+    """
+    for welder_doc in db.welders.find({'profile_image': {'$nin': [None, '']}}, {'profile_image': 1}):
+        yield welder_doc['profile_image']
+    items = db.certificate_items.find(
+        {'specimen_sections.images_list.image_url': {'$exists': True}},
+        {'specimen_sections.images_list.image_url': 1}
+    )
+    for item_doc in items:
+        for section in item_doc.get('specimen_sections', []):
+            for image in section.get('images_list', []):
+                if image.get('image_url'):
+                    yield image['image_url']
+
+
+class Command(BaseCommand):
+    help = 'Generate the configured derivatives of existing images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate derivatives that already exist')
+
+    def handle(self, *args, **options):
+        seen = set()
+        generated = failed = 0
+        for image in stored_images(connection.get_db()):
+            relative_path = media_relative_path(image)
+            if not relative_path or relative_path in seen:
+                continue
+            seen.add(relative_path)
+
+            for variant in get_derivative_variants():
+                target_path = os.path.join(settings.MEDIA_ROOT, derivative_relative_path(relative_path, variant))
+                if os.path.isfile(target_path) and not options['force']:
+                    continue
+                if generate_derivative(relative_path, variant):
+                    generated += 1
+                else:
+                    failed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {len(seen)} images: {generated} derivatives generated, {failed} failed.'
+        ))
@@ -0,0 +1,48 @@
+from mongoengine import Document, fields
+from datetime import datetime
+
+
+class MediaBlob(Document):
+    """
+    Content-addressed media blob
+    Each unique file content is stored once on disk, keyed by its SHA-256 digest.
+    ref_count tracks how many logical media paths point at the blob.
+    """
+    sha256 = fields.StringField(max_length=64, unique=True, required=True)
+    storage_path = fields.StringField(max_length=500, required=True)  # Path relative to MEDIA_ROOT
+    size = fields.IntField(default=0)
+    ref_count = fields.IntField(default=0)
+    created_at = fields.DateTimeField(default=datetime.now)
+    updated_at = fields.DateTimeField(default=datetime.now)
+    
+    meta = {
+        'collection': 'media_blobs',
+        'indexes': ['sha256', 'ref_count']
+    }
+    
+    def save(self, *args, **kwargs):
+        self.updated_at = datetime.now()
+        return super().save(*args, **kwargs)
+        
+    def __str__(self):
+        return f"{self.sha256} ({self.ref_count} refs)"
+
+
+class MediaFile(Document):
+    """
+    Logical media path (the path stored on documents and served under MEDIA_URL)
+    mapped to the content blob holding its bytes
+    """
+    path = fields.StringField(max_length=500, unique=True, required=True)  # Path relative to MEDIA_ROOT
+    sha256 = fields.StringField(max_length=64, required=True)  # Reference to MediaBlob.sha256
+    size = fields.IntField(default=0)
+    original_filename = fields.StringField(max_length=500)
+    created_at = fields.DateTimeField(default=datetime.now)
+    
+    meta = {
+        'collection': 'media_files',
+        'indexes': ['path', 'sha256']
+    }
+        
+    def __str__(self):
+        return f"{self.path} -> {self.sha256}"
@@ -0,0 +1,190 @@
+"""
+Content-addressed, deduplicated media storage
+
+Blob bytes live once under MEDIA_ROOT/<MEDIA_BLOB_DIR>/aa/bb/<sha256>. Logical
+media paths (e.g. certificate_images/<specimen_id>/img_x.jpg) are hard links
+to the blob, so existing media URLs keep working while identical uploads
+share one copy on disk. The media_files collection maps logical paths to
+blobs and media_blobs keeps a reference count per blob.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from pymongo import ReturnDocument
+
+from .models import MediaBlob, MediaFile
+
+
+def get_blob_dir():
+    """
+    Return the media-relative folder holding content blobs
+    """
+    return getattr(settings, 'MEDIA_BLOB_DIR', 'blobs')
+
+
+def blob_relative_path(sha256):
+    """
+    Build the media-relative blob path for a digest (two-level fan-out)
+    """
+    return f"{get_blob_dir()}/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def compute_sha256(uploaded_file):
+    """
+    Hash an uploaded file in chunks
+    Returns: (hex digest, size in bytes)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    uploaded_file.seek(0)
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest(), size
+
+
+def _write_blob(uploaded_file, blob_full_path):
+    """
+    Write blob bytes atomically (temporary file + rename)
+    """
+    os.makedirs(os.path.dirname(blob_full_path), exist_ok=True)
+    temp_path = f"{blob_full_path}.{uuid.uuid4().hex[:8]}.tmp"
+    uploaded_file.seek(0)
+    with open(temp_path, 'wb') as destination:
+        for chunk in uploaded_file.chunks():
+            destination.write(chunk)
+    os.replace(temp_path, blob_full_path)
+
+
+def _link_blob(blob_full_path, target_full_path):
+    """
+    Expose a blob at its logical path, without copying bytes when possible
+    """
+    os.makedirs(os.path.dirname(target_full_path), exist_ok=True)
+    if os.path.lexists(target_full_path):
+        os.remove(target_full_path)
+    try:
+        os.link(blob_full_path, target_full_path)
+    except OSError as e:
+        # Filesystem without hard link support: fall back to a copy (no disk deduplication)
+        print(f"Hard link failed for {target_full_path} ({e}); copying blob, deduplication is disabled for it")
+        shutil.copyfile(blob_full_path, target_full_path)
+
+
+def _remove_file(full_path):
+    try:
+        if os.path.lexists(full_path):
+            os.remove(full_path)
+    except Exception as e:
+        print(f"Error removing media file {full_path}: {e}")
+
+
+def store_file(uploaded_file, logical_path, original_filename=None):
+    """
+    Store an uploaded file at a logical media path, deduplicating by content
+    Returns: dict with path, sha256, size and deduplicated (True when no bytes were written)
+    """
+    logical_path = logical_path.lstrip('/')
+    sha256, size = compute_sha256(uploaded_file)
+    storage_path = blob_relative_path(sha256)
+    blob_full_path = os.path.join(settings.MEDIA_ROOT, storage_path)
+
+    # A logical path is only ever bound to one blob: release any previous binding
+    existing = MediaFile.objects(path=logical_path).first()
+    if existing and existing.sha256 != sha256:
+        release_file(logical_path)
+
+    # Take the reference first so a concurrent release cannot drop the blob
+    now = datetime.now()
+    blobs_collection = MediaBlob._get_collection()
+    result = blobs_collection.update_one(
+        {'sha256': sha256},
+        {
+            '$inc': {'ref_count': 0 if existing and existing.sha256 == sha256 else 1},
+            '$set': {'updated_at': now},
+            '$setOnInsert': {'storage_path': storage_path, 'size': size, 'created_at': now}
+        },
+        upsert=True
+    )
+
+    deduplicated = True
+    if result.upserted_id is not None or not os.path.exists(blob_full_path):
+        _write_blob(uploaded_file, blob_full_path)
+        deduplicated = False
+
+    _link_blob(blob_full_path, os.path.join(settings.MEDIA_ROOT, logical_path))
+
+    MediaFile._get_collection().update_one(
+        {'path': logical_path},
+        {
+            '$set': {
+                'sha256': sha256,
+                'size': size,
+                'original_filename': original_filename or getattr(uploaded_file, 'name', '') or ''
+            },
+            '$setOnInsert': {'created_at': now}
+        },
+        upsert=True
+    )
+
+    return {
+        'path': logical_path,
+        'sha256': sha256,
+        'size': size,
+        'deduplicated': deduplicated
+    }
+
+
+def release_file(logical_path, remove_link=True):
+    """
+    Drop a logical media path and its blob reference
+    The blob itself is deleted only when its reference count reaches zero.
+    Returns: True if the path was tracked by the store
+    """
+    logical_path = logical_path.lstrip('/')
+    if remove_link:
+        _remove_file(os.path.join(settings.MEDIA_ROOT, logical_path))
+
+    file_doc = MediaFile._get_collection().find_one_and_delete({'path': logical_path})
+    if not file_doc:
+        return False
+
+    blobs_collection = MediaBlob._get_collection()
+    blob_doc = blobs_collection.find_one_and_update(
+        {'sha256': file_doc['sha256']},
+        {'$inc': {'ref_count': -1}, '$set': {'updated_at': datetime.now()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if blob_doc and blob_doc.get('ref_count', 0) <= 0:
+        # Only the caller that removes the zero-ref document deletes the bytes
+        deleted = blobs_collection.delete_one({'_id': blob_doc['_id'], 'ref_count': {'$lte': 0}})
+        if deleted.deleted_count:
+            _remove_file(os.path.join(settings.MEDIA_ROOT, blob_doc['storage_path']))
+
+    return True
+
+
+def release_prefix(prefix, remove_links=True):
+    """
+    Release every logical media path under a folder prefix (e.g. 'pqrs/<pqr_id>/')
+    Returns: number of released paths
+    """
+    prefix = prefix.lstrip('/')
+    if not prefix.endswith('/'):
+        prefix = f"{prefix}/"
+
+    cursor = MediaFile._get_collection().find(
+        {'path': {'$regex': f"^{re.escape(prefix)}"}},
+        {'path': 1}
+    )
+    paths = [doc['path'] for doc in cursor]
+    for path in paths:
+        release_file(path, remove_link=remove_links)
+    return len(paths)
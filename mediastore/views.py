@@ -0,0 +1,95 @@
+from django.http import JsonResponse, FileResponse, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from django.conf import settings
+from functools import wraps
+from urllib.parse import quote
+import mimetypes
+import os
+import time
+
+from authentication.decorators import any_authenticated_user
+from lims_backend.utilities.media_urls import verify_media_signature
+
+
+# Media filenames are unique (uuid/timestamp based), so a URL never changes content
+MEDIA_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+
+def signed_or_authenticated(view_func):
+    """
+    Serve requests carrying a valid media URL signature (see
+    lims_backend/utilities/media_urls.py); any other request needs the JWT
+    """
+    authenticated_view = any_authenticated_user(view_func)
+
+    @wraps(view_func)
+    def wrapper(request, path, *args, **kwargs):
+        if 'signature' not in request.GET:
+            return authenticated_view(request, path, *args, **kwargs)
+        relative_path, _ = resolve_media_path(path)
+        if not relative_path or not verify_media_signature(relative_path, request.GET.get('expires'), request.GET['signature']):
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Invalid or expired media URL'
+            }, status=403)
+        return view_func(request, path, *args, **kwargs)
+    return wrapper
+
+
+def resolve_media_path(path):
+    """
+    Normalize a requested media path and make sure it stays inside MEDIA_ROOT
+    Returns: (relative path, absolute path) or (None, None) if invalid
+    """
+    relative_path = os.path.normpath(path.lstrip('/'))
+    if relative_path.startswith('..') or os.path.isabs(relative_path) or relative_path == '.':
+        return None, None
+
+    media_root = os.path.abspath(settings.MEDIA_ROOT)
+    full_path = os.path.abspath(os.path.join(media_root, relative_path))
+    if not full_path.startswith(media_root + os.sep):
+        return None, None
+
+    return relative_path.replace(os.sep, '/'), full_path
+
+
+@csrf_exempt
+@require_http_methods(["GET", "HEAD"])
+@signed_or_authenticated
+def serve_media(request, path):
+    """
+    Serve a media file to an authenticated user or through a signed URL
+    In production the file transfer is handed to nginx with X-Accel-Redirect,
+    so Python workers only check the token. Without nginx (development) the
+    file is streamed by Django.
+    """
+    relative_path, full_path = resolve_media_path(path)
+    if not relative_path:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Invalid media path'
+        }, status=400)
+
+    if not os.path.isfile(full_path):
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Media file not found'
+        }, status=404)
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    if getattr(settings, 'MEDIA_ACCEL_REDIRECT', False):
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = f"{settings.MEDIA_ACCEL_PREFIX}{quote(relative_path)}"
+    else:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+
+    if 'signature' in request.GET:
+        # A signed URL can be cached until it expires
+        max_age = max(0, int(request.GET['expires']) - int(time.time()))
+        response['Cache-Control'] = f'private, max-age={max_age}, immutable'
+    else:
+        response['Cache-Control'] = MEDIA_CACHE_CONTROL
+    return response
@@ -0,0 +1,61 @@
+"""
+Backfill the searchable PQR attributes extracted from the PQR sections
+(see pqrs/search_fields.py)
+
+New writes extract them themselves; run this after deploying and after
+adding or changing an entry of PQR_SEARCH_FIELDS. A PQR changed while the
+command runs is skipped (its write already set the attributes). Completion is
+recorded with the extracted attributes; searches fall back to basic_info
+until then (see pqrs/search_fields.py).
+
+Usage:
+    python manage.py backfill_pqr_search_fields
+    python manage.py backfill_pqr_search_fields --batch-size 200 --dry-run
+"""
+
+from django.core.management.base import BaseCommand
+from mongoengine import connection
+from pymongo import UpdateOne
+
+from pqrs.search_fields import PQR_SEARCH_FIELDS, SEARCH_SECTIONS, extract_search_fields, mark_search_fields_backfilled
+
+
+class Command(BaseCommand):
+    help = 'Extract the searchable PQR attributes from the PQR sections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='PQRs per bulk write (default 200)')
+        parser.add_argument('--dry-run', action='store_true', help='Count PQRs whose attributes would change without writing')
+
+    def handle(self, *args, **options):
+        db = connection.get_db()
+        collection = db.pqrs
+        attributes = [entry['attribute'] for entry in PQR_SEARCH_FIELDS]
+        projection = {field: 1 for field in SEARCH_SECTIONS + tuple(attributes) + ('updated_at',)}
+
+        operations = []
+        pending = 0
+        updated = 0
+        for pqr_doc in collection.find({}, projection).batch_size(options['batch_size']):
+            extracted = extract_search_fields(pqr_doc)
+            if all(attribute in pqr_doc and pqr_doc[attribute] == extracted[attribute] for attribute in attributes):
+                continue
+            pending += 1
+            if options['dry_run']:
+                continue
+
+            # Skip PQRs modified since they were read
+            operations.append(UpdateOne({'_id': pqr_doc['_id'], 'updated_at': pqr_doc.get('updated_at')}, {'$set': extracted}))
+            if len(operations) >= options['batch_size']:
+                updated += collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+                self.stdout.write(f'  {updated} updated')
+
+        if operations:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+
+        if options['dry_run']:
+            self.stdout.write(f'{pending} PQRs need their search attributes extracted')
+        else:
+            mark_search_fields_backfilled(db, updated)
+            self.stdout.write(self.style.SUCCESS(f'Extracted search attributes for {updated} PQRs.'))
@@ -0,0 +1,51 @@
+"""
+Backfill the list summary of PQRs (see pqrs/summary.py)
+
+New writes maintain the summary themselves; this command computes it for
+existing documents, in batches. A PQR changed while the command runs is
+skipped (its write already set the summary). Completion is recorded in
+data_migrations, after which lists stop reading the sections.
+
+Usage:
+    python manage.py backfill_pqr_summaries
+    python manage.py backfill_pqr_summaries --missing-only --batch-size 200
+"""
+
+from django.core.management.base import BaseCommand
+from mongoengine import connection
+from pymongo import UpdateOne
+
+from pqrs.summary import SUMMARY_FIELD, SUMMARY_SOURCE_FIELDS, build_pqr_summary, mark_summaries_backfilled
+
+
+class Command(BaseCommand):
+    help = 'Compute the list summary subdocument of PQRs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing-only', action='store_true', help='Only PQRs without a summary')
+        parser.add_argument('--batch-size', type=int, default=200, help='PQRs per bulk write (default 200)')
+
+    def handle(self, *args, **options):
+        db = connection.get_db()
+        collection = db.pqrs
+        query = {SUMMARY_FIELD: {'$exists': False}} if options['missing_only'] else {}
+        projection = {field: 1 for field in SUMMARY_SOURCE_FIELDS + ('updated_at',)}
+
+        operations = []
+        updated = 0
+        for pqr_doc in collection.find(query, projection).batch_size(options['batch_size']):
+            # Skip PQRs modified since they were read
+            operations.append(UpdateOne(
+                {'_id': pqr_doc['_id'], 'updated_at': pqr_doc.get('updated_at')},
+                {'$set': {SUMMARY_FIELD: build_pqr_summary(pqr_doc)}}
+            ))
+            if len(operations) >= options['batch_size']:
+                updated += collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+                self.stdout.write(f'  {updated} updated')
+
+        if operations:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+
+        mark_summaries_backfilled(db, updated)
+        self.stdout.write(self.style.SUCCESS(f'Wrote summaries for {updated} PQRs.'))
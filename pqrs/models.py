@@ -2,6 +2,9 @@ from mongoengine import Document, fields
 from datetime import datetime
 from bson import ObjectId
 
+from .summary import SECTION_FIELDS, build_pqr_summary
+from .search_fields import SEARCH_SECTIONS, extract_search_fields
+
 
 class PQR(Document):
     """
@@ -31,6 +34,12 @@ class PQR(Document):
     lab_test_no = fields.StringField(max_length=100, required=True)
     law_name = fields.StringField(max_length=200, required=True)
     signatures = fields.DictField()  # JSON field for signatures data
+    summary = fields.DictField()  # List row summary, recomputed on save (see pqrs/summary.py)
+    # Normalized values extracted from the sections on save (see pqrs/search_fields.py)
+    pqr_number = fields.StringField(max_length=100)
+    processes = fields.ListField(fields.StringField(max_length=100))
+    p_numbers = fields.ListField(fields.StringField(max_length=100))
+    welding_positions = fields.ListField(fields.StringField(max_length=100))
     is_active = fields.BooleanField(default=True)
     created_at = fields.DateTimeField(default=datetime.now)
     updated_at = fields.DateTimeField(default=datetime.now)
@@ -44,11 +53,20 @@ class PQR(Document):
             'mechanical_testing_conducted_by',
             'lab_test_no',
             'is_active',
-            'created_at'
+            'created_at',
+            'pqr_number',
+            'processes',
+            'p_numbers',
+            'welding_positions'
         ]
     }
     
     def save(self, *args, **kwargs):
+        self.summary = build_pqr_summary({
+            field: getattr(self, field) for field in SECTION_FIELDS + ('joint_design_sketch',)
+        })
+        for attribute, value in extract_search_fields({field: getattr(self, field) for field in SEARCH_SECTIONS}).items():
+            setattr(self, attribute, value)
         self.updated_at = datetime.now()
         return super().save(*args, **kwargs)
         
@@ -0,0 +1,156 @@
+"""
+Searchable PQR fields
+
+PQR sections are free-form DictFields, so values clients filter on (PQR
+number, welding process, base metal P-number, position) sit at arbitrary
+depths, e.g. base_metals.base_metal_1.p_number. Each entry of
+PQR_SEARCH_FIELDS declares a typed top-level PQR attribute and where its
+values come from; the values are extracted on every save/update, stored
+normalized (whitespace collapsed, upper case) and indexed, so filters are
+index lookups. To add one, declare the attribute on the PQR model (with an
+index), add an entry here and run `python manage.py backfill_pqr_search_fields`.
+
+The backfill records the attributes it extracted in the data_migrations
+collection. Until every declared attribute has been backfilled, PQRs written
+before may not have them: the pqr_number filter and the pqr_search q match
+also read basic_info, and the other filters only match PQRs saved since.
+
+Entry keys:
+    attribute  PQR field the values are stored in
+    section    DictField the values are read from
+    keys       key names matched at any depth inside the section
+    many       True for a ListField of every value found (comma separated
+               values are split), False for the first value
+    param      query parameter of pqr_list/pqr_search filtering on it
+"""
+
+import re
+import time
+from datetime import datetime
+
+from mongoengine import connection
+
+
+PQR_SEARCH_FIELDS = (
+    {'attribute': 'pqr_number', 'section': 'basic_info', 'keys': ('pqr_number', 'pqr_no'), 'many': False, 'param': 'pqr_number'},
+    {'attribute': 'processes', 'section': 'welding_parameters', 'keys': ('process', 'welding_process'), 'many': True, 'param': 'process'},
+    {'attribute': 'p_numbers', 'section': 'base_metals', 'keys': ('p_number', 'p_no'), 'many': True, 'param': 'p_number'},
+    {'attribute': 'welding_positions', 'section': 'positions', 'keys': ('welding_position', 'position'), 'many': True, 'param': 'position'},
+)
+
+SEARCH_SECTIONS = tuple({entry['section'] for entry in PQR_SEARCH_FIELDS})
+MIGRATION_ID = 'pqr_search_fields_backfill'
+STATE_TTL_SECONDS = 60
+
+_backfill_state = {}  # 'complete' -> (is complete, checked at)
+
+
+def is_search_fields_backfilled():
+    """
+    True once backfill_pqr_search_fields has extracted every declared attribute (cached per worker)
+    """
+    now = time.monotonic()
+    cached = _backfill_state.get('complete')
+    if cached is not None and (cached[0] or now - cached[1] < STATE_TTL_SECONDS):
+        return cached[0]
+
+    try:
+        state = connection.get_db().data_migrations.find_one({'_id': MIGRATION_ID}, {'completed_at': 1, 'attributes': 1})
+        complete = bool(state and state.get('completed_at')) and \
+            {entry['attribute'] for entry in PQR_SEARCH_FIELDS} <= set(state.get('attributes') or [])
+    except Exception as e:
+        print(f"Error reading PQR search fields backfill state: {e}")
+        complete = False
+    _backfill_state['complete'] = (complete, now)
+    return complete
+
+
+def mark_search_fields_backfilled(db, updated_count):
+    db.data_migrations.update_one(
+        {'_id': MIGRATION_ID},
+        {'$set': {
+            'completed_at': datetime.now(),
+            'attributes': [entry['attribute'] for entry in PQR_SEARCH_FIELDS],
+            'updated_count': updated_count
+        }},
+        upsert=True
+    )
+    _backfill_state.pop('complete', None)
+
+
+def legacy_pqr_number_conditions(value, exact=False):
+    """
+    Conditions on the PQR number as entered in basic_info, for PQRs not backfilled yet
+    """
+    entry = PQR_SEARCH_FIELDS[0]
+    pattern = f'^{re.escape(value.strip())}$' if exact else value
+    return [{f"{entry['section']}.{key}": {'$regex': pattern, '$options': 'i'}} for key in entry['keys']]
+
+
+def normalize_value(value):
+    """
+    Stored/compared form of an extracted value
+    """
+    return ' '.join(str(value).split()).upper()
+
+
+def _find_values(data, keys):
+    """
+    Scalar values stored under any of the keys, at any depth, in document order
+    """
+    values = []
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key in keys and not isinstance(value, (dict, list)):
+                values.append(value)
+            else:
+                values.extend(_find_values(value, keys))
+    elif isinstance(data, list):
+        for item in data:
+            values.extend(_find_values(item, keys))
+    return values
+
+
+def extract_search_fields(values):
+    """
+    Search attribute values of a PQR
+    values: mapping with the PQR's section fields (document, or merged update)
+    Returns: {attribute: value}
+    """
+    extracted = {}
+    for entry in PQR_SEARCH_FIELDS:
+        found = []
+        for value in _find_values(values.get(entry['section']) or {}, entry['keys']):
+            parts = str(value).split(',') if entry['many'] else [value]
+            for part in parts:
+                normalized = normalize_value(part)
+                if normalized and normalized not in found:
+                    found.append(normalized)
+        extracted[entry['attribute']] = found if entry['many'] else (found[0] if found else '')
+    return extracted
+
+
+def apply_search_field_filters(request, query):
+    """
+    Add exact (normalized) match conditions for the search field query parameters
+    Until the backfill has completed, pqr_number also matches basic_info; the
+    other filters only match PQRs saved since the attributes were introduced.
+    """
+    backfilled = None
+    for entry in PQR_SEARCH_FIELDS:
+        value = request.GET.get(entry['param'], '')
+        if not value:
+            continue
+        if entry['attribute'] == 'pqr_number':
+            backfilled = is_search_fields_backfilled() if backfilled is None else backfilled
+            if not backfilled:
+                query.setdefault('$and', []).append({'$or': [
+                    {entry['attribute']: normalize_value(value)}, *legacy_pqr_number_conditions(value, exact=True)
+                ]})
+                continue
+        query[entry['attribute']] = normalize_value(value)
+    return query
+
+
+def search_field_filters_applied(request):
+    return {entry['param']: request.GET.get(entry['param'], '') for entry in PQR_SEARCH_FIELDS}
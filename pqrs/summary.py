@@ -0,0 +1,181 @@
+"""
+PQR list summaries
+
+A PQR carries sixteen free-form DictField sections, but list rows only need
+the header fields. Lists (pqr_list, pqr_search, pqr_by_welder) therefore read
+a projection of the header fields plus the `summary` subdocument, which is
+recomputed on every save/update; the sections are only returned in full by
+pqr_detail. Existing documents get their summary from
+`python manage.py backfill_pqr_summaries`, which records its completion in the
+data_migrations collection; until then lists also read the sections and
+compute the summary of PQRs that have none.
+"""
+
+import time
+from datetime import datetime
+
+from mongoengine import connection
+
+from lims_backend.utilities.media_urls import media_url
+
+
+SUMMARY_FIELD = 'summary'
+VIEW_SUMMARY = 'summary'
+VIEW_FULL = 'full'
+
+SECTION_FIELDS = (
+    'basic_info', 'joints', 'base_metals', 'filler_metals', 'positions',
+    'preheat', 'post_weld_heat_treatment', 'gas', 'electrical_characteristics',
+    'techniques', 'welding_parameters', 'tensile_test', 'guided_bend_test',
+    'toughness_test', 'fillet_weld_test', 'other_tests', 'signatures'
+)
+HEADER_FIELDS = (
+    'type', 'welder_id', 'mechanical_testing_conducted_by', 'lab_test_no',
+    'law_name', 'is_active', 'created_at', 'updated_at'
+)
+SUMMARY_PROJECTION = {**{field: 1 for field in HEADER_FIELDS}, SUMMARY_FIELD: 1}
+SUMMARY_SOURCE_FIELDS = SECTION_FIELDS + ('joint_design_sketch',)
+MIGRATION_ID = 'pqr_summaries_backfill'
+STATE_TTL_SECONDS = 60
+
+_backfill_state = {}  # 'complete' -> (is complete, checked at)
+
+
+def is_summaries_backfilled():
+    """
+    True once backfill_pqr_summaries has completed (cached per worker)
+    """
+    now = time.monotonic()
+    cached = _backfill_state.get('complete')
+    if cached is not None and (cached[0] or now - cached[1] < STATE_TTL_SECONDS):
+        return cached[0]
+
+    try:
+        state = connection.get_db().data_migrations.find_one({'_id': MIGRATION_ID}, {'completed_at': 1})
+        complete = bool(state and state.get('completed_at'))
+    except Exception as e:
+        print(f"Error reading PQR summaries backfill state: {e}")
+        complete = False
+    _backfill_state['complete'] = (complete, now)
+    return complete
+
+
+def mark_summaries_backfilled(db, updated_count):
+    db.data_migrations.update_one(
+        {'_id': MIGRATION_ID},
+        {'$set': {'completed_at': datetime.now(), 'updated_count': updated_count}},
+        upsert=True
+    )
+    _backfill_state.pop('complete', None)
+
+
+def list_projection():
+    """
+    Projection of PQR list reads; also the summary's source fields until the backfill has completed
+    """
+    if is_summaries_backfilled():
+        return SUMMARY_PROJECTION
+    return {**SUMMARY_PROJECTION, **{field: 1 for field in SUMMARY_SOURCE_FIELDS}}
+
+
+def build_pqr_summary(values):
+    """
+    Summary subdocument of a PQR
+    values: mapping with the PQR's section fields and joint_design_sketch
+    """
+    basic_info = values.get('basic_info') or {}
+    sketches = values.get('joint_design_sketch') or []
+    return {
+        'pqr_number': str(basic_info.get('pqr_number', '') or '') if isinstance(basic_info, dict) else '',
+        'completed_sections': [field for field in SECTION_FIELDS if values.get(field)],
+        'joint_design_sketch_count': len(sketches),
+        'first_joint_design_sketch': sketches[0] if sketches else ''
+    }
+
+
+def with_summary(pqr_doc):
+    """
+    PQR read with list_projection(), with its summary computed if missing and the source fields dropped
+    """
+    if not pqr_doc.get(SUMMARY_FIELD):
+        pqr_doc[SUMMARY_FIELD] = build_pqr_summary(pqr_doc)
+    for field in SUMMARY_SOURCE_FIELDS:
+        pqr_doc.pop(field, None)
+    return pqr_doc
+
+
+def get_view(request, default=VIEW_SUMMARY):
+    """
+    The 'view' query parameter
+    Raises: ValueError for anything other than summary/full
+    """
+    view = request.GET.get('view', default).lower()
+    if view not in (VIEW_SUMMARY, VIEW_FULL):
+        raise ValueError(f"view must be '{VIEW_SUMMARY}' or '{VIEW_FULL}'")
+    return view
+
+
+def list_view(request):
+    """
+    The view of a PQR list request; lists only serve summaries
+    Raises: ValueError for an invalid view or view=full
+    """
+    if get_view(request) == VIEW_FULL:
+        raise ValueError('view=full is only available from the PQR detail endpoint')
+    return VIEW_SUMMARY
+
+
+def welder_infos(db, welder_ids):
+    """
+    welder_info payloads for a page of PQRs, keyed by Welder._id, in one query
+    """
+    welder_ids = list({welder_id for welder_id in welder_ids if welder_id})
+    infos = {}
+    if not welder_ids:
+        return infos
+    for welder_doc in db.welders.find({'_id': {'$in': welder_ids}}, {'operator_name': 1, 'operator_id': 1, 'iqama': 1, 'profile_image': 1}):
+        profile_image = welder_doc.get('profile_image', '')
+        infos[welder_doc['_id']] = {
+            'welder_id': str(welder_doc['_id']),
+            'operator_name': welder_doc.get('operator_name', 'Unknown Welder'),
+            'operator_id': welder_doc.get('operator_id', ''),
+            'iqama': welder_doc.get('iqama', ''),
+            'profile_image': profile_image,
+            'profile_image_url': media_url(profile_image)
+        }
+    return infos
+
+
+def unknown_welder_info():
+    return {
+        'welder_id': '',
+        'operator_name': 'Unknown Welder',
+        'operator_id': '',
+        'iqama': '',
+        'profile_image': None,
+        'profile_image_url': None
+    }
+
+
+def pqr_summary_row(pqr_doc, welder_info=None):
+    """
+    List row of a PQR read with list_projection() (or in full)
+    """
+    summary = dict(pqr_doc.get(SUMMARY_FIELD) or build_pqr_summary(pqr_doc))
+    if summary.get('first_joint_design_sketch'):
+        summary['first_joint_design_sketch'] = media_url(summary['first_joint_design_sketch'])
+    row = {
+        'id': str(pqr_doc.get('_id', '')),
+        'type': pqr_doc.get('type', ''),
+        'welder_id': str(pqr_doc.get('welder_id', '')),
+        'mechanical_testing_conducted_by': pqr_doc.get('mechanical_testing_conducted_by', ''),
+        'lab_test_no': pqr_doc.get('lab_test_no', ''),
+        'law_name': pqr_doc.get('law_name', ''),
+        'summary': summary,
+        'is_active': pqr_doc.get('is_active', True),
+        'created_at': pqr_doc.get('created_at').isoformat() if pqr_doc.get('created_at') else '',
+        'updated_at': pqr_doc.get('updated_at').isoformat() if pqr_doc.get('updated_at') else ''
+    }
+    if welder_info is not None:
+        row['welder_info'] = welder_info
+    return row
@@ -9,9 +9,20 @@ from mongoengine import connection
 from mongoengine.errors import DoesNotExist, ValidationError
 
 from .models import PQR
+from .search_fields import (
+    SEARCH_SECTIONS, apply_search_field_filters, extract_search_fields, search_field_filters_applied,
+    is_search_fields_backfilled, legacy_pqr_number_conditions
+)
+from .summary import (
+    SECTION_FIELDS, SUMMARY_FIELD, VIEW_FULL, VIEW_SUMMARY, build_pqr_summary,
+    get_view, list_projection, list_view, pqr_summary_row, unknown_welder_info, welder_infos
+)
 from welders.models import Welder
 from authentication.decorators import any_authenticated_user, welding_operations_required
 from lims_backend.utilities.pagination import get_pagination_params, create_pagination_response, paginate_queryset
+from lims_backend.utilities.multipart import parse_multipart_data
+from mediastore.storage import store_file, release_file, release_prefix
+from lims_backend.utilities.media_urls import media_url
 
 
 @csrf_exempt
@@ -20,13 +31,22 @@ from lims_backend.utilities.pagination import get_pagination_params, create_pagi
 def pqr_list(request):
     """
     List all PQRs or create a new PQR
-    GET: Returns list of all PQRs with welder information
+    GET: Returns list of all PQRs (summary rows, see pqrs/summary.py) with welder information
+         pqr_number / process / p_number / position filters read the attributes extracted by
+         pqrs/search_fields.py (run backfill_pqr_search_fields for PQRs saved before them)
     POST: Creates a new PQR
     """
     if request.method == 'GET':
         try:
             # Get pagination parameters
             page, limit, offset = get_pagination_params(request)
+            try:
+                list_view(request)
+            except ValueError as e:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': str(e)
+                }, status=400)
             
             # Get search parameters
             law_name_search = request.GET.get('law_name', '')
@@ -49,6 +69,7 @@ def pqr_list(request):
                 query['lab_test_no'] = {'$regex': lab_test_no_search, '$options': 'i'}
             if type_search:
                 query['type'] = {'$regex': type_search, '$options': 'i'}
+            apply_search_field_filters(request, query)
             
             # Add filtering based on is_active status
             if show_inactive:
@@ -64,76 +85,20 @@ def pqr_list(request):
             # Get total count for pagination
             total_records = pqrs_collection.count_documents(query)
             
-            # Get paginated PQRs
-            pqrs = pqrs_collection.find(query).skip(offset).limit(limit).sort('created_at', -1)
-            data = []
-            
-            for pqr_doc in pqrs:
-                # Get welder information
-                welder_info = {
-                    'welder_id': '',
-                    'operator_name': 'Unknown Welder',
-                    'operator_id': '',
-                    'iqama': '',
-                    'profile_image': None
-                }
-                
-                try:
-                    # Get welder information directly
-                    welder_obj_id = pqr_doc.get('welder_id')
-                    if welder_obj_id:
-                        if isinstance(welder_obj_id, str):
-                            welder_obj_id = ObjectId(welder_obj_id)
-                        welders_collection = db.welders
-                        welder_doc = welders_collection.find_one({'_id': welder_obj_id})
-                        if welder_doc:
-                            welder_info = {
-                                'welder_id': str(welder_doc.get('_id', '')),
-                                'operator_name': welder_doc.get('operator_name', 'Unknown Welder'),
-                                'operator_id': welder_doc.get('operator_id', ''),
-                                'iqama': welder_doc.get('iqama', ''),
-                                'profile_image': welder_doc.get('profile_image', ''),
-                                'profile_image_url': f"/media/{welder_doc.get('profile_image', '')}" if welder_doc.get('profile_image', '') else None
-                            }
-                except Exception:
-                    pass
-                
-                data.append({
-                    'id': str(pqr_doc.get('_id', '')),
-                    'type': pqr_doc.get('type', ''),
-                    'basic_info': pqr_doc.get('basic_info', {}),
-                    'joints': pqr_doc.get('joints', {}),
-                    'joint_design_sketch': pqr_doc.get('joint_design_sketch', []),
-                    'base_metals': pqr_doc.get('base_metals', {}),
-                    'filler_metals': pqr_doc.get('filler_metals', {}),
-                    'positions': pqr_doc.get('positions', {}),
-                    'preheat': pqr_doc.get('preheat', {}),
-                    'post_weld_heat_treatment': pqr_doc.get('post_weld_heat_treatment', {}),
-                    'gas': pqr_doc.get('gas', {}),
-                    'electrical_characteristics': pqr_doc.get('electrical_characteristics', {}),
-                    'techniques': pqr_doc.get('techniques', {}),
-                    'welding_parameters': pqr_doc.get('welding_parameters', {}),
-                    'tensile_test': pqr_doc.get('tensile_test', {}),
-                    'guided_bend_test': pqr_doc.get('guided_bend_test', {}),
-                    'toughness_test': pqr_doc.get('toughness_test', {}),
-                    'fillet_weld_test': pqr_doc.get('fillet_weld_test', {}),
-                    'other_tests': pqr_doc.get('other_tests', {}),
-                    'welder_id': str(pqr_doc.get('welder_id', '')),
-                    'welder_info': welder_info,
-                    'mechanical_testing_conducted_by': pqr_doc.get('mechanical_testing_conducted_by', ''),
-                    'lab_test_no': pqr_doc.get('lab_test_no', ''),
-                    'law_name': pqr_doc.get('law_name', ''),
-                    'signatures': pqr_doc.get('signatures', {}),
-                    'is_active': pqr_doc.get('is_active', True),
-                    'created_at': pqr_doc.get('created_at').isoformat() if pqr_doc.get('created_at') else '',
-                    'updated_at': pqr_doc.get('updated_at').isoformat() if pqr_doc.get('updated_at') else ''
-                })
+            # Get paginated PQRs (header fields and summary only)
+            pqrs = list(pqrs_collection.find(query, list_projection()).skip(offset).limit(limit).sort('created_at', -1))
+            welders = welder_infos(db, [pqr_doc.get('welder_id') for pqr_doc in pqrs])
+            data = [
+                pqr_summary_row(pqr_doc, welders.get(pqr_doc.get('welder_id'), unknown_welder_info()))
+                for pqr_doc in pqrs
+            ]
             
             # Create paginated response
             response_data = create_pagination_response(data, total_records, page, limit)
             
             return JsonResponse({
                 'status': 'success',
+                'view': VIEW_SUMMARY,
                 **response_data
             })
         except Exception as e:
@@ -211,8 +176,6 @@ def pqr_list(request):
             if 'joint_design_sketch' in request.FILES:
                 import uuid
                 import os
-                from django.core.files.storage import default_storage
-                from django.core.files.base import ContentFile
                 from django.conf import settings
                 
                 pqr_id = str(pqr.id)
@@ -230,15 +193,8 @@ def pqr_list(request):
                         # Create directory path using PQR ID
                         directory_path = f"pqrs/{pqr_id}/"
                         
-                        # Read file content
-                        uploaded_file.seek(0)
-                        file_content = uploaded_file.read()
-                        
-                        # Save file
-                        file_path = default_storage.save(
-                            f"{directory_path}{unique_filename}",
-                            ContentFile(file_content)
-                        )
+                        # Save file through the content-addressed store (duplicates write no bytes)
+                        file_path = store_file(uploaded_file, f"{directory_path}{unique_filename}")['path']
                         
                         # Store the file path
                         joint_design_sketch.append(file_path)
@@ -256,7 +212,7 @@ def pqr_list(request):
                     'type': pqr.type,
                     'lab_test_no': pqr.lab_test_no,
                     'law_name': pqr.law_name,
-                    'joint_design_sketch': [f"{settings.MEDIA_URL}{file}" for file in joint_design_sketch]
+                    'joint_design_sketch': [media_url(file) for file in joint_design_sketch]
                 }
             }, status=201)
             
@@ -306,6 +262,21 @@ def pqr_detail(request, object_id):
         if request.method == 'GET':
             from django.conf import settings
             
+            try:
+                view = get_view(request, default=VIEW_FULL)
+            except ValueError as e:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': str(e)
+                }, status=400)
+            if view == VIEW_SUMMARY:
+                welders = welder_infos(db, [pqr_doc.get('welder_id')])
+                return JsonResponse({
+                    'status': 'success',
+                    'view': VIEW_SUMMARY,
+                    'data': pqr_summary_row(pqr_doc, welders.get(pqr_doc.get('welder_id'), unknown_welder_info()))
+                })
+            
             # Get welder information
             welder_info = {
                 'welder_id': '',
@@ -331,7 +302,7 @@ def pqr_detail(request, object_id):
                             'operator_id': welder_doc.get('operator_id', ''),
                             'iqama': welder_doc.get('iqama', ''),
                             'profile_image': welder_doc.get('profile_image', ''),
-                            'profile_image_url': f"{settings.MEDIA_URL}{welder_doc.get('profile_image', '')}" if welder_doc.get('profile_image', '') else None
+                            'profile_image_url': media_url(welder_doc.get('profile_image', ''))
                         }
             except Exception:
                 pass
@@ -343,7 +314,7 @@ def pqr_detail(request, object_id):
                     'type': pqr_doc.get('type', ''),
                     'basic_info': pqr_doc.get('basic_info', {}),
                     'joints': pqr_doc.get('joints', {}),
-                    'joint_design_sketch': [f"{settings.MEDIA_URL}{file}" for file in pqr_doc.get('joint_design_sketch', [])],
+                    'joint_design_sketch': [media_url(file) for file in pqr_doc.get('joint_design_sketch', [])],
                     'base_metals': pqr_doc.get('base_metals', {}),
                     'filler_metals': pqr_doc.get('filler_metals', {}),
                     'positions': pqr_doc.get('positions', {}),
@@ -393,27 +364,9 @@ def pqr_detail(request, object_id):
                 elif request.content_type and 'multipart/form-data' in request.content_type:
                     # Handle multipart form data for PUT requests
                     try:
-                        from django.http.multipartparser import MultiPartParser
-                        from django.core.files.uploadhandler import MemoryFileUploadHandler
-                        from io import BytesIO
-                        
-                        # Create upload handlers
-                        upload_handlers = [MemoryFileUploadHandler()]
-                        
-                        # Create a file-like object from the request body
-                        body_file = BytesIO(request.body)
-                        
-                        # Parse the multipart data
-                        parser = MultiPartParser(request.META, body_file, upload_handlers)
-                        parsed_data, files = parser.parse()
-                        
-                        # Convert QueryDict to regular dict for easier handling
-                        data = {}
-                        for key, value in parsed_data.items():
-                            if isinstance(value, list) and len(value) == 1:
-                                data[key] = value[0]
-                            else:
-                                data[key] = value
+                        # Stream the body through the upload handlers so large
+                        # sketches are spooled to temporary files, not RAM
+                        data, files = parse_multipart_data(request)
                         
                         print(f"Parsed multipart data: {data}")
                         print(f"Parsed files: {files}")
@@ -457,8 +410,6 @@ def pqr_detail(request, object_id):
                 if 'joint_design_sketch' in files_to_process:
                     import uuid
                     import os
-                    from django.core.files.storage import default_storage
-                    from django.core.files.base import ContentFile
                     from django.conf import settings
                     
                     joint_design_sketch = []
@@ -477,15 +428,8 @@ def pqr_detail(request, object_id):
                             # Create directory path using PQR ID
                             directory_path = f"pqrs/{pqr_id}/"
                             
-                            # Read file content
-                            uploaded_file.seek(0)
-                            file_content = uploaded_file.read()
-                            
-                            # Save file
-                            file_path = default_storage.save(
-                                f"{directory_path}{unique_filename}",
-                                ContentFile(file_content)
-                            )
+                            # Save file through the content-addressed store (duplicates write no bytes)
+                            file_path = store_file(uploaded_file, f"{directory_path}{unique_filename}")['path']
                             
                             # Store the file path
                             joint_design_sketch.append(file_path)
@@ -540,12 +484,23 @@ def pqr_detail(request, object_id):
                 # Add updated timestamp
                 update_doc['updated_at'] = datetime.now()
                 
+                # Keep the list summary and search fields in step with the sections
+                if any(field in update_doc for field in SECTION_FIELDS + ('joint_design_sketch',)):
+                    update_doc[SUMMARY_FIELD] = build_pqr_summary({**pqr_doc, **update_doc})
+                if any(field in update_doc for field in SEARCH_SECTIONS):
+                    update_doc.update(extract_search_fields({**pqr_doc, **update_doc}))
+                
                 # Update the document
                 result = pqrs_collection.update_one(
                     {'_id': obj_id},
                     {'$set': update_doc}
                 )
                 
+                # Release sketches replaced by the upload
+                if 'joint_design_sketch' in update_doc:
+                    for old_path in set(pqr_doc.get('joint_design_sketch', [])) - set(update_doc['joint_design_sketch']):
+                        release_file(old_path)
+                
                 # Get updated PQR document
                 updated_pqr = pqrs_collection.find_one({'_id': obj_id})
                 
@@ -556,7 +511,7 @@ def pqr_detail(request, object_id):
                         'id': str(updated_pqr.get('_id', '')),
                         'type': updated_pqr.get('type', ''),
                         'lab_test_no': updated_pqr.get('lab_test_no', ''),
-                        'joint_design_sketch': [f"{settings.MEDIA_URL}{file}" for file in updated_pqr.get('joint_design_sketch', [])],
+                        'joint_design_sketch': [media_url(file) for file in updated_pqr.get('joint_design_sketch', [])],
                         'updated_at': updated_pqr.get('updated_at').isoformat() if updated_pqr.get('updated_at') else ''
                     }
                 })
@@ -573,8 +528,9 @@ def pqr_detail(request, object_id):
             import shutil
             from django.conf import settings
             
-            # Delete image folder if exists
+            # Release stored sketches, then delete image folder if exists
             pqr_id = str(obj_id)
+            release_prefix(f"pqrs/{pqr_id}/")
             media_folder_path = os.path.join(settings.MEDIA_ROOT, 'pqrs', pqr_id)
             if os.path.exists(media_folder_path):
                 try:
@@ -619,9 +575,22 @@ def pqr_search(request):
     - lab_test_no: Search by lab test number (case-insensitive)
     - type: Search by type (case-insensitive)
     - welder_id: Search by welder ID
+    - pqr_number / process / p_number / position: Exact (case-insensitive) match on the
+      values extracted from the PQR sections (see pqrs/search_fields.py). PQRs saved
+      before these attributes existed need `manage.py backfill_pqr_search_fields`
+      to match process / p_number / position; pqr_number also reads basic_info until then.
     - q: Global search across all text fields (type, lab_test_no, law_name, mechanical_testing_conducted_by, welder_name)
+    - view: summary (default); full rows are only returned by pqr_detail
     """
     try:
+        try:
+            list_view(request)
+        except ValueError as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
+        
         # Get query parameters
         law_name = request.GET.get('law_name', '')
         lab_test_no = request.GET.get('lab_test_no', '')
@@ -629,6 +598,8 @@ def pqr_search(request):
         welder_id = request.GET.get('welder_id', '')
         q = request.GET.get('q', '')  # Global search parameter
         
+        db = connection.get_db()
+        
         # Build query for raw MongoDB
         query = {}
         if law_name:
@@ -637,6 +608,7 @@ def pqr_search(request):
             query['lab_test_no'] = {'$regex': lab_test_no, '$options': 'i'}
         if type_filter:
             query['type'] = {'$regex': type_filter, '$options': 'i'}
+        apply_search_field_filters(request, query)
         if welder_id:
             try:
                 query['welder_id'] = ObjectId(welder_id)
@@ -654,8 +626,10 @@ def pqr_search(request):
                 {'lab_test_no': {'$regex': q, '$options': 'i'}},
                 {'law_name': {'$regex': q, '$options': 'i'}},
                 {'mechanical_testing_conducted_by': {'$regex': q, '$options': 'i'}},
-                {'basic_info.pqr_number': {'$regex': q, '$options': 'i'}}
+                {'pqr_number': {'$regex': q, '$options': 'i'}}
             ]
+            if not is_search_fields_backfilled():
+                or_conditions.extend(legacy_pqr_number_conditions(q))
             
             # Add welder name to global search
             try:
@@ -672,83 +646,24 @@ def pqr_search(request):
             if query:
                 # If we have other specific filters, combine them with AND
                 query['$and'] = [
+                    *query.get('$and', []),
                     {k: v for k, v in query.items() if k != '$and'},
                     {'$or': or_conditions}
                 ]
             else:
                 query['$or'] = or_conditions
         
-        # Use raw query to search
-        db = connection.get_db()
-        pqrs_collection = db.pqrs
-        
-        pqrs = pqrs_collection.find(query)
-        
-        data = []
-        for pqr_doc in pqrs:
-            # Get welder information
-            welder_info = {
-                'welder_id': '',
-                'operator_name': 'Unknown Welder',
-                'operator_id': '',
-                'iqama': '',
-                'profile_image': None,
-                'profile_image_url': None
-            }
-            
-            try:
-                # Get welder information directly
-                welder_obj_id = pqr_doc.get('welder_id')
-                if welder_obj_id:
-                    if isinstance(welder_obj_id, str):
-                        welder_obj_id = ObjectId(welder_obj_id)
-                    welders_collection = db.welders
-                    welder_doc = welders_collection.find_one({'_id': welder_obj_id})
-                    if welder_doc:
-                        welder_info = {
-                            'welder_id': str(welder_doc.get('_id', '')),
-                            'operator_name': welder_doc.get('operator_name', 'Unknown Welder'),
-                            'operator_id': welder_doc.get('operator_id', ''),
-                            'iqama': welder_doc.get('iqama', ''),
-                            'profile_image': welder_doc.get('profile_image', ''),
-                            'profile_image_url': f"/media/{welder_doc.get('profile_image', '')}" if welder_doc.get('profile_image', '') else None
-                        }
-            except Exception:
-                pass
-            
-            data.append({
-                'id': str(pqr_doc.get('_id', '')),
-                'type': pqr_doc.get('type', ''),
-                'basic_info': pqr_doc.get('basic_info', {}),
-                'joints': pqr_doc.get('joints', {}),
-                'joint_design_sketch': [f"/media/{file}" for file in pqr_doc.get('joint_design_sketch', [])],
-                'base_metals': pqr_doc.get('base_metals', {}),
-                'filler_metals': pqr_doc.get('filler_metals', {}),
-                'positions': pqr_doc.get('positions', {}),
-                'preheat': pqr_doc.get('preheat', {}),
-                'post_weld_heat_treatment': pqr_doc.get('post_weld_heat_treatment', {}),
-                'gas': pqr_doc.get('gas', {}),
-                'electrical_characteristics': pqr_doc.get('electrical_characteristics', {}),
-                'techniques': pqr_doc.get('techniques', {}),
-                'welding_parameters': pqr_doc.get('welding_parameters', {}),
-                'tensile_test': pqr_doc.get('tensile_test', {}),
-                'guided_bend_test': pqr_doc.get('guided_bend_test', {}),
-                'toughness_test': pqr_doc.get('toughness_test', {}),
-                'fillet_weld_test': pqr_doc.get('fillet_weld_test', {}),
-                'other_tests': pqr_doc.get('other_tests', {}),
-                'welder_id': str(pqr_doc.get('welder_id', '')),
-                'welder_info': welder_info,
-                'mechanical_testing_conducted_by': pqr_doc.get('mechanical_testing_conducted_by', ''),
-                'lab_test_no': pqr_doc.get('lab_test_no', ''),
-                'law_name': pqr_doc.get('law_name', ''),
-                'signatures': pqr_doc.get('signatures', {}),
-                'is_active': pqr_doc.get('is_active', True),
-                'created_at': pqr_doc.get('created_at').isoformat() if pqr_doc.get('created_at') else '',
-                'updated_at': pqr_doc.get('updated_at').isoformat() if pqr_doc.get('updated_at') else ''
-            })
+        # Use raw query to search (header fields and summary only)
+        pqrs = list(db.pqrs.find(query, list_projection()).sort('created_at', -1))
+        welders = welder_infos(db, [pqr_doc.get('welder_id') for pqr_doc in pqrs])
+        data = [
+            pqr_summary_row(pqr_doc, welders.get(pqr_doc.get('welder_id'), unknown_welder_info()))
+            for pqr_doc in pqrs
+        ]
         
         return JsonResponse({
             'status': 'success',
+            'view': VIEW_SUMMARY,
             'data': data,
             'total': len(data),
             'filters_applied': {
@@ -756,6 +671,7 @@ def pqr_search(request):
                 'lab_test_no': lab_test_no,
                 'type': type_filter,
                 'welder_id': welder_id,
+                **search_field_filters_applied(request),
                 'q': q
             }
         })
@@ -824,9 +740,17 @@ def pqr_stats(request):
 @any_authenticated_user
 def pqr_by_welder(request, welder_id):
     """
-    Get all PQRs for a specific welder
+    Get all PQRs for a specific welder (summary rows)
     """
     try:
+        try:
+            list_view(request)
+        except ValueError as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
+        
         # Validate ObjectId format
         try:
             welder_obj_id = ObjectId(welder_id)
@@ -851,22 +775,13 @@ def pqr_by_welder(request, welder_id):
         
         pqrs = pqrs_collection.find({
             'welder_id': welder_obj_id
-        })
+        }, list_projection()).sort('created_at', -1)
         
-        data = []
-        for pqr_doc in pqrs:
-            data.append({
-                'id': str(pqr_doc.get('_id', '')),
-                'type': pqr_doc.get('type', ''),
-                'lab_test_no': pqr_doc.get('lab_test_no', ''),
-                'law_name': pqr_doc.get('law_name', ''),
-                'mechanical_testing_conducted_by': pqr_doc.get('mechanical_testing_conducted_by', ''),
-                'is_active': pqr_doc.get('is_active', True),
-                'created_at': pqr_doc.get('created_at').isoformat() if pqr_doc.get('created_at') else ''
-            })
+        data = [pqr_summary_row(pqr_doc) for pqr_doc in pqrs]
         
         return JsonResponse({
             'status': 'success',
+            'view': VIEW_SUMMARY,
             'data': data,
             'total': len(data),
             'welder_info': {
@@ -10,6 +10,8 @@ from mongoengine.errors import DoesNotExist, ValidationError
 from .models import ProficiencyTest
 from authentication.decorators import any_authenticated_user
 from lims_backend.utilities.pagination import get_pagination_params, create_pagination_response, paginate_queryset
+from lims_backend.utilities.due_dates import DUE_SOON_DAYS, due_window, in_order, refresh_due_item
+from lims_backend.utilities.aggregation import facet_count, facet_group_counts
 
 
 def safe_datetime_format(dt_value):
@@ -174,6 +176,7 @@ def proficiency_test_list(request):
                 status=data.get('status', 'Scheduled')
             )
             proficiency_test.save()
+            refresh_due_item('proficiency_test', proficiency_test.id)
             
             return JsonResponse({
                 'status': 'success',
@@ -312,6 +315,7 @@ def proficiency_test_detail(request, test_id):
                 if update_doc:
                     test.update(**update_doc)
                     test.reload()
+                    refresh_due_item('proficiency_test', test.id)
                 
                 return JsonResponse({
                     'status': 'success',
@@ -347,6 +351,7 @@ def proficiency_test_detail(request, test_id):
         elif request.method == 'DELETE':
             # Soft delete
             test.update(is_active=False)
+            refresh_due_item('proficiency_test', test.id)
             
             return JsonResponse({
                 'status': 'success',
@@ -462,28 +467,36 @@ def proficiency_test_stats(request):
     GET: Returns statistics about proficiency tests
     """
     try:
-        # Get basic counts
-        total_tests = ProficiencyTest.objects(is_active=True).count()
-        scheduled_tests = ProficiencyTest.objects(is_active=True, status='Scheduled').count()
-        in_progress_tests = ProficiencyTest.objects(is_active=True, status='In Progress').count()
-        completed_tests = ProficiencyTest.objects(is_active=True, status='Completed').count()
-        cancelled_tests = ProficiencyTest.objects(is_active=True, status='Cancelled').count()
+        now = datetime.now()
+        open_status = {'$nin': ['Completed', 'Cancelled']}
         
-        # Get overdue tests
-        overdue_tests = ProficiencyTest.objects(
-            is_active=True,
-            due_date__lt=datetime.now(),
-            status__nin=['Completed', 'Cancelled']
-        ).count()
+        # All counts of active proficiency tests in one aggregation
+        facets = next(ProficiencyTest.objects(is_active=True).aggregate([
+            {
+                '$facet': {
+                    'total': [{'$count': 'count'}],
+                    'by_status': [{'$group': {'_id': '$status', 'count': {'$sum': 1}}}],
+                    'overdue': [
+                        {'$match': {'due_date': {'$lt': now}, 'status': open_status}},
+                        {'$count': 'count'}
+                    ],
+                    # Due in the next 30 days
+                    'due_soon': [
+                        {'$match': {'due_date': {'$gte': now, '$lte': now + timedelta(days=DUE_SOON_DAYS)}, 'status': open_status}},
+                        {'$count': 'count'}
+                    ]
+                }
+            }
+        ]), {})
         
-        # Get tests due in next 30 days
-        next_30_days = datetime.now() + timedelta(days=30)
-        due_soon_tests = ProficiencyTest.objects(
-            is_active=True,
-            due_date__lte=next_30_days,
-            due_date__gte=datetime.now(),
-            status__nin=['Completed', 'Cancelled']
-        ).count()
+        status_counts = facet_group_counts(facets, 'by_status')
+        total_tests = facet_count(facets, 'total')
+        scheduled_tests = status_counts.get('Scheduled', 0)
+        in_progress_tests = status_counts.get('In Progress', 0)
+        completed_tests = status_counts.get('Completed', 0)
+        cancelled_tests = status_counts.get('Cancelled', 0)
+        overdue_tests = facet_count(facets, 'overdue')
+        due_soon_tests = facet_count(facets, 'due_soon')
         
         return JsonResponse({
             'status': 'success',
@@ -518,15 +531,9 @@ def proficiency_test_overdue(request):
         # Get pagination parameters
         page, limit, offset = get_pagination_params(request)
         
-        # Get overdue tests
-        query = {
-            'is_active': True,
-            'due_date__lt': datetime.now(),
-            'status__nin': ['Completed', 'Cancelled']
-        }
-        
-        proficiency_tests_queryset = ProficiencyTest.objects(**query).order_by('due_date')
-        paginated_tests, total_records = paginate_queryset(proficiency_tests_queryset, page, limit)
+        # Get overdue tests from the due items (open tests only), then load the page
+        test_ids, total_records = due_window('proficiency_test', due_before=datetime.now(), offset=offset, limit=limit)
+        paginated_tests = in_order(ProficiencyTest.objects(id__in=test_ids), test_ids)
         
         data = []
         for test in paginated_tests:
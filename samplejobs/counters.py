@@ -0,0 +1,235 @@
+"""
+Job counters
+
+Every job keeps its workload counts in Job.counters so list pages read them
+straight off the job document instead of counting per row:
+
+    active_sample_lots  active sample lots of the job
+    requests            sample preparations with at least one lot of the job
+    specimens           distinct specimens those preparations assign to the job's lots
+    certificates        certificates issued for those preparations
+
+The counters are moved with $inc by the sample lot, sample preparation and
+certificate write paths. A preparation's share of the counters
+(request_job_counts) is computed before and after each write and the
+difference applied, so writes never recount a job. Concurrent edits of the
+same document can still make a counter drift; `python manage.py
+reconcile_job_counters` recomputes them from the source collections.
+
+Jobs created before the counters existed only get correct counters from the
+first full reconcile, which records completion in the data_migrations
+collection. Until then page_job_counters computes the counters of the jobs
+being displayed from the source collections.
+"""
+
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from bson import ObjectId
+from mongoengine import connection
+from pymongo import UpdateOne
+
+from lims_backend.utilities.soft_delete import active_filter
+
+
+COUNTERS_FIELD = 'counters'
+COUNTER_NAMES = ('active_sample_lots', 'requests', 'specimens', 'certificates')
+MIGRATION_ID = 'job_counters_reconcile'
+STATE_TTL_SECONDS = 60
+
+_reconcile_state = {}  # 'complete' -> (is complete, checked at)
+
+
+def _to_object_id(value):
+    """
+    Stored reference (ObjectId or string) as an ObjectId, or None if invalid
+    """
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(value)
+    except Exception:
+        return None
+
+
+def job_counters(job_doc):
+    """
+    Counters of a raw job document, missing counters as 0
+    """
+    counters = job_doc.get(COUNTERS_FIELD) or {}
+    return {name: counters.get(name, 0) for name in COUNTER_NAMES}
+
+
+def _lot_jobs(db, lot_ids):
+    """
+    {sample lot ObjectId: job ObjectId}
+    """
+    lot_ids = list({lot_id for lot_id in lot_ids if lot_id is not None})
+    if not lot_ids:
+        return {}
+    return {
+        lot_doc['_id']: lot_doc.get('job_id')
+        for lot_doc in db.sample_lots.find({'_id': {'$in': lot_ids}}, {'job_id': 1})
+    }
+
+
+def _prep_job_counts(prep_doc, lot_jobs, certificate_count):
+    """
+    Counter share of one preparation given its lot -> job mapping
+    """
+    specimens = defaultdict(set)
+    for entry in prep_doc.get('sample_lots') or []:
+        job_id = lot_jobs.get(_to_object_id(entry.get('sample_lot_id')))
+        if job_id is None:
+            continue
+        specimens[job_id].update(str(specimen_oid) for specimen_oid in entry.get('specimen_oids') or [])
+    return {
+        job_id: {'requests': 1, 'specimens': len(specimen_ids), 'certificates': certificate_count}
+        for job_id, specimen_ids in specimens.items()
+    }
+
+
+def request_job_counts(db, prep_doc):
+    """
+    Counter share of one sample preparation: {job ObjectId: {counter: amount}}
+    """
+    if not prep_doc:
+        return {}
+    lot_ids = [_to_object_id(entry.get('sample_lot_id')) for entry in prep_doc.get('sample_lots') or []]
+    certificate_count = db.complete_certificates.count_documents({'request_id': prep_doc['_id']}) if prep_doc.get('_id') else 0
+    return _prep_job_counts(prep_doc, _lot_jobs(db, lot_ids), certificate_count)
+
+
+def lot_request_job_counts(db, sample_lot_oid):
+    """
+    Summed counter share of every sample preparation that includes a sample lot
+    """
+    totals = {}
+    preps = db.sample_preparations.find({'sample_lots.sample_lot_id': sample_lot_oid}, {'sample_lots': 1})
+    for prep_doc in preps:
+        for job_id, counts in request_job_counts(db, prep_doc).items():
+            job_totals = totals.setdefault(job_id, defaultdict(int))
+            for name, amount in counts.items():
+                job_totals[name] += amount
+    return totals
+
+
+def request_job_ids(db, request_oid):
+    """
+    Jobs a sample preparation has lots of (empty on errors)
+    """
+    try:
+        prep_doc = db.sample_preparations.find_one({'_id': request_oid}, {'sample_lots': 1})
+        return list(request_job_counts(db, prep_doc)) if prep_doc else []
+    except Exception as e:
+        print(f"Error loading jobs of request {request_oid}: {e}")
+        return []
+
+
+def apply_job_count_changes(db, before=None, after=None):
+    """
+    $inc every job by the difference of two counter shares
+    Never raises, so callers can use it after a successful write.
+    """
+    try:
+        deltas = defaultdict(lambda: defaultdict(int))
+        for sign, shares in ((-1, before or {}), (1, after or {})):
+            for job_id, counts in shares.items():
+                for name, amount in counts.items():
+                    deltas[job_id][name] += sign * amount
+
+        operations = []
+        for job_id, counts in deltas.items():
+            increments = {f'{COUNTERS_FIELD}.{name}': amount for name, amount in counts.items() if amount}
+            if increments:
+                operations.append(UpdateOne({'_id': job_id}, {'$inc': increments}))
+        if operations:
+            db.jobs.bulk_write(operations, ordered=False)
+    except Exception as e:
+        print(f"Error updating job counters: {e}")
+
+
+def increment_job_counters(db, job_ids, **amounts):
+    """
+    $inc counters of the given jobs, e.g. increment_job_counters(db, [job_id], certificates=1)
+    Never raises.
+    """
+    apply_job_count_changes(db, after={job_id: amounts for job_id in job_ids if job_id is not None})
+
+
+def compute_job_counters(db, job_ids=None):
+    """
+    Counters recomputed from the source collections
+    job_ids: restrict to these jobs (default: every job)
+    Returns: {job ObjectId: counters}
+    """
+    lot_query = {'job_id': {'$in': list(job_ids)}} if job_ids is not None else {}
+    lot_jobs = {}
+    counters = defaultdict(lambda: dict.fromkeys(COUNTER_NAMES, 0))
+    active_lots = set(
+        lot_doc['_id'] for lot_doc in db.sample_lots.find({**lot_query, **active_filter('sample_lots')}, {'_id': 1})
+    )
+    for lot_doc in db.sample_lots.find(lot_query, {'job_id': 1}):
+        lot_jobs[lot_doc['_id']] = lot_doc.get('job_id')
+        if lot_doc['_id'] in active_lots:
+            counters[lot_doc.get('job_id')]['active_sample_lots'] += 1
+
+    prep_query = {'sample_lots.sample_lot_id': {'$in': list(lot_jobs)}} if job_ids is not None else {}
+    preps = list(db.sample_preparations.find(prep_query, {'sample_lots': 1}))
+    certificate_match = {'request_id': {'$in': [prep_doc['_id'] for prep_doc in preps]}} if job_ids is not None else {}
+    certificate_counts = {
+        group['_id']: group['count']
+        for group in db.complete_certificates.aggregate([
+            {'$match': certificate_match},
+            {'$group': {'_id': '$request_id', 'count': {'$sum': 1}}}
+        ])
+    }
+    for prep_doc in preps:
+        shares = _prep_job_counts(prep_doc, lot_jobs, certificate_counts.get(prep_doc['_id'], 0))
+        for job_id, counts in shares.items():
+            for name, amount in counts.items():
+                counters[job_id][name] += amount
+
+    job_query = {'_id': {'$in': list(job_ids)}} if job_ids is not None else {}
+    return {job_doc['_id']: dict(counters[job_doc['_id']]) for job_doc in db.jobs.find(job_query, {'_id': 1})}
+
+
+def is_counters_reconciled():
+    """
+    True once reconcile_job_counters has run over every job (cached per worker)
+    """
+    now = time.monotonic()
+    cached = _reconcile_state.get('complete')
+    if cached is not None and (cached[0] or now - cached[1] < STATE_TTL_SECONDS):
+        return cached[0]
+
+    try:
+        state = connection.get_db().data_migrations.find_one({'_id': MIGRATION_ID}, {'completed_at': 1})
+        complete = bool(state and state.get('completed_at'))
+    except Exception as e:
+        print(f"Error reading job counters reconcile state: {e}")
+        complete = False
+    _reconcile_state['complete'] = (complete, now)
+    return complete
+
+
+def mark_counters_reconciled(db, job_count):
+    db.data_migrations.update_one(
+        {'_id': MIGRATION_ID},
+        {'$set': {'completed_at': datetime.now(), 'job_count': job_count}},
+        upsert=True
+    )
+    _reconcile_state.pop('complete', None)
+
+
+def page_job_counters(db, job_docs):
+    """
+    Counters of a page of raw job documents: {job ObjectId: counters}
+    Read off the documents once the counters have been reconciled, computed
+    from the source collections (in batched queries) before that.
+    """
+    if is_counters_reconciled():
+        return {job_doc['_id']: job_counters(job_doc) for job_doc in job_docs}
+    computed = compute_job_counters(db, [job_doc['_id'] for job_doc in job_docs])
+    return {job_doc['_id']: computed.get(job_doc['_id']) or job_counters({}) for job_doc in job_docs}
@@ -0,0 +1,66 @@
+"""
+Recompute the maintained job counters (see samplejobs/counters.py)
+
+Writes keep the counters up to date with $inc; this command recomputes them
+from sample lots, sample preparations and certificates and corrects the jobs
+whose stored counters differ. Run it once after deploying the counters and
+whenever a drift is suspected; job lists read the stored counters only after
+a full run has recorded completion.
+
+Usage:
+    python manage.py reconcile_job_counters
+    python manage.py reconcile_job_counters --job <job ObjectId> --dry-run
+"""
+
+from bson import ObjectId
+from django.core.management.base import BaseCommand, CommandError
+from mongoengine import connection
+from pymongo import UpdateOne
+
+from samplejobs.counters import COUNTERS_FIELD, compute_job_counters, job_counters, mark_counters_reconciled
+
+
+class Command(BaseCommand):
+    help = 'Recompute the sample lot, request, specimen and certificate counters of jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--job', action='append', help='Job ObjectId (repeatable, default: every job)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Jobs per bulk write (default 500)')
+        parser.add_argument('--dry-run', action='store_true', help='Report drifted jobs without writing')
+
+    def handle(self, *args, **options):
+        db = connection.get_db()
+        job_ids = None
+        if options['job']:
+            try:
+                job_ids = [ObjectId(job_id) for job_id in options['job']]
+            except Exception:
+                raise CommandError('--job must be a valid ObjectId')
+
+        computed = compute_job_counters(db, job_ids)
+        stored = {
+            job_doc['_id']: job_counters(job_doc)
+            for job_doc in db.jobs.find({'_id': {'$in': list(computed)}}, {COUNTERS_FIELD: 1})
+        }
+
+        operations = []
+        corrected = 0
+        for job_id, counters in computed.items():
+            if stored.get(job_id) == counters:
+                continue
+            corrected += 1
+            if options['verbosity'] > 1 or options['dry_run']:
+                self.stdout.write(f'  {job_id}: {stored.get(job_id)} -> {counters}')
+            if options['dry_run']:
+                continue
+            operations.append(UpdateOne({'_id': job_id}, {'$set': {COUNTERS_FIELD: counters}}))
+            if len(operations) >= options['batch_size']:
+                db.jobs.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            db.jobs.bulk_write(operations, ordered=False)
+        if job_ids is None and not options['dry_run']:
+            mark_counters_reconciled(db, len(computed))
+
+        action = 'would be corrected' if options['dry_run'] else 'corrected'
+        self.stdout.write(self.style.SUCCESS(f'Checked {len(computed)} jobs, {corrected} {action}.'))
@@ -13,6 +13,8 @@ class Job(Document):
     receive_date = fields.DateTimeField(required=True)
     received_by = fields.StringField(max_length=100)
     remarks = fields.StringField()
+    # Maintained by samplejobs/counters.py: active_sample_lots, requests, specimens, certificates
+    counters = fields.DictField()
     job_created_at = fields.DateTimeField(default=datetime.now)
     created_at = fields.DateTimeField(default=datetime.now)
     updated_at = fields.DateTimeField(default=datetime.now)
@@ -11,6 +11,8 @@ from mongoengine.errors import DoesNotExist, ValidationError
 from mongoengine import connection
 from authentication.decorators import any_authenticated_user
 from lims_backend.utilities.pagination import get_pagination_params, create_pagination_response, paginate_queryset
+from certificates.snapshots import invalidate_certificate_snapshots
+from .counters import page_job_counters
 
 
 # ============= UTILITY FUNCTIONS =============
@@ -37,6 +39,9 @@ def cascade_delete_job_relations(job_object_id, db):
     )
     deletion_summary['sample_lots'] = sample_lots_result.modified_count
     
+    # Certificates built from this job show it, so their snapshots must be rebuilt
+    invalidate_certificate_snapshots('job_ids', [job_object_id])
+    
     # 2. Future: Add more related entities here as the system grows
     # For example: sample preparations, tests, certificates, etc.
     # sample_preparations_collection = db.sample_preparations
@@ -54,6 +59,50 @@ def cascade_delete_job_relations(job_object_id, db):
     return deletion_summary
 
 
+def job_document_numbers(db, job_ids, missing=None):
+    """
+    Request and certificate numbers of a page of jobs, in three queries
+    
+    Args:
+        missing: label listed for documents without a number (default: skip them)
+    
+    Returns:
+        dict: {job ObjectId: (request_numbers, certificate_numbers)}
+    """
+    numbers = {job_id: ([], []) for job_id in job_ids}
+    lot_jobs = {
+        lot_doc['_id']: lot_doc.get('job_id')
+        for lot_doc in db.sample_lots.find({'job_id': {'$in': list(job_ids)}}, {'job_id': 1})
+    }
+    if not lot_jobs:
+        return numbers
+    
+    prep_jobs = {}
+    preps = db.sample_preparations.find(
+        {'sample_lots.sample_lot_id': {'$in': list(lot_jobs)}},
+        {'request_no': 1, 'sample_lots.sample_lot_id': 1}
+    )
+    for prep_doc in preps:
+        prep_job_ids = {
+            lot_jobs[entry.get('sample_lot_id')]
+            for entry in prep_doc.get('sample_lots', [])
+            if entry.get('sample_lot_id') in lot_jobs
+        }
+        prep_jobs[prep_doc['_id']] = prep_job_ids
+        request_no = prep_doc.get('request_no', '') or missing
+        for job_id in prep_job_ids:
+            if request_no and request_no not in numbers[job_id][0]:
+                numbers[job_id][0].append(request_no)
+    
+    certificates = db.complete_certificates.find({'request_id': {'$in': list(prep_jobs)}}, {'certificate_id': 1, 'request_id': 1})
+    for cert_doc in certificates:
+        cert_id = cert_doc.get('certificate_id', '') or missing
+        for job_id in prep_jobs.get(cert_doc.get('request_id'), ()):
+            if cert_id and cert_id not in numbers[job_id][1]:
+                numbers[job_id][1].append(cert_id)
+    return numbers
+
+
 # ============= JOB CRUD ENDPOINTS =============
 
 @csrf_exempt
@@ -115,7 +164,8 @@ def job_list(request):
             total_records = jobs_collection.count_documents(query)
             
             # Get paginated jobs
-            jobs = jobs_collection.find(query).skip(offset).limit(limit).sort('created_at', -1)
+            jobs = list(jobs_collection.find(query).skip(offset).limit(limit).sort('created_at', -1))
+            counters_by_job = page_job_counters(db, jobs)
             data = []
             
             for job_doc in jobs:
@@ -134,16 +184,7 @@ def job_list(request):
                 except Exception:
                     pass
                 
-                # Get sample lots count for this job
-                sample_lots_count = 0
-                try:
-                    sample_lots_collection = db.sample_lots
-                    sample_lots_count = sample_lots_collection.count_documents({
-                        'job_id': job_doc.get('_id'),
-                        '$or': [{'is_active': True}, {'is_active': {'$exists': False}}]
-                    })
-                except Exception:
-                    sample_lots_count = 0
+                counters = counters_by_job[job_doc['_id']]
                 
                 # Only access fields that exist in our current model
                 data.append({
@@ -156,7 +197,10 @@ def job_list(request):
                     'receive_date': job_doc.get('receive_date').isoformat() if job_doc.get('receive_date') else '',
                     'received_by': job_doc.get('received_by', ''),
                     'remarks': job_doc.get('remarks', ''),
-                    'sample_lots_count': sample_lots_count,
+                    'sample_lots_count': counters['active_sample_lots'],
+                    'request_count': counters['requests'],
+                    'specimen_count': counters['specimens'],
+                    'certificate_count': counters['certificates'],
                     'job_created_at': job_doc.get('job_created_at').isoformat() if job_doc.get('job_created_at') else '',
                     'created_at': job_doc.get('created_at').isoformat() if job_doc.get('created_at') else '',
                     'updated_at': job_doc.get('updated_at').isoformat() if job_doc.get('updated_at') else ''
@@ -340,16 +384,7 @@ def job_detail(request, object_id):
             except Exception:
                 pass
             
-            # Get sample lots count for this job
-            sample_lots_count = 0
-            try:
-                sample_lots_collection = db.sample_lots
-                sample_lots_count = sample_lots_collection.count_documents({
-                    'job_id': job_doc.get('_id'),
-                    '$or': [{'is_active': True}, {'is_active': {'$exists': False}}]
-                })
-            except Exception:
-                sample_lots_count = 0
+            counters = page_job_counters(db, [job_doc])[job_doc['_id']]
             
             return JsonResponse({
                 'status': 'success',
@@ -363,7 +398,10 @@ def job_detail(request, object_id):
                     'receive_date': job_doc.get('receive_date').isoformat() if job_doc.get('receive_date') else '',
                     'received_by': job_doc.get('received_by', ''),
                     'remarks': job_doc.get('remarks', ''),
-                    'sample_lots_count': sample_lots_count,
+                    'sample_lots_count': counters['active_sample_lots'],
+                    'request_count': counters['requests'],
+                    'specimen_count': counters['specimens'],
+                    'certificate_count': counters['certificates'],
                     'job_created_at': job_doc.get('job_created_at').isoformat() if job_doc.get('job_created_at') else '',
                     'created_at': job_doc.get('created_at').isoformat() if job_doc.get('created_at') else '',
                     'updated_at': job_doc.get('updated_at').isoformat() if job_doc.get('updated_at') else ''
@@ -428,6 +466,8 @@ def job_detail(request, object_id):
                         'message': 'No changes made'
                     }, status=400)
                 
+                invalidate_certificate_snapshots('job_ids', [object_id])
+                
                 # Get updated job document
                 updated_job = jobs_collection.find_one({'_id': object_id})
                 
@@ -721,7 +761,9 @@ def job_search(request):
         total_records = jobs_collection.count_documents(query)
         
         # Get paginated jobs
-        jobs = jobs_collection.find(query).skip(offset).limit(limit).sort('created_at', -1)
+        jobs = list(jobs_collection.find(query).skip(offset).limit(limit).sort('created_at', -1))
+        job_numbers = job_document_numbers(db, [job_doc['_id'] for job_doc in jobs])
+        counters_by_job = page_job_counters(db, jobs)
         
         data = []
         for job_doc in jobs:
@@ -740,33 +782,8 @@ def job_search(request):
             except Exception:
                 pass
             
-            # Get sample lots count
-            sample_lots_count = sample_lots_collection.count_documents({'job_id': job_obj_id})
-            
-            # Get request numbers for this job
-            sample_lots = list(sample_lots_collection.find({'job_id': job_obj_id}))
-            sample_lot_ids = [lot.get('_id') for lot in sample_lots]
-            
-            request_numbers = []
-            certificate_numbers = []
-            
-            if sample_lot_ids:
-                sample_preparations = sample_preparations_collection.find({
-                    'sample_lots.sample_lot_id': {'$in': sample_lot_ids}
-                })
-                
-                for prep_doc in sample_preparations:
-                    prep_id = prep_doc.get('_id')
-                    req_no = prep_doc.get('request_no', '')
-                    if req_no and req_no not in request_numbers:
-                        request_numbers.append(req_no)
-                    
-                    # Get certificates
-                    certificates = certificates_collection.find({'request_id': prep_id})
-                    for cert_doc in certificates:
-                        cert_id = cert_doc.get('certificate_id', '')
-                        if cert_id and cert_id not in certificate_numbers:
-                            certificate_numbers.append(cert_id)
+            counters = counters_by_job[job_obj_id]
+            request_numbers, certificate_numbers = job_numbers[job_obj_id]
             
             data.append({
                 'id': str(job_doc.get('_id', '')),
@@ -778,10 +795,11 @@ def job_search(request):
                 'receive_date': job_doc.get('receive_date').isoformat() if job_doc.get('receive_date') else '',
                 'received_by': job_doc.get('received_by', ''),
                 'remarks': job_doc.get('remarks', ''),
-                'sample_lots_count': sample_lots_count,
+                'sample_lots_count': counters['active_sample_lots'],
                 'request_numbers': request_numbers,
                 'certificate_numbers': certificate_numbers,
                 'request_count': len(request_numbers),
+                'specimen_count': counters['specimens'],
                 'certificate_count': len(certificate_numbers),
                 'created_at': job_doc.get('created_at').isoformat() if job_doc.get('created_at') else '',
                 'updated_at': job_doc.get('updated_at').isoformat() if job_doc.get('updated_at') else ''
@@ -1367,7 +1385,9 @@ def job_with_certificates(request):
         total_jobs = jobs_collection.count_documents(query)
         
         # Get paginated jobs
-        jobs = jobs_collection.find(query).sort('created_at', -1).skip(offset).limit(limit)
+        jobs = list(jobs_collection.find(query).sort('created_at', -1).skip(offset).limit(limit))
+        job_numbers = job_document_numbers(db, [job_doc['_id'] for job_doc in jobs], missing='Unknown')
+        counters_by_job = page_job_counters(db, jobs)
         
         data = []
         
@@ -1387,35 +1407,8 @@ def job_with_certificates(request):
             except Exception:
                 pass
             
-            # Find all sample lots for this job
-            sample_lots = list(sample_lots_collection.find({'job_id': job_id}))
-            sample_lot_ids = [lot.get('_id') for lot in sample_lots]
-            
-            # Find all sample preparations that contain these sample lots
-            request_numbers = []
-            certificate_numbers = []
-            
-            if sample_lot_ids:
-                # Find sample preparations that have any of these sample lot IDs
-                sample_preparations = sample_preparations_collection.find({
-                    'sample_lots.sample_lot_id': {'$in': sample_lot_ids}
-                })
-                
-                for prep_doc in sample_preparations:
-                    prep_id = prep_doc.get('_id')
-                    request_no = prep_doc.get('request_no', 'Unknown')
-                    
-                    # Add request number if not already added
-                    if request_no not in request_numbers:
-                        request_numbers.append(request_no)
-                    
-                    # Find certificates for this sample preparation
-                    certificates = certificates_collection.find({'request_id': prep_id})
-                    
-                    for cert_doc in certificates:
-                        cert_id = cert_doc.get('certificate_id', 'Unknown')
-                        if cert_id not in certificate_numbers:
-                            certificate_numbers.append(cert_id)
+            counters = counters_by_job[job_id]
+            request_numbers, certificate_numbers = job_numbers[job_id]
             
             data.append({
                 'id': str(job_id),
@@ -1426,10 +1419,11 @@ def job_with_certificates(request):
                 'receive_date': job_doc.get('receive_date').isoformat() if job_doc.get('receive_date') else '',
                 'received_by': job_doc.get('received_by', ''),
                 'remarks': job_doc.get('remarks', ''),
-                'sample_lots_count': len(sample_lot_ids),
+                'sample_lots_count': counters['active_sample_lots'],
                 'request_numbers': request_numbers,
                 'certificate_numbers': certificate_numbers,
                 'request_count': len(request_numbers),
+                'specimen_count': counters['specimens'],
                 'certificate_count': len(certificate_numbers),
                 'created_at': job_doc.get('created_at').isoformat() if job_doc.get('created_at') else '',
                 'updated_at': job_doc.get('updated_at').isoformat() if job_doc.get('updated_at') else ''
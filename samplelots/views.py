@@ -12,7 +12,116 @@ from .models import SampleLot
 from samplejobs.models import Job
 from testmethods.models import TestMethod
 from authentication.decorators import any_authenticated_user
-# Pagination removed from sample lots as requested
+from certificates.snapshots import invalidate_certificate_snapshots
+from lims_backend.utilities.soft_delete import active_filter
+from lims_backend.utilities.pagination import get_pagination_params, create_pagination_response
+from lims_backend.utilities.dates import date_range_filter
+from samplejobs.counters import increment_job_counters, lot_request_job_counts, apply_job_count_changes
+
+
+# ============= UTILITY FUNCTIONS =============
+
+UNKNOWN_JOB_INFO = {
+    'job_id': 'Unknown',
+    'client_id': '',
+    'client_name': 'Unknown',
+    'project_name': 'Unknown',
+    'end_user': '',
+    'receive_date': '',
+    'received_by': '',
+    'remarks': '',
+    'job_created_at': '',
+    'created_at': '',
+    'updated_at': ''
+}
+
+
+def _to_object_id(value):
+    try:
+        return value if isinstance(value, ObjectId) else ObjectId(value)
+    except Exception:
+        return None
+
+
+def apply_sample_lot_filters(request, query):
+    """
+    Add the list filters to a sample lot query
+    - sample_type / material_type: exact match
+    - created_at_from / created_at_to: creation date range, YYYY-MM-DD inclusive
+    Raises: ValueError with a message suitable for a 400 response
+    """
+    for field in ('sample_type', 'material_type'):
+        value = request.GET.get(field, '').strip()
+        if value:
+            query[field] = value
+    created_at = date_range_filter(request, 'created_at')
+    if created_at:
+        query['created_at'] = created_at
+    return query
+
+
+def job_infos(db, job_ids):
+    """
+    Job info (with client name) of a page of sample lots, in two queries
+    Returns: {job ObjectId: job_info}
+    """
+    job_ids = list({job_id for job_id in map(_to_object_id, job_ids) if job_id})
+    jobs = list(db.jobs.find({'_id': {'$in': job_ids}})) if job_ids else []
+    client_ids = list({client_id for client_id in (_to_object_id(job_doc.get('client_id')) for job_doc in jobs) if client_id})
+    client_names = {
+        client_doc['_id']: client_doc.get('client_name', '')
+        for client_doc in db.clients.find({'_id': {'$in': client_ids}}, {'client_name': 1})
+    } if client_ids else {}
+    
+    infos = {}
+    for job_doc in jobs:
+        receive_date = job_doc.get('receive_date')
+        created_at = job_doc.get('created_at')
+        updated_at = job_doc.get('updated_at')
+        infos[job_doc['_id']] = {
+            'job_id': job_doc.get('job_id', ''),
+            'client_id': str(job_doc.get('client_id', '')),
+            'client_name': client_names.get(_to_object_id(job_doc.get('client_id')), 'Unknown Client'),
+            'project_name': job_doc.get('project_name', ''),
+            'end_user': job_doc.get('end_user'),
+            'receive_date': receive_date.isoformat() if receive_date else '',
+            'received_by': job_doc.get('received_by'),
+            'remarks': job_doc.get('remarks'),
+            'job_created_at': created_at.isoformat() if created_at else '',
+            'created_at': created_at.isoformat() if created_at else '',
+            'updated_at': updated_at.isoformat() if updated_at else ''
+        }
+    return infos
+
+
+def test_method_names(db, sample_lot_docs):
+    """
+    Test method names of a page of sample lots, in one query
+    Returns: {test method ObjectId: test_name}
+    """
+    test_method_ids = list({
+        test_method_id
+        for sample_lot_doc in sample_lot_docs
+        for test_method_id in map(_to_object_id, sample_lot_doc.get('test_method_oids') or [])
+        if test_method_id
+    })
+    if not test_method_ids:
+        return {}
+    return {
+        test_method_doc['_id']: test_method_doc.get('test_name', 'Unknown Test')
+        for test_method_doc in db.test_methods.find({'_id': {'$in': test_method_ids}}, {'test_name': 1})
+    }
+
+
+def sample_lot_test_methods(sample_lot_doc, names):
+    """
+    [{'id', 'test_name'}] of a sample lot's test methods that still exist
+    """
+    test_methods = []
+    for test_method_id in map(_to_object_id, sample_lot_doc.get('test_method_oids') or []):
+        if test_method_id in names:
+            test_methods.append({'id': str(test_method_id), 'test_name': names[test_method_id]})
+    return test_methods
 
 
 # ============= SAMPLE LOT CRUD ENDPOINTS =============
@@ -22,93 +131,50 @@ from authentication.decorators import any_authenticated_user
 @any_authenticated_user
 def sample_lot_list(request):
     """
-    List all sample lots or create a new sample lot
-    GET: Returns list of all sample lots with job and test method information
+    List sample lots or create a new sample lot
+    GET: Returns a page of sample lots (newest first) with job and test method information
+         Optional filters: job_id, sample_type, material_type, created_at_from / created_at_to (YYYY-MM-DD)
     POST: Creates a new sample lot
     """
     if request.method == 'GET':
         try:
-            # Use raw query to avoid field validation issues
             db = connection.get_db()
             sample_lots_collection = db.sample_lots
+            page, limit, offset = get_pagination_params(request)
+            
+            # Active sample lots (legacy documents without is_active included until backfilled)
+            query = active_filter('sample_lots')
+            job_id = request.GET.get('job_id', '').strip()
+            if job_id:
+                job_oid = _to_object_id(job_id)
+                if not job_oid:
+                    return JsonResponse({
+                        'status': 'error',
+                        'message': 'Invalid job_id format'
+                    }, status=400)
+                query['job_id'] = job_oid
+            try:
+                apply_sample_lot_filters(request, query)
+            except ValueError as e:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': str(e)
+                }, status=400)
             
-            # Query to find active sample lots or documents without is_active field (legacy data)
-            query = {'$or': [{'is_active': True}, {'is_active': {'$exists': False}}]}
+            total_records = sample_lots_collection.count_documents(query)
+            sample_lots = list(sample_lots_collection.find(query).sort('created_at', -1).skip(offset).limit(limit))
             
-            # Get all sample lots (no pagination)
-            sample_lots = sample_lots_collection.find(query).sort('created_at', -1)
-            data = []
+            # Jobs, clients and test methods of the whole page in three queries
+            jobs_by_id = job_infos(db, [sample_lot_doc.get('job_id') for sample_lot_doc in sample_lots])
+            names = test_method_names(db, sample_lots)
             
+            data = []
             for sample_lot_doc in sample_lots:
-                # Get job information
-                job_info = {}
-                try:
-                    job = Job.objects.get(id=ObjectId(sample_lot_doc.get('job_id')))
-                    
-                    # Get client name from client_id
-                    client_name = ''
-                    try:
-                        from clients.models import Client
-                        client = Client.objects.get(id=ObjectId(job.client_id))
-                        client_name = client.client_name
-                    except (DoesNotExist, Exception):
-                        client_name = 'Unknown Client'
-                    
-                    job_info = {
-                        'job_id': job.job_id,
-                        'client_id': str(job.client_id),
-                        'client_name': client_name,
-                        'project_name': job.project_name,
-                        'end_user': job.end_user,
-                        'receive_date': job.receive_date.isoformat() if job.receive_date else '',
-                        'received_by': job.received_by,
-                        'remarks': job.remarks,
-                        'job_created_at': job.created_at.isoformat() if job.created_at else '',
-                        'created_at': job.created_at.isoformat() if job.created_at else '',
-                        'updated_at': job.updated_at.isoformat() if job.updated_at else ''
-                    }
-                except (DoesNotExist, Exception):
-                    job_info = {
-                        'job_id': 'Unknown', 
-                        'client_id': '',
-                        'client_name': 'Unknown',
-                        'project_name': 'Unknown',
-                        'end_user': '',
-                        'receive_date': '',
-                        'received_by': '',
-                        'remarks': '',
-                        'job_created_at': '',
-                        'created_at': '',
-                        'updated_at': ''
-                    }
-                
-                # Get test methods information (names and count)
-                test_method_oids = sample_lot_doc.get('test_method_oids', [])
-                test_methods_count = len(test_method_oids) if test_method_oids else 0
-                test_method_names = []
-                
-                # Fetch test method names from test_methods collection
-                if test_method_oids:
-                    test_methods_collection = db.test_methods
-                    for test_method_oid in test_method_oids:
-                        try:
-                            test_method_doc = test_methods_collection.find_one(
-                                {'_id': ObjectId(test_method_oid)}, 
-                                {'test_name': 1}
-                            )
-                            if test_method_doc:
-                                test_method_names.append({
-                                    'id': str(test_method_doc.get('_id')),
-                                    'test_name': test_method_doc.get('test_name', 'Unknown Test')
-                                })
-                        except Exception:
-                            # Skip invalid test method references
-                            continue
-                
+                test_methods = sample_lot_test_methods(sample_lot_doc, names)
                 data.append({
                     'id': str(sample_lot_doc.get('_id', '')),
                     'job_id': str(sample_lot_doc.get('job_id', '')),
-                    'job_info': job_info,
+                    'job_info': jobs_by_id.get(_to_object_id(sample_lot_doc.get('job_id')), UNKNOWN_JOB_INFO),
                     'item_no': sample_lot_doc.get('item_no', ''),
                     'sample_type': sample_lot_doc.get('sample_type', ''),
                     'material_type': sample_lot_doc.get('material_type', ''),
@@ -117,16 +183,18 @@ def sample_lot_list(request):
                     'description': sample_lot_doc.get('description', ''),
                     'mtc_no': sample_lot_doc.get('mtc_no', ''),
                     'storage_location': sample_lot_doc.get('storage_location', ''),
-                    'test_methods_count': test_methods_count,
-                    'test_methods': test_method_names,
+                    'test_methods_count': len(sample_lot_doc.get('test_method_oids') or []),
+                    'test_methods': test_methods,
                     'created_at': sample_lot_doc.get('created_at').isoformat() if sample_lot_doc.get('created_at') else '',
                     'updated_at': sample_lot_doc.get('updated_at').isoformat() if sample_lot_doc.get('updated_at') else ''
                 })
             
+            response_data = create_pagination_response(data, total_records, page, limit)
+            
             return JsonResponse({
                 'status': 'success',
-                'data': data,
-                'total': len(data)
+                **response_data,
+                'total': total_records
             })
         except Exception as e:
             return JsonResponse({
@@ -171,7 +239,7 @@ def sample_lot_list(request):
                         # Check if test method exists using raw query
                         test_method_doc = test_methods_collection.find_one({
                             '_id': test_method_object_id,
-                            '$or': [{'is_active': True}, {'is_active': {'$exists': False}}]
+                            **active_filter('test_methods')
                         })
                         
                         if not test_method_doc:
@@ -201,6 +269,7 @@ def sample_lot_list(request):
                 test_method_oids=test_method_oids
             )
             sample_lot.save()
+            increment_job_counters(connection.get_db(), [sample_lot.job_id], active_sample_lots=1)
             
             return JsonResponse({
                 'status': 'success',
@@ -247,7 +316,7 @@ def sample_lot_detail(request, sample_lot_id):
         
         # Use raw query to find sample lot by ObjectId (legacy data support)
         try:
-            query = {'_id': ObjectId(sample_lot_id), '$or': [{'is_active': True}, {'is_active': {'$exists': False}}]}
+            query = {'_id': ObjectId(sample_lot_id), **active_filter('sample_lots')}
             sample_lot_doc = sample_lots_collection.find_one(query)
         except Exception:
             return JsonResponse({
@@ -352,7 +421,7 @@ def sample_lot_detail(request, sample_lot_id):
                             # Check if test method exists using raw query
                             test_method_doc = test_methods_collection.find_one({
                                 '_id': test_method_object_id,
-                                '$or': [{'is_active': True}, {'is_active': {'$exists': False}}]
+                                **active_filter('test_methods')
                             })
                             
                             if not test_method_doc:
@@ -388,9 +457,14 @@ def sample_lot_detail(request, sample_lot_id):
                 # Add updated timestamp
                 update_doc['updated_at'] = datetime.now()
                 
+                # Moving the lot to another job moves its share of the job counters
+                job_changed = 'job_id' in update_doc and update_doc['job_id'] != sample_lot_doc.get('job_id')
+                if job_changed:
+                    counts_before = lot_request_job_counts(db, sample_lot_doc['_id'])
+                
                 # Update the document (legacy data support)
                 update_result = sample_lots_collection.update_one(
-                    {'_id': ObjectId(sample_lot_id), '$or': [{'is_active': True}, {'is_active': {'$exists': False}}]},
+                    {'_id': ObjectId(sample_lot_id), **active_filter('sample_lots')},
                     {'$set': update_doc}
                 )
                 
@@ -400,6 +474,13 @@ def sample_lot_detail(request, sample_lot_id):
                         'message': 'Sample lot not found or no changes made'
                     }, status=404)
                 
+                invalidate_certificate_snapshots('sample_lot_ids', [sample_lot_id])
+                
+                if job_changed:
+                    increment_job_counters(db, [sample_lot_doc.get('job_id')], active_sample_lots=-1)
+                    increment_job_counters(db, [update_doc['job_id']], active_sample_lots=1)
+                    apply_job_count_changes(db, counts_before, lot_request_job_counts(db, sample_lot_doc['_id']))
+                
                 # Get updated sample lot document
                 updated_sample_lot = sample_lots_collection.find_one({'_id': ObjectId(sample_lot_id)})
                 
@@ -428,7 +509,7 @@ def sample_lot_detail(request, sample_lot_id):
         elif request.method == 'DELETE':
             # Soft delete by setting is_active to False (legacy data support)
             result = sample_lots_collection.update_one(
-                {'_id': ObjectId(sample_lot_id), '$or': [{'is_active': True}, {'is_active': {'$exists': False}}]},
+                {'_id': ObjectId(sample_lot_id), **active_filter('sample_lots')},
                 {'$set': {'is_active': False, 'updated_at': datetime.now()}}
             )
             
@@ -438,6 +519,8 @@ def sample_lot_detail(request, sample_lot_id):
                     'message': 'Sample lot not found'
                 }, status=404)
             
+            increment_job_counters(db, [sample_lot_doc.get('job_id')], active_sample_lots=-1)
+            
             return JsonResponse({
                 'status': 'success',
                 'message': 'Sample lot deleted successfully'
@@ -470,7 +553,7 @@ def sample_lot_search(request):
         item_no = request.GET.get('item_no', '')
         
         # Build query for raw MongoDB (legacy data support)
-        query = {'$or': [{'is_active': True}, {'is_active': {'$exists': False}}]}
+        query = active_filter('sample_lots')
         if job_id:
             try:
                 query['job_id'] = ObjectId(job_id)
@@ -547,7 +630,7 @@ def sample_lot_stats(request):
         db = connection.get_db()
         sample_lots_collection = db.sample_lots
         
-        base_query = {'$or': [{'is_active': True}, {'is_active': {'$exists': False}}]}
+        base_query = active_filter('sample_lots')
         total_sample_lots = sample_lots_collection.count_documents(base_query)
         
         # Count by sample type (legacy data support)
@@ -604,7 +687,7 @@ def sample_lot_stats_current_month(request):
             next_month_start = datetime(now.year, now.month + 1, 1)
         
         # Base query for active sample lots
-        base_query = {'$or': [{'is_active': True}, {'is_active': {'$exists': False}}]}
+        base_query = active_filter('sample_lots')
         
         # Query for sample lots created in current month
         current_month_query = {
@@ -755,59 +838,38 @@ def sample_lot_stats_current_month(request):
 @any_authenticated_user
 def sample_lot_by_job(request, job_id):
     """
-    Get all sample lots for a specific job
+    Get the sample lots of a specific job (paginated)
+    Optional filters: sample_type, material_type, created_at_from / created_at_to (YYYY-MM-DD)
     """
     try:
-        # Verify job exists
-        try:
-            job = Job.objects.get(id=ObjectId(job_id))
-        except (DoesNotExist, Exception):
+        db = connection.get_db()
+        job_oid = _to_object_id(job_id)
+        job_info = job_infos(db, [job_oid]).get(job_oid) if job_oid else None
+        if not job_info:
             return JsonResponse({
                 'status': 'error',
                 'message': 'Job not found'
             }, status=404)
         
-        # Get client name from client_id
-        client_name = ''
-        try:
-            from clients.models import Client
-            client = Client.objects.get(id=ObjectId(job.client_id))
-            client_name = client.client_name
-        except (DoesNotExist, Exception):
-            client_name = 'Unknown Client'
+        page, limit, offset = get_pagination_params(request)
         
         # Use raw query to find sample lots by job (legacy data support)
-        db = connection.get_db()
         sample_lots_collection = db.sample_lots
+        query = {'job_id': job_oid, **active_filter('sample_lots')}
+        try:
+            apply_sample_lot_filters(request, query)
+        except ValueError as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
         
-        query = {'job_id': job.id, '$or': [{'is_active': True}, {'is_active': {'$exists': False}}]}
-        sample_lots = sample_lots_collection.find(query)
+        total_records = sample_lots_collection.count_documents(query)
+        sample_lots = list(sample_lots_collection.find(query).sort('created_at', -1).skip(offset).limit(limit))
+        names = test_method_names(db, sample_lots)
         
         data = []
         for sample_lot_doc in sample_lots:
-            # Get test methods count and names
-            test_method_oids = sample_lot_doc.get('test_method_oids', [])
-            test_methods_count = len(test_method_oids) if test_method_oids else 0
-            test_method_names = []
-            
-            # Fetch test method names from test_methods collection
-            if test_method_oids:
-                test_methods_collection = db.test_methods
-                for test_method_oid in test_method_oids:
-                    try:
-                        test_method_doc = test_methods_collection.find_one(
-                            {'_id': ObjectId(test_method_oid)}, 
-                            {'test_name': 1}
-                        )
-                        if test_method_doc:
-                            test_method_names.append({
-                                'id': str(test_method_doc.get('_id')),
-                                'test_name': test_method_doc.get('test_name', 'Unknown Test')
-                            })
-                    except Exception:
-                        # Skip invalid test method references
-                        continue
-            
             data.append({
                 'id': str(sample_lot_doc.get('_id', '')),
                 'job_id': str(sample_lot_doc.get('job_id', '')),
@@ -819,30 +881,20 @@ def sample_lot_by_job(request, job_id):
                 'description': sample_lot_doc.get('description', ''),
                 'mtc_no': sample_lot_doc.get('mtc_no', ''),
                 'storage_location': sample_lot_doc.get('storage_location', ''),
-                'test_methods_count': test_methods_count,
-                'test_methods': test_method_names,
+                'test_methods_count': len(sample_lot_doc.get('test_method_oids') or []),
+                'test_methods': sample_lot_test_methods(sample_lot_doc, names),
                 'is_active': sample_lot_doc.get('is_active', True),
                 'created_at': sample_lot_doc.get('created_at').isoformat() if sample_lot_doc.get('created_at') else '',
                 'updated_at': sample_lot_doc.get('updated_at').isoformat() if sample_lot_doc.get('updated_at') else ''
             })
         
+        response_data = create_pagination_response(data, total_records, page, limit)
+        
         return JsonResponse({
             'status': 'success',
-            'data': data,
-            'total': len(data),
-            'job_info': {
-                'job_id': job.job_id,
-                'client_id': str(job.client_id),
-                'client_name': client_name,
-                'project_name': job.project_name,
-                'end_user': job.end_user,
-                'receive_date': job.receive_date.isoformat() if job.receive_date else '',
-                'received_by': job.received_by,
-                'remarks': job.remarks,
-                'job_created_at': job.created_at.isoformat() if job.created_at else '',
-                'created_at': job.created_at.isoformat() if job.created_at else '',
-                'updated_at': job.updated_at.isoformat() if job.updated_at else ''
-            }
+            **response_data,
+            'total': total_records,
+            'job_info': job_info
         })
         
     except Exception as e:
@@ -2,12 +2,15 @@ from mongoengine import Document, fields, EmbeddedDocument
 from datetime import datetime
 from bson import ObjectId
 
+from lims_backend.utilities.dates import parse_date_string
+
 
 class SampleLotInfo(EmbeddedDocument):
     """
     Embedded document for sample lot information within sample preparation
     """
     planned_test_date = fields.StringField(max_length=20)  # Date as string (YYYY-MM-DD format) or null
+    planned_test_date_dt = fields.DateTimeField()  # Parsed shadow of planned_test_date
     dimension_spec = fields.StringField(max_length=200)  # Dimension specifications or null
     request_by = fields.StringField(max_length=100)  # Can be null
     remarks = fields.StringField()  # Can be null
@@ -28,10 +31,12 @@ class SamplePreparation(Document):
     
     meta = {
         'collection': 'sample_preparations',
-        'indexes': ['request_no', 'created_at']
+        'indexes': ['request_no', 'created_at', 'sample_lots.planned_test_date_dt']
     }
     
     def save(self, *args, **kwargs):
+        for sample_lot in self.sample_lots:
+            sample_lot.planned_test_date_dt = parse_date_string(sample_lot.planned_test_date)
         self.updated_at = datetime.now()
         return super().save(*args, **kwargs)
         
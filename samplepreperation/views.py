@@ -14,6 +14,9 @@ from samplejobs.models import Job
 from testmethods.models import TestMethod
 from specimens.models import Specimen
 from authentication.decorators import any_authenticated_user
+from certificates.snapshots import invalidate_certificate_snapshots
+from samplejobs.counters import request_job_counts, apply_job_count_changes
+from lims_backend.utilities.dates import parse_date_string, apply_date_range_filters
 
 
 # ============= SAMPLE PREPARATION CRUD ENDPOINTS =============
@@ -33,7 +36,16 @@ def sample_preparation_list(request):
             db = connection.get_db()
             sample_preparations_collection = db.sample_preparations
             
-            sample_preparations = sample_preparations_collection.find({})
+            query = {}
+            try:
+                apply_date_range_filters(request, query, ('planned_test_date',), list_field='sample_lots')
+            except ValueError as e:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': str(e)
+                }, status=400)
+            
+            sample_preparations = sample_preparations_collection.find(query)
             data = []
             
             for prep_doc in sample_preparations:
@@ -318,6 +330,8 @@ def sample_preparation_list(request):
                 sample_lots=validated_sample_lots
             )
             sample_preparation.save()
+            db = connection.get_db()
+            apply_job_count_changes(db, after=request_job_counts(db, sample_preparation.to_mongo()))
             
             return JsonResponse({
                 'status': 'success',
@@ -562,7 +576,10 @@ def sample_preparation_detail(request, object_id):
                                     'message': f'Required field "{field}" missing in sample_lots[{i}]'
                                 }, status=400)
                         
-                        validated_sample_lots.append(sample_lot_data)
+                        validated_sample_lots.append({
+                            **sample_lot_data,
+                            'planned_test_date_dt': parse_date_string(sample_lot_data.get('planned_test_date'))
+                        })
                     
                     update_doc['sample_lots'] = validated_sample_lots
                 
@@ -586,8 +603,12 @@ def sample_preparation_detail(request, object_id):
                         'message': 'No changes made'
                     }, status=400)
                 
+                invalidate_certificate_snapshots('sample_preparation_ids', [obj_id])
+                
                 # Get updated document
                 updated_prep = sample_preparations_collection.find_one({'_id': obj_id})
+                if 'sample_lots' in update_doc:
+                    apply_job_count_changes(db, request_job_counts(db, prep_doc), request_job_counts(db, updated_prep))
                 
                 return JsonResponse({
                     'status': 'success',
@@ -607,6 +628,7 @@ def sample_preparation_detail(request, object_id):
                 }, status=400)
         
         elif request.method == 'DELETE':
+            counts_before = request_job_counts(db, prep_doc)
             result = sample_preparations_collection.delete_one({'_id': obj_id})
             if result.deleted_count == 0:
                 return JsonResponse({
@@ -614,6 +636,9 @@ def sample_preparation_detail(request, object_id):
                     'message': 'Sample preparation not found'
                 }, status=404)
             
+            invalidate_certificate_snapshots('sample_preparation_ids', [obj_id])
+            apply_job_count_changes(db, before=counts_before)
+            
             return JsonResponse({
                 'status': 'success',
                 'message': 'Sample preparation deleted successfully',
@@ -640,6 +665,7 @@ def sample_preparation_search(request):
     Query parameters:
     - request_no: Search by request number (partial match)
     - request_by: Search by requester name (partial match)
+    - planned_test_date_from / planned_test_date_to: Planned test date range of any sample lot, YYYY-MM-DD inclusive
     - q: Global search across all text fields (request_no, request_by, item_no, sample_type, material_type, job_id, client_name, project_name, test_name, specimen_id)
     """
     try:
@@ -654,6 +680,13 @@ def sample_preparation_search(request):
             query['request_no'] = {'$regex': request_no_query, '$options': 'i'}
         if request_by_query:
             query['sample_lots.request_by'] = {'$regex': request_by_query, '$options': 'i'}
+        try:
+            apply_date_range_filters(request, query, ('planned_test_date',), list_field='sample_lots')
+        except ValueError as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
         
         # Use raw query to search
         db = connection.get_db()
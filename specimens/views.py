@@ -10,7 +10,11 @@ from mongoengine.errors import DoesNotExist, ValidationError, NotUniqueError
 
 from .models import Specimen
 from authentication.decorators import any_authenticated_user
+from mediastore.storage import release_prefix
+from certificates.snapshots import invalidate_certificate_snapshots
+from lims_backend.utilities.pagination import get_pagination_params
 import os
+import re
 import shutil
 from django.conf import settings
 
@@ -29,6 +33,9 @@ def delete_specimen_media_folder(specimen_oid):
         # Convert ObjectId to string
         specimen_id_str = str(specimen_oid)
         
+        # Release images held in the content-addressed store
+        release_prefix(f"certificate_images/{specimen_id_str}/")
+        
         # Create the media folder path
         media_folder_path = os.path.join(settings.MEDIA_ROOT, 'certificate_images', specimen_id_str)
         
@@ -44,6 +51,56 @@ def delete_specimen_media_folder(specimen_oid):
         return False, f"Error deleting media folder: {str(e)}"
 
 
+def specimen_prefix_condition(prefix):
+    """
+    Anchored, case-sensitive prefix match on specimen_id, answered from its unique index
+    """
+    return {'$regex': '^' + re.escape(prefix)}
+
+
+def specimen_page(request, query):
+    """
+    One cursor page of specimens ordered by specimen_id (the unique index)
+    Query parameters:
+    - limit: page size (default 10, max 100)
+    - cursor: next_cursor of the previous page
+    - fields: 'compact' returns only id and specimen_id (for pickers)
+    Returns: (rows, pagination dict)
+    """
+    _, limit, _ = get_pagination_params(request)
+    cursor = request.GET.get('cursor', '')
+    compact = request.GET.get('fields', '') == 'compact'
+    
+    page_query = dict(query)
+    if cursor:
+        page_query['specimen_id'] = {**query.get('specimen_id', {}), '$gt': cursor}
+    
+    projection = {'specimen_id': 1} if compact else None
+    # One extra document tells whether there is a next page
+    specimens_collection = connection.get_db().specimens
+    specimens = list(specimens_collection.find(page_query, projection).sort('specimen_id', 1).limit(limit + 1))
+    has_next = len(specimens) > limit
+    specimens = specimens[:limit]
+    
+    rows = []
+    for specimen_doc in specimens:
+        row = {
+            'id': str(specimen_doc.get('_id', '')),
+            'specimen_id': specimen_doc.get('specimen_id', '')
+        }
+        if not compact:
+            row['created_at'] = specimen_doc.get('created_at').isoformat() if specimen_doc.get('created_at') else ''
+            row['updated_at'] = specimen_doc.get('updated_at').isoformat() if specimen_doc.get('updated_at') else ''
+        rows.append(row)
+    
+    return rows, {
+        'limit': limit,
+        'cursor': cursor,
+        'next_cursor': rows[-1]['specimen_id'] if has_next else None,
+        'has_next': has_next
+    }
+
+
 # ============= SPECIMEN CRUD ENDPOINTS =============
 
 @csrf_exempt
@@ -51,31 +108,28 @@ def delete_specimen_media_folder(specimen_oid):
 @any_authenticated_user
 def specimen_list(request):
     """
-    List all specimens or create a new specimen
-    GET: Returns list of all specimens
+    List specimens or create a new specimen
+    GET: Returns a cursor page of specimens ordered by specimen_id
+         Optional: prefix (specimen_id prefix, case-sensitive), limit, cursor, fields=compact
     POST: Creates a new specimen (specimen_id must be unique)
     """
     if request.method == 'GET':
         try:
-            # Use raw query to get all specimens
-            db = connection.get_db()
-            specimens_collection = db.specimens
-            
-            specimens = specimens_collection.find({})
-            data = []
+            query = {}
+            prefix = request.GET.get('prefix', '')
+            if prefix:
+                query['specimen_id'] = specimen_prefix_condition(prefix)
             
-            for specimen_doc in specimens:
-                data.append({
-                    'id': str(specimen_doc.get('_id', '')),
-                    'specimen_id': specimen_doc.get('specimen_id', ''),
-                    'created_at': specimen_doc.get('created_at').isoformat() if specimen_doc.get('created_at') else '',
-                    'updated_at': specimen_doc.get('updated_at').isoformat() if specimen_doc.get('updated_at') else ''
-                })
+            data, pagination = specimen_page(request, query)
+            # Total of the filter; the unfiltered total comes from collection metadata
+            specimens_collection = connection.get_db().specimens
+            total = specimens_collection.count_documents(query) if query else specimens_collection.estimated_document_count()
             
             return JsonResponse({
                 'status': 'success',
                 'data': data,
-                'total': len(data)
+                'total': total,
+                'pagination': pagination
             })
         except Exception as e:
             return JsonResponse({
@@ -247,6 +301,8 @@ def specimen_detail(request, object_id):
                         'message': 'No changes made'
                     }, status=400)
                 
+                invalidate_certificate_snapshots('specimen_ids', [obj_id])
+                
                 # Get updated specimen document
                 updated_specimen = specimens_collection.find_one({'_id': obj_id})
                 
@@ -279,6 +335,8 @@ def specimen_detail(request, object_id):
                     'message': 'Specimen not found'
                 }, status=404)
             
+            invalidate_certificate_snapshots('specimen_ids', [obj_id])
+            
             # Prepare response data
             response_data = {
                 'id': str(obj_id),
@@ -308,39 +366,36 @@ def specimen_detail(request, object_id):
 @any_authenticated_user
 def specimen_search(request):
     """
-    Search specimens by specimen_id (partial match)
+    Search specimens by specimen_id (cursor paginated, see specimen_page)
     Query parameters:
-    - specimen_id: Search by specimen_id (case-insensitive partial match)
+    - specimen_id: case-insensitive partial match of specimen_id (scans the collection)
+    - match: 'prefix' for a case-sensitive specimen_id prefix match instead (index-backed)
+    - limit, cursor, fields=compact
     """
     try:
         # Get query parameters
         specimen_id_query = request.GET.get('specimen_id', '')
+        match = request.GET.get('match', 'contains')
         
-        # Build query for raw MongoDB
         query = {}
         if specimen_id_query:
-            query['specimen_id'] = {'$regex': specimen_id_query, '$options': 'i'}
+            if match == 'prefix':
+                query['specimen_id'] = specimen_prefix_condition(specimen_id_query)
+            else:
+                query['specimen_id'] = {'$regex': re.escape(specimen_id_query), '$options': 'i'}
         
-        # Use raw query to search
-        db = connection.get_db()
-        specimens_collection = db.specimens
+        specimens_collection = connection.get_db().specimens
         
-        specimens = specimens_collection.find(query)
-        
-        data = []
-        for specimen_doc in specimens:
-            data.append({
-                'id': str(specimen_doc.get('_id', '')),
-                'specimen_id': specimen_doc.get('specimen_id', ''),
-                'created_at': specimen_doc.get('created_at').isoformat() if specimen_doc.get('created_at') else ''
-            })
+        data, pagination = specimen_page(request, query)
         
         return JsonResponse({
             'status': 'success',
             'data': data,
-            'total': len(data),
+            'total': specimens_collection.count_documents(query) if query else specimens_collection.estimated_document_count(),
+            'pagination': pagination,
             'filters_applied': {
-                'specimen_id': specimen_id_query
+                'specimen_id': specimen_id_query,
+                'match': match
             }
         })
         
@@ -406,8 +461,10 @@ def bulk_delete_specimens(request):
         
         # Delete media folders for each specimen
         media_cleanup_results = []
+        deleted_specimen_oids = []
         for specimen_doc in specimens_to_delete:
             specimen_oid = specimen_doc.get('_id')
+            deleted_specimen_oids.append(specimen_oid)
             media_success, media_message = delete_specimen_media_folder(specimen_oid)
             media_cleanup_results.append({
                 'specimen_id': specimen_doc.get('specimen_id', ''),
@@ -420,6 +477,7 @@ def bulk_delete_specimens(request):
         result = specimens_collection.delete_many(
             {'specimen_id': {'$in': specimen_ids}}
         )
+        invalidate_certificate_snapshots('specimen_ids', deleted_specimen_oids)
         
         return JsonResponse({
             'status': 'success',
@@ -0,0 +1,85 @@
+"""
+Rebuild the flattened testing_report_results collection (see
+testingreports/results_index.py) from the testing reports
+
+Run once after deploying (before `sync_indexes --apply` builds the unique
+report_index), and after importing welders so results recorded before their
+welder existed get resolved to its ObjectId. A full run records completion;
+welder lookups read the rows only after that.
+
+Usage:
+    python manage.py rebuild_testing_report_results
+    python manage.py rebuild_testing_report_results --report 64f0c2...
+"""
+
+from bson import ObjectId
+from django.core.management.base import BaseCommand, CommandError
+from mongoengine import connection
+from pymongo import DeleteOne
+
+from testingreports.models import TestingReportResult
+from testingreports.results_index import build_result_rows, mark_results_rebuild_complete, result_row_operations
+
+
+class Command(BaseCommand):
+    help = 'Rewrite the flattened testing report results from the testing reports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--report', default='', help='Only rebuild the rows of one testing report (ObjectId)')
+        parser.add_argument('--batch-size', type=int, default=200, help='Reports per bulk write (default 200)')
+
+    def handle(self, *args, **options):
+        db = connection.get_db()
+        collection = TestingReportResult._get_collection()
+
+        report_query = {}
+        if options['report']:
+            if not ObjectId.is_valid(options['report']):
+                raise CommandError('--report must be a valid ObjectId')
+            report_query = {'_id': ObjectId(options['report'])}
+        else:
+            # Rows of reports that no longer exist
+            report_ids = db.testing_reports.distinct('_id')
+            removed = collection.delete_many({'report_id': {'$nin': report_ids}}).deleted_count
+            if removed:
+                self.stdout.write(f'  removed {removed} rows of deleted reports')
+            duplicates = self.remove_duplicate_rows(collection)
+            if duplicates:
+                self.stdout.write(f'  removed {duplicates} duplicate rows')
+
+        operations = []
+        welder_cache = {}
+        reports = 0
+        rows_written = 0
+        for report_doc in db.testing_reports.find(report_query).batch_size(options['batch_size']):
+            rows = build_result_rows(db, report_doc, welder_cache)
+            operations.extend(result_row_operations(report_doc['_id'], rows))
+            rows_written += len(rows)
+            reports += 1
+
+            if reports % options['batch_size'] == 0:
+                collection.bulk_write(operations, ordered=False)
+                operations = []
+                self.stdout.write(f'  {reports} reports')
+
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+        if not options['report']:
+            mark_results_rebuild_complete(db, reports)
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rows_written} results for {reports} testing reports.'))
+
+    def remove_duplicate_rows(self, collection):
+        """
+        Keep one row per (report_id, result_index); earlier delete-then-insert syncs could race
+        """
+        operations = []
+        duplicates = collection.aggregate([
+            {'$group': {'_id': {'report_id': '$report_id', 'result_index': '$result_index'}, 'ids': {'$push': '$_id'}}},
+            {'$match': {'ids.1': {'$exists': True}}}
+        ], allowDiskUse=True)
+        for group in duplicates:
+            operations.extend(DeleteOne({'_id': row_id}) for row_id in group['ids'][1:])
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+        return len(operations)
@@ -2,6 +2,8 @@ from mongoengine import Document, fields, EmbeddedDocument
 from datetime import datetime
 from bson import ObjectId
 
+from lims_backend.utilities.dates import parse_date_string
+
 
 class TestResult(EmbeddedDocument):
     """
@@ -13,6 +15,7 @@ class TestResult(EmbeddedDocument):
     iqama_number = fields.StringField(max_length=50, required=True)
     test_coupon_id = fields.StringField(max_length=100, required=True)
     date_of_inspection = fields.StringField(max_length=20)  # Date as string (YYYY-MM-DD format)
+    date_of_inspection_dt = fields.DateTimeField()  # Parsed shadow of date_of_inspection
     welding_processes = fields.StringField(max_length=200)
     type_of_welding = fields.StringField(max_length=100)  # manual/semi-auto
     backing = fields.StringField(max_length=50)  # with/without
@@ -60,14 +63,55 @@ class TestingReport(Document):
             'client_name',
             'results.welder_id',
             'results.welder_name',
+            'results.date_of_inspection_dt',
             'is_active',
             'created_at'
         ]
     }
     
     def save(self, *args, **kwargs):
+        for result in self.results:
+            result.date_of_inspection_dt = parse_date_string(result.date_of_inspection)
         self.updated_at = datetime.now()
         return super().save(*args, **kwargs)
         
     def __str__(self):
-        return f"Testing Report - {self.client_name} ({len(self.results)} welders)"
\ No newline at end of file
+        return f"Testing Report - {self.client_name} ({len(self.results)} welders)"
+
+class TestingReportResult(Document):
+    """
+    Flattened copy of one TestingReport result (see testingreports/results_index.py)
+    Rewritten whenever its report is created, updated or deactivated
+    """
+    report_id = fields.ObjectIdField(required=True)  # Reference to TestingReport._id
+    result_index = fields.IntField(default=0)  # Position in TestingReport.results
+    welder_id = fields.StringField(max_length=100)  # As entered on the report
+    welder_oid = fields.ObjectIdField()  # Reference to Welder._id when resolvable
+    welder_name = fields.StringField(max_length=200)
+    welder_name_norm = fields.StringField(max_length=200)
+    iqama_number = fields.StringField(max_length=50)
+    iqama_norm = fields.StringField(max_length=50)
+    test_coupon_id = fields.StringField(max_length=100)
+    result_status = fields.StringField(max_length=100)
+    result_status_norm = fields.StringField(max_length=100)
+    date_of_inspection = fields.StringField(max_length=20)
+    date_of_inspection_dt = fields.DateTimeField()
+    client_name = fields.StringField(max_length=200)
+    report_is_active = fields.BooleanField(default=True)
+    report_created_at = fields.DateTimeField()
+
+    meta = {
+        'collection': 'testing_report_results',
+        'indexes': [
+            'report_id',
+            'welder_id',
+            'welder_oid',
+            'welder_name_norm',
+            'iqama_norm',
+            'result_status_norm',
+            'date_of_inspection_dt'
+        ]
+    }
+
+    def __str__(self):
+        return f"{self.welder_name} - {self.result_status} ({self.report_id})"
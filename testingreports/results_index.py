@@ -0,0 +1,179 @@
+"""
+Flattened testing report results
+
+Each TestingReport embeds one result per welder, keyed by free-text welder
+id/name/iqama strings. Every result is also stored as its own document in the
+testing_report_results collection with the welder's ObjectId (when the
+welder id, operator id or iqama matches a welder), normalized name/iqama/
+status and the parsed inspection date, so per-welder history, searches and
+pass/fail analytics are indexed queries instead of report scans.
+
+Rows are upserted per (report_id, result_index) when their report is
+created, updated or deactivated, and rebuilt by `python manage.py
+rebuild_testing_report_results`, which records completion in the
+data_migrations collection. Until then the rows may miss older reports, so
+welder lookups keep querying the reports' embedded results
+(is_results_rebuild_complete).
+"""
+
+import re
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from mongoengine import connection
+from pymongo import DeleteMany, ReplaceOne
+
+from lims_backend.utilities.dates import parse_date_string
+
+from .models import TestingReportResult
+
+
+MIGRATION_ID = 'testing_report_results_rebuild'
+STATE_TTL_SECONDS = 60
+
+_rebuild_state = {}  # 'complete' -> (is complete, checked at)
+
+
+def is_results_rebuild_complete():
+    """
+    True once rebuild_testing_report_results has finished (cached per worker)
+    """
+    now = time.monotonic()
+    cached = _rebuild_state.get('complete')
+    if cached is not None and (cached[0] or now - cached[1] < STATE_TTL_SECONDS):
+        return cached[0]
+
+    try:
+        state = connection.get_db().data_migrations.find_one({'_id': MIGRATION_ID}, {'completed_at': 1})
+        complete = bool(state and state.get('completed_at'))
+    except Exception as e:
+        print(f"Error reading testing report results rebuild state: {e}")
+        complete = False
+    _rebuild_state['complete'] = (complete, now)
+    return complete
+
+
+def mark_results_rebuild_complete(db, report_count):
+    db.data_migrations.update_one(
+        {'_id': MIGRATION_ID},
+        {'$set': {'completed_at': datetime.now(), 'report_count': report_count}},
+        upsert=True
+    )
+    _rebuild_state.pop('complete', None)
+
+
+def normalize_text(value):
+    """
+    Lowercase with surrounding/repeated whitespace removed
+    """
+    return ' '.join(str(value or '').split()).lower()
+
+
+def normalize_iqama(value):
+    """
+    Iqama number without spaces or separators
+    """
+    return re.sub(r'[^0-9a-z]', '', str(value or '').lower())
+
+
+def contains_pattern(value, normalizer=normalize_text):
+    """
+    Regex condition matching normalized values that contain the (literal) search text
+    """
+    return {'$regex': re.escape(normalizer(value))}
+
+
+def resolve_welder_oid(db, welder_id, iqama_number='', cache=None):
+    """
+    Welder._id a result refers to: the welder id as an ObjectId, else the
+    operator id, else the iqama number. Returns: ObjectId or None
+    """
+    cache = {} if cache is None else cache
+    key = (welder_id or '', iqama_number or '')
+    if key in cache:
+        return cache[key]
+
+    welder_doc = None
+    if welder_id and ObjectId.is_valid(welder_id):
+        welder_doc = db.welders.find_one({'_id': ObjectId(welder_id)}, {'_id': 1})
+    if not welder_doc and welder_id:
+        welder_doc = db.welders.find_one({'operator_id': welder_id}, {'_id': 1})
+    if not welder_doc and iqama_number:
+        welder_doc = db.welders.find_one({'iqama': iqama_number}, {'_id': 1})
+
+    cache[key] = welder_doc['_id'] if welder_doc else None
+    return cache[key]
+
+
+def build_result_rows(db, report_doc, welder_cache=None):
+    """
+    Flattened rows for every result of a report
+    """
+    rows = []
+    for index, result in enumerate(report_doc.get('results') or []):
+        if not isinstance(result, dict):
+            continue
+        rows.append({
+            'report_id': report_doc['_id'],
+            'result_index': index,
+            'welder_id': result.get('welder_id', ''),
+            'welder_oid': resolve_welder_oid(db, result.get('welder_id'), result.get('iqama_number'), welder_cache),
+            'welder_name': result.get('welder_name', ''),
+            'welder_name_norm': normalize_text(result.get('welder_name')),
+            'iqama_number': result.get('iqama_number', ''),
+            'iqama_norm': normalize_iqama(result.get('iqama_number')),
+            'test_coupon_id': result.get('test_coupon_id', ''),
+            'result_status': result.get('result_status', ''),
+            'result_status_norm': normalize_text(result.get('result_status')),
+            'date_of_inspection': result.get('date_of_inspection', ''),
+            'date_of_inspection_dt': parse_date_string(result.get('date_of_inspection')),
+            'client_name': report_doc.get('client_name', ''),
+            'report_is_active': report_doc.get('is_active', True) is not False,
+            'report_created_at': report_doc.get('created_at')
+        })
+    return rows
+
+
+def result_row_operations(report_id, rows):
+    """
+    Bulk operations upserting the rows of a report by (report_id, result_index)
+    and removing rows of results the report no longer has
+    """
+    operations = [
+        ReplaceOne({'report_id': report_id, 'result_index': row['result_index']}, row, upsert=True)
+        for row in rows
+    ]
+    operations.append(DeleteMany({'report_id': report_id, 'result_index': {'$nin': [row['result_index'] for row in rows]}}))
+    return operations
+
+
+def sync_report_results(db, report_id):
+    """
+    Rewrite the flattened rows of one report (removes them if the report no longer exists)
+    Rows are replaced in place, so concurrent syncs of a report never leave duplicates.
+    Never raises, so callers can use it after a successful write.
+    """
+    try:
+        report_doc = db.testing_reports.find_one({'_id': report_id})
+        rows = build_result_rows(db, report_doc) if report_doc else []
+        TestingReportResult._get_collection().bulk_write(result_row_operations(report_id, rows), ordered=False)
+    except Exception as e:
+        print(f"Error syncing testing report results for report {report_id}: {e}")
+
+
+def welder_result_filter(welder_id):
+    """
+    Rows recorded for a welder, given its Welder._id string or the welder id used on reports
+    """
+    conditions = [{'welder_id': welder_id}]
+    if ObjectId.is_valid(welder_id):
+        conditions.append({'welder_oid': ObjectId(welder_id)})
+    return {'$or': conditions} if len(conditions) > 1 else conditions[0]
+
+
+def matching_report_ids(row_query):
+    """
+    Distinct report ids of the rows matching a query
+    """
+    return TestingReportResult._get_collection().distinct('report_id', row_query)
@@ -3,14 +3,20 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
+import re
 from datetime import datetime
 from bson import ObjectId
 from mongoengine import connection
 from mongoengine.errors import DoesNotExist, ValidationError
 
-from .models import TestingReport, TestResult
+from .models import TestingReport, TestResult, TestingReportResult
 from authentication.decorators import any_authenticated_user, welding_operations_required
 from lims_backend.utilities.pagination import get_pagination_params, create_pagination_response, paginate_queryset
+from lims_backend.utilities.dates import parse_date_string, apply_date_range_filters
+from .results_index import (
+    sync_report_results, welder_result_filter, matching_report_ids, contains_pattern, normalize_iqama,
+    is_results_rebuild_complete
+)
 
 
 @csrf_exempt
@@ -48,6 +54,13 @@ def testing_report_list(request):
                 query['prepared_by'] = {'$regex': prepared_by_search, '$options': 'i'}
             if welder_name_search:
                 query['results.welder_name'] = {'$regex': welder_name_search, '$options': 'i'}
+            try:
+                apply_date_range_filters(request, query, ('date_of_inspection',), list_field='results')
+            except ValueError as e:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': str(e)
+                }, status=400)
             
             # Add filtering based on is_active status
             if show_inactive:
@@ -173,6 +186,7 @@ def testing_report_list(request):
                 is_active=data.get('is_active', True)
             )
             testing_report.save()
+            sync_report_results(connection.get_db(), testing_report.id)
             
             return JsonResponse({
                 'status': 'success',
@@ -303,6 +317,7 @@ def testing_report_detail(request, object_id):
                             'iqama_number': result_data['iqama_number'],
                             'test_coupon_id': result_data['test_coupon_id'],
                             'date_of_inspection': result_data.get('date_of_inspection', ''),
+                            'date_of_inspection_dt': parse_date_string(result_data.get('date_of_inspection')),
                             'welding_processes': result_data.get('welding_processes', ''),
                             'type_of_welding': result_data.get('type_of_welding', ''),
                             'backing': result_data.get('backing', ''),
@@ -352,6 +367,7 @@ def testing_report_detail(request, object_id):
                         'status': 'error',
                         'message': 'No changes made'
                     }, status=400)
+                sync_report_results(db, obj_id)
                 
                 # Get updated testing report document
                 updated_report = testing_reports_collection.find_one({'_id': obj_id})
@@ -395,6 +411,7 @@ def testing_report_detail(request, object_id):
                     'status': 'error',
                     'message': 'Testing report not found'
                 }, status=404)
+            sync_report_results(db, obj_id)
             
             return JsonResponse({
                 'status': 'success',
@@ -425,6 +442,7 @@ def testing_report_search(request):
     - prepared_by: Search by prepared by field (case-insensitive)
     - welder_name: Search by welder name in results (case-insensitive)
     - welder_id: Search by welder ID in results
+    - date_of_inspection_from / date_of_inspection_to: Inspection date range of any result, YYYY-MM-DD inclusive
     - q: Global search across all text fields (client_name, prepared_by, welder_name, project_details, contract_details)
     """
     try:
@@ -441,20 +459,49 @@ def testing_report_search(request):
             query['client_name'] = {'$regex': client_name, '$options': 'i'}
         if prepared_by:
             query['prepared_by'] = {'$regex': prepared_by, '$options': 'i'}
-        if welder_name:
+        # Welder filters resolve to report ids through the flattened results,
+        # or match the embedded results until the rows have been rebuilt
+        results_indexed = is_results_rebuild_complete()
+        report_id_sets = []
+        if welder_name and not results_indexed:
             query['results.welder_name'] = {'$regex': welder_name, '$options': 'i'}
-        if welder_id:
+        elif welder_name:
+            report_id_sets.append(set(matching_report_ids({'welder_name_norm': contains_pattern(welder_name)})))
+        if welder_id and not results_indexed:
             query['results.welder_id'] = welder_id
+        elif welder_id:
+            report_id_sets.append(set(matching_report_ids(welder_result_filter(welder_id))))
+        if report_id_sets:
+            query['_id'] = {'$in': list(set.intersection(*report_id_sets))}
+        try:
+            apply_date_range_filters(request, query, ('date_of_inspection',), list_field='results')
+        except ValueError as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
         
         # Handle global search parameter 'q'
         if q:
             # Create OR conditions for global search across multiple fields
-            or_conditions = [
-                {'client_name': {'$regex': q, '$options': 'i'}},
-                {'results.welder_name': {'$regex': q, '$options': 'i'}},
-                {'results.welder_id': {'$regex': q, '$options': 'i'}},
-                {'results.iqama_number': {'$regex': q, '$options': 'i'}},
+            result_conditions = [
+                {'welder_name_norm': contains_pattern(q)},
+                {'welder_id': {'$regex': re.escape(q), '$options': 'i'}},
             ]
+            if normalize_iqama(q):
+                result_conditions.append({'iqama_norm': contains_pattern(q, normalize_iqama)})
+            if results_indexed:
+                or_conditions = [
+                    {'client_name': {'$regex': q, '$options': 'i'}},
+                    {'_id': {'$in': matching_report_ids({'$or': result_conditions})}},
+                ]
+            else:
+                or_conditions = [
+                    {'client_name': {'$regex': q, '$options': 'i'}},
+                    {'results.welder_name': {'$regex': q, '$options': 'i'}},
+                    {'results.welder_id': {'$regex': q, '$options': 'i'}},
+                    {'results.iqama_number': {'$regex': q, '$options': 'i'}},
+                ]
             
             if query:
                 # If we have other specific filters, combine them with AND
@@ -552,13 +599,21 @@ def testing_report_stats(request):
             total_welders_count = stat.get('total_welders', 0)
             break
         
+        # Pass/fail counts of active reports from the flattened results
+        result_status_stats = TestingReportResult._get_collection().aggregate([
+            {'$match': {'report_is_active': True}},
+            {'$group': {'_id': '$result_status_norm', 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1}}
+        ])
+        
         return JsonResponse({
             'status': 'success',
             'data': {
                 'total_reports': total_reports,
                 'total_welders_tested': total_welders_count,
                 'client_distribution': list(client_stats),
-                'preparer_distribution': list(preparer_stats)
+                'preparer_distribution': list(preparer_stats),
+                'result_status_distribution': list(result_status_stats)
             }
         })
         
@@ -575,24 +630,45 @@ def testing_report_stats(request):
 def testing_report_by_welder(request, welder_id):
     """
     Get all testing reports for a specific welder
+    welder_id: the welder id entered on the reports, or the Welder's ObjectId
     """
     try:
-        # Use raw query to find testing reports by welder
+        # Find the welder's results in the flattened index, then load their reports by id
         db = connection.get_db()
         testing_reports_collection = db.testing_reports
         
-        testing_reports = testing_reports_collection.find({
-            'results.welder_id': welder_id
-        })
+        # First result of the welder in each report
+        result_indexes = {}
+        if is_results_rebuild_complete():
+            rows = TestingReportResult._get_collection().find(
+                welder_result_filter(welder_id),
+                {'report_id': 1, 'result_index': 1}
+            ).sort([('report_created_at', -1), ('result_index', 1)])
+            for row in rows:
+                result_indexes.setdefault(row['report_id'], row.get('result_index', 0))
+            
+            reports = {
+                report_doc['_id']: report_doc
+                for report_doc in testing_reports_collection.find({'_id': {'$in': list(result_indexes)}})
+            }
+        else:
+            # Rows may not cover older reports until rebuild_testing_report_results has run
+            reports = {}
+            for report_doc in testing_reports_collection.find({'results.welder_id': welder_id}):
+                reports[report_doc['_id']] = report_doc
+                result_indexes[report_doc['_id']] = next(
+                    (index for index, result in enumerate(report_doc.get('results', []))
+                     if isinstance(result, dict) and result.get('welder_id') == welder_id),
+                    0
+                )
         
         data = []
-        for report_doc in testing_reports:
-            # Find the specific welder's result in this report
-            welder_result = None
-            for result in report_doc.get('results', []):
-                if result.get('welder_id') == welder_id:
-                    welder_result = result
-                    break
+        for report_id, result_index in result_indexes.items():
+            report_doc = reports.get(report_id)
+            if not report_doc:
+                continue
+            results = report_doc.get('results', [])
+            welder_result = results[result_index] if result_index < len(results) else None
             
             data.append({
                 'id': str(report_doc.get('_id', '')),
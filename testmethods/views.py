@@ -10,7 +10,9 @@ from mongoengine.errors import DoesNotExist, ValidationError
 
 from .models import TestMethod
 from authentication.decorators import any_authenticated_user
+from certificates.snapshots import invalidate_certificate_snapshots
 from lims_backend.utilities.pagination import get_pagination_params, create_pagination_response, paginate_queryset
+from lims_backend.utilities.soft_delete import active_filter
 
 
 def safe_datetime_format(dt_value):
@@ -52,7 +54,7 @@ def test_method_list(request):
             db = connection.get_db()
             test_methods_collection = db.test_methods
             
-            query = {'$or': [{'is_active': True}, {'is_active': {'$exists': False}}]}
+            query = active_filter('test_methods')
             
             # Get total count for pagination
             total_records = test_methods_collection.count_documents(query)
@@ -150,7 +152,7 @@ def test_method_detail(request, test_method_id):
         
         # Use raw query to find test method by ObjectId (legacy data support)
         try:
-            query = {'_id': ObjectId(test_method_id), '$or': [{'is_active': True}, {'is_active': {'$exists': False}}]}
+            query = {'_id': ObjectId(test_method_id), **active_filter('test_methods')}
             test_method_doc = test_methods_collection.find_one(query)
         except Exception:
             return JsonResponse({
@@ -196,7 +198,7 @@ def test_method_detail(request, test_method_id):
                 
                 # Update the document (legacy data support)
                 result = test_methods_collection.update_one(
-                    {'_id': ObjectId(test_method_id), '$or': [{'is_active': True}, {'is_active': {'$exists': False}}]},
+                    {'_id': ObjectId(test_method_id), **active_filter('test_methods')},
                     {'$set': update_doc}
                 )
                 
@@ -206,6 +208,8 @@ def test_method_detail(request, test_method_id):
                         'message': 'No changes made'
                     }, status=400)
                 
+                invalidate_certificate_snapshots('test_method_ids', [test_method_id])
+                
                 # Get updated test method document
                 updated_test_method = test_methods_collection.find_one({'_id': ObjectId(test_method_id)})
                 
@@ -234,7 +238,7 @@ def test_method_detail(request, test_method_id):
         elif request.method == 'DELETE':
             # Soft delete by setting is_active to False (legacy data support)
             result = test_methods_collection.update_one(
-                {'_id': ObjectId(test_method_id), '$or': [{'is_active': True}, {'is_active': {'$exists': False}}]},
+                {'_id': ObjectId(test_method_id), **active_filter('test_methods')},
                 {'$set': {'is_active': False, 'updatedAt': datetime.now()}}
             )
             
@@ -274,7 +278,7 @@ def test_method_search(request):
         has_image = request.GET.get('hasImage', '')
         
         # Build query for raw MongoDB (legacy data support)
-        query = {'$or': [{'is_active': True}, {'is_active': {'$exists': False}}]}
+        query = active_filter('test_methods')
         if test_name:
             query['test_name'] = {'$regex': test_name, '$options': 'i'}
         if test_description:
@@ -332,7 +336,7 @@ def test_method_stats(request):
         test_methods_collection = db.test_methods
         
         # Use raw query to count test methods (legacy data support)
-        base_query = {'$or': [{'is_active': True}, {'is_active': {'$exists': False}}]}
+        base_query = active_filter('test_methods')
         total_test_methods = test_methods_collection.count_documents(base_query)
         
         # Count by hasImage flag (legacy data support)
@@ -14,13 +14,14 @@ class WelderCard(Document):
     law_name = fields.StringField(max_length=200, required=True)
     card_no = fields.StringField(max_length=100, required=True)
     attributes = fields.DictField()  # JSON field for flexible attributes
+    welder_snapshot = fields.DictField()  # Denormalized welder/card fields (welders/snapshots.py)
     is_active = fields.BooleanField(default=True)
     created_at = fields.DateTimeField(default=datetime.now)
     updated_at = fields.DateTimeField(default=datetime.now)
     
     meta = {
         'collection': 'welder_cards',
-        'indexes': ['welder_id', 'card_no', 'company', 'is_active', 'created_at']
+        'indexes': ['welder_id', 'card_no', 'company', 'is_active', 'created_at', 'welder_snapshot.operator_id']
     }
     
     def save(self, *args, **kwargs):
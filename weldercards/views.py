@@ -12,6 +12,9 @@ from mongoengine.errors import DoesNotExist, ValidationError
 from mongoengine import connection
 from authentication.decorators import any_authenticated_user, welding_operations_required
 from lims_backend.utilities.pagination import get_pagination_params, create_pagination_response, paginate_queryset
+from lims_backend.utilities.images import get_thumbnail_url
+from lims_backend.utilities.media_urls import media_url
+from welders.snapshots import refresh_card_snapshots, welder_card_conditions
 
 
 @csrf_exempt
@@ -48,23 +51,9 @@ def welder_card_list(request):
             if company_search:
                 query['company'] = {'$regex': company_search, '$options': 'i'}
             
-            # Handle welder name search - need to find welder IDs first using raw MongoDB query
+            # Welder name is matched on the embedded welder snapshot
             if welder_name_search:
-                try:
-                    welders_collection = db.welders
-                    welder_docs = welders_collection.find({
-                        'operator_name': {'$regex': welder_name_search, '$options': 'i'}
-                    })
-                    welder_ids = [doc['_id'] for doc in welder_docs]
-                    
-                    if welder_ids:
-                        query['welder_id'] = {'$in': welder_ids}
-                    else:
-                        # No welders found with that name, return empty result
-                        query['welder_id'] = {'$in': []}
-                except Exception:
-                    # If there's an error, return empty result
-                    query['welder_id'] = {'$in': []}
+                query['$or'] = welder_card_conditions(db, welder_name_search)
             
             # Add filtering based on is_active status
             if show_inactive:
@@ -85,25 +74,28 @@ def welder_card_list(request):
             data = []
             
             for card_doc in welder_cards:
-                # Get welder information using raw MongoDB query
-                welder_name = "Unknown Welder"
+                # Welder information from the embedded snapshot (cards written before snapshots look it up)
                 welder_info = {}
                 try:
-                    welders_collection = db.welders
-                    welder_obj_id = card_doc.get('welder_id')
-                    if welder_obj_id:
+                    welder_doc = None
+                    snapshot = card_doc.get('welder_snapshot')
+                    if snapshot and snapshot.get('welder_id'):
+                        welder_doc = {**snapshot, '_id': snapshot['welder_id']}
+                    elif card_doc.get('welder_id'):
+                        welder_obj_id = card_doc.get('welder_id')
                         # Handle both ObjectId and string welder_id
                         if isinstance(welder_obj_id, str):
                             welder_obj_id = ObjectId(welder_obj_id)
-                        welder_doc = welders_collection.find_one({'_id': welder_obj_id})
-                        if welder_doc:
-                            welder_info = {
-                                'welder_id': str(welder_doc.get('_id', '')),
-                                'operator_name': welder_doc.get('operator_name', ''),
-                                'operator_id': welder_doc.get('operator_id', ''),
-                                'iqama': welder_doc.get('iqama', ''),
-                                'profile_image': f"{settings.MEDIA_URL}{welder_doc.get('profile_image', '')}" if welder_doc.get('profile_image', '') else None
-                            }
+                        welder_doc = db.welders.find_one({'_id': welder_obj_id})
+                    if welder_doc:
+                        welder_info = {
+                            'welder_id': str(welder_doc.get('_id', '')),
+                            'operator_name': welder_doc.get('operator_name', ''),
+                            'operator_id': welder_doc.get('operator_id', ''),
+                            'iqama': welder_doc.get('iqama', ''),
+                            'profile_image': media_url(welder_doc.get('profile_image', '')),
+                            'thumbnail_url': get_thumbnail_url(welder_doc.get('profile_image', ''))
+                        }
                 except Exception:
                     pass
                 
@@ -168,6 +160,7 @@ def welder_card_list(request):
                 is_active=data.get('is_active', True)
             )
             welder_card.save()
+            refresh_card_snapshots(welder_card.id)
             
             return JsonResponse({
                 'status': 'success',
@@ -247,8 +240,8 @@ def welder_card_detail(request, object_id):
                             'operator_id': welder_doc.get('operator_id', ''),
                             'iqama': welder_doc.get('iqama', ''),
                             # f"{settings.MEDIA_URL}{welder.profile_image}" if welder.profile_image else None
-                            'profile_image': f"{settings.MEDIA_URL}{welder_doc.get('profile_image', '')}" if welder_doc.get('profile_image', '') else None
-                            
+                            'profile_image': media_url(welder_doc.get('profile_image', '')),
+                            'thumbnail_url': get_thumbnail_url(welder_doc.get('profile_image', ''))
                         }
             except Exception:
                 pass
@@ -327,6 +320,9 @@ def welder_card_detail(request, object_id):
                         'message': 'No changes made'
                     }, status=400)
                 
+                if any(field in update_doc for field in ('welder_id', 'card_no', 'company')):
+                    refresh_card_snapshots(object_id)
+                
                 # Get updated welder card document
                 updated_card = welder_cards_collection.find_one({'_id': object_id})
                 
@@ -437,17 +433,8 @@ def welder_card_search(request):
                 {'law_name': {'$regex': q, '$options': 'i'}}
             ]
             
-            # Add welder name to global search
-            try:
-                welders_collection = db.welders
-                welder_docs = welders_collection.find({
-                    'operator_name': {'$regex': q, '$options': 'i'}
-                })
-                welder_ids = [doc['_id'] for doc in welder_docs]
-                if welder_ids:
-                    or_conditions.append({'welder_id': {'$in': welder_ids}})
-            except Exception:
-                pass
+            # Welder name is matched on the embedded welder snapshot
+            or_conditions.extend(welder_card_conditions(connection.get_db(), q))
             
             if query:
                 # If we have other specific filters, combine them with AND
@@ -466,12 +453,12 @@ def welder_card_search(request):
         
         data = []
         for card_doc in welder_cards:
-            # Get welder information using raw MongoDB query
-            welder_name = "Unknown Welder"
+            # Welder name from the embedded snapshot (cards written before snapshots look it up)
+            welder_name = (card_doc.get('welder_snapshot') or {}).get('operator_name') or "Unknown Welder"
             try:
                 welders_collection = db.welders
                 welder_obj_id = card_doc.get('welder_id')
-                if welder_obj_id:
+                if welder_obj_id and not card_doc.get('welder_snapshot'):
                     # Handle both ObjectId and string welder_id
                     if isinstance(welder_obj_id, str):
                         welder_obj_id = ObjectId(welder_obj_id)
@@ -2,6 +2,8 @@ from mongoengine import Document, fields, EmbeddedDocument
 from datetime import datetime
 from bson import ObjectId
 
+from lims_backend.utilities.dates import parse_date_string
+
 
 class TestResult(EmbeddedDocument):
     """
@@ -27,9 +29,11 @@ class WelderCertificate(Document):
     Welder operator qualification certificate model
     """
     welder_card_id = fields.ObjectIdField(required=True)  # Reference to WelderCard._id
+    welder_snapshot = fields.DictField()  # Denormalized welder/card fields (welders/snapshots.py)
     certificate_no = fields.StringField(max_length=100)  # Certificate number
     company = fields.StringField(max_length=200)  # Company name
     date_of_test = fields.StringField(max_length=20)  # Date as string (YYYY-MM-DD format)
+    date_of_test_dt = fields.DateTimeField()  # Parsed shadow of date_of_test
     identification_of_wps_pqr = fields.StringField(max_length=200)
     qualification_standard = fields.StringField(max_length=200)
     base_metal_specification = fields.StringField(max_length=200)
@@ -48,9 +52,12 @@ class WelderCertificate(Document):
         'collection': 'welder_certificates',
         'indexes': [
             'welder_card_id', 
+            'welder_snapshot.welder_id',
+            'welder_snapshot.operator_id',
             'certificate_no',
             'company',
             'date_of_test', 
+            'date_of_test_dt',
             'qualification_standard',
             'law_name',
             'tested_by',
@@ -60,6 +67,7 @@ class WelderCertificate(Document):
     }
     
     def save(self, *args, **kwargs):
+        self.date_of_test_dt = parse_date_string(self.date_of_test)
         self.updated_at = datetime.now()
         return super().save(*args, **kwargs)
         
@@ -14,6 +14,9 @@ from weldercards.models import WelderCard
 from welders.models import Welder
 from authentication.decorators import any_authenticated_user, welding_operations_required
 from lims_backend.utilities.pagination import get_pagination_params, create_pagination_response, paginate_queryset
+from welders.snapshots import snapshot_for_card, welder_card_payload, linked_card_conditions
+from lims_backend.utilities.media_urls import media_url
+from lims_backend.utilities.dates import parse_date_string, apply_date_range_filters
 
 
 @csrf_exempt
@@ -51,6 +54,13 @@ def welder_certificate_list(request):
                 query['tested_by'] = {'$regex': tested_by_search, '$options': 'i'}
             if date_of_test_search:
                 query['date_of_test'] = date_of_test_search
+            try:
+                apply_date_range_filters(request, query, ('date_of_test',))
+            except ValueError as e:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': str(e)
+                }, status=400)
             
             # Add filtering based on is_active status
             if show_inactive:
@@ -71,49 +81,8 @@ def welder_certificate_list(request):
             data = []
             
             for cert_doc in certificates:
-                # Get welder card and welder information
-                welder_card_info = {
-                    'card_id': str(cert_doc.get('welder_card_id', '')),
-                    'card_no': 'Unknown',
-                    'company': 'Unknown',
-                    'welder_info': {
-                        'welder_id': '',
-                        'operator_name': 'Unknown Welder',
-                        'operator_id': '',
-                        'iqama': ''
-                    }
-                }
-                
-                try:
-                    # Get welder card information
-                    welder_cards_collection = db.welder_cards
-                    card_obj_id = cert_doc.get('welder_card_id')
-                    if card_obj_id:
-                        if isinstance(card_obj_id, str):
-                            card_obj_id = ObjectId(card_obj_id)
-                        card_doc = welder_cards_collection.find_one({'_id': card_obj_id})
-                        if card_doc:
-                            welder_card_info.update({
-                                'card_no': card_doc.get('card_no', 'Unknown'),
-                                'company': card_doc.get('company', 'Unknown')
-                            })
-                            
-                            # Get welder information
-                            welder_obj_id = card_doc.get('welder_id')
-                            if welder_obj_id:
-                                if isinstance(welder_obj_id, str):
-                                    welder_obj_id = ObjectId(welder_obj_id)
-                                welders_collection = db.welders
-                                welder_doc = welders_collection.find_one({'_id': welder_obj_id})
-                                if welder_doc:
-                                    welder_card_info['welder_info'] = {
-                                        'welder_id': str(welder_doc.get('_id', '')),
-                                        'operator_name': welder_doc.get('operator_name', 'Unknown Welder'),
-                                        'operator_id': welder_doc.get('operator_id', ''),
-                                        'iqama': welder_doc.get('iqama', '')
-                                    }
-                except Exception:
-                    pass
+                # Welder card and welder information from the embedded snapshot
+                welder_card_info = welder_card_payload(db, cert_doc)
                 
                 data.append({
                     'id': str(cert_doc.get('_id', '')),
@@ -195,6 +164,7 @@ def welder_certificate_list(request):
             
             certificate = WelderCertificate(
                 welder_card_id=ObjectId(data['welder_card_id']),
+                welder_snapshot=snapshot_for_card(connection.get_db(), welder_card.id) or {},
                 certificate_no=data.get('certificate_no', ''),
                 company=data.get('company', ''),
                 date_of_test=data.get('date_of_test', ''),
@@ -314,7 +284,7 @@ def welder_certificate_detail(request, object_id):
                                     'operator_name': welder_doc.get('operator_name', 'Unknown Welder'),
                                     'operator_id': welder_doc.get('operator_id', ''),
                                     'iqama': welder_doc.get('iqama', ''),
-                                     'profile_image': f"{settings.MEDIA_URL}{welder_doc.get('profile_image', '')}" if welder_doc.get('profile_image', '') else None
+                                     'profile_image': media_url(welder_doc.get('profile_image', ''))
                                 }
             except Exception:
                 pass
@@ -356,6 +326,7 @@ def welder_certificate_detail(request, object_id):
                     try:
                         welder_card = WelderCard.objects.get(id=ObjectId(data['welder_card_id']))
                         update_doc['welder_card_id'] = ObjectId(data['welder_card_id'])
+                        update_doc['welder_snapshot'] = snapshot_for_card(db, welder_card.id) or {}
                     except (DoesNotExist, Exception):
                         return JsonResponse({
                             'status': 'error',
@@ -369,6 +340,7 @@ def welder_certificate_detail(request, object_id):
                     update_doc['company'] = data['company']
                 if 'date_of_test' in data:
                     update_doc['date_of_test'] = data['date_of_test']
+                    update_doc['date_of_test_dt'] = parse_date_string(data['date_of_test'])
                 if 'identification_of_wps_pqr' in data:
                     update_doc['identification_of_wps_pqr'] = data['identification_of_wps_pqr']
                 if 'qualification_standard' in data:
@@ -504,6 +476,7 @@ def welder_certificate_search(request):
     - certificate_no: Search by certificate number (case-insensitive)
     - company: Search by company name (case-insensitive)
     - card_no: Search by card number (case-insensitive)
+    - date_of_test_from / date_of_test_to: Date range, YYYY-MM-DD inclusive
     - q: Global search across all text fields (certificate_no, company, qualification_standard, law_name, tested_by, witnessed_by, welder_name)
     """
     try:
@@ -517,53 +490,28 @@ def welder_certificate_search(request):
         query = {}
         if certificate_no:
             query['certificate_no'] = {'$regex': certificate_no, '$options': 'i'}
+        try:
+            apply_date_range_filters(request, query, ('date_of_test',))
+        except ValueError as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
         
         # Use raw query to search
         db = connection.get_db()
         certificates_collection = db.welder_certificates
-        welder_cards_collection = db.welder_cards
         
         # Handle global search parameter 'q'
         if q:
             # Create OR conditions for global search across multiple fields
+            # Welder and card fields are matched on the embedded welder snapshot (no joins)
             or_conditions = [
                 {'certificate_no': {'$regex': q, '$options': 'i'}},
                 {'company': {'$regex': q, '$options': 'i'}},
-                {'card_no': {'$regex': q, '$options': 'i'}},
+                *linked_card_conditions(db, q, welder_fields=('operator_name', 'operator_id'), card_fields=('card_no', 'company'))
             ]
             
-            # Add welder name to global search
-            try:
-                welders_collection = db.welders
-                welder_docs = welders_collection.find({
-                    '$or': [
-                        {'operator_name': {'$regex': q, '$options': 'i'}},
-                        {'operator_id': {'$regex': q, '$options': 'i'}}
-                    ]
-                })
-                welder_ids = [doc['_id'] for doc in welder_docs]
-                if welder_ids:
-                    # Find welder cards for these welders
-                    welder_cards_for_welders = welder_cards_collection.find({
-                        'welder_id': {'$in': welder_ids}
-                    }, {'_id': 1})
-                    welder_card_ids = [card['_id'] for card in welder_cards_for_welders]
-                    if welder_card_ids:
-                        or_conditions.append({'welder_card_id': {'$in': welder_card_ids}})
-            except Exception:
-                pass
-            
-            # Add company to global search
-            try:
-                company_cards = welder_cards_collection.find({
-                    'company': {'$regex': q, '$options': 'i'}
-                }, {'_id': 1})
-                company_card_ids = [card['_id'] for card in company_cards]
-                if company_card_ids:
-                    or_conditions.append({'welder_card_id': {'$in': company_card_ids}})
-            except Exception:
-                pass
-            
             if query:
                 # If we have other specific filters, combine them with AND
                 query['$and'] = [
@@ -573,83 +521,17 @@ def welder_certificate_search(request):
             else:
                 query['$or'] = or_conditions
         
-        # Handle company and card_no searches that require joining with welder_cards
-        if company or card_no:
-            # First, find welder cards that match the company/card_no criteria
-            card_query = {}
-            if company:
-                card_query['company'] = {'$regex': company, '$options': 'i'}
-            if card_no:
-                card_query['card_no'] = {'$regex': card_no, '$options': 'i'}
-            
-            # Get matching card IDs
-            matching_cards = welder_cards_collection.find(card_query, {'_id': 1})
-            matching_card_ids = [card['_id'] for card in matching_cards]
-            
-            if not matching_card_ids:
-                # No matching cards found, return empty result
-                return JsonResponse({
-                    'status': 'success',
-                    'data': [],
-                    'total': 0,
-                    'filters_applied': {
-                        'certificate_no': certificate_no,
-                        'company': company,
-                        'card_no': card_no,
-                        'q': q
-                    }
-                })
-            
-            # Add card ID filter to the main query
-            query['welder_card_id'] = {'$in': matching_card_ids}
+        # Company and card_no of the welder card are read from the embedded snapshot
+        for field, value in (('company', company), ('card_no', card_no)):
+            if value:
+                query.setdefault('$and', []).append({'$or': linked_card_conditions(db, value, card_fields=(field,))})
         
         certificates = certificates_collection.find(query)
         
         data = []
         for cert_doc in certificates:
-            # Get welder card and welder information
-            welder_card_info = {
-                'card_id': str(cert_doc.get('welder_card_id', '')),
-                'card_no': 'Unknown',
-                'company': 'Unknown',
-                'welder_info': {
-                    'welder_id': '',
-                    'operator_name': 'Unknown Welder',
-                    'operator_id': '',
-                    'iqama': ''
-                }
-            }
-            
-            try:
-                # Get welder card information
-                welder_cards_collection = db.welder_cards
-                card_obj_id = cert_doc.get('welder_card_id')
-                if card_obj_id:
-                    if isinstance(card_obj_id, str):
-                        card_obj_id = ObjectId(card_obj_id)
-                    card_doc = welder_cards_collection.find_one({'_id': card_obj_id})
-                    if card_doc:
-                        welder_card_info.update({
-                            'card_no': card_doc.get('card_no', 'Unknown'),
-                            'company': card_doc.get('company', 'Unknown')
-                        })
-                        
-                        # Get welder information
-                        welder_obj_id = card_doc.get('welder_id')
-                        if welder_obj_id:
-                            if isinstance(welder_obj_id, str):
-                                welder_obj_id = ObjectId(welder_obj_id)
-                            welders_collection = db.welders
-                            welder_doc = welders_collection.find_one({'_id': welder_obj_id})
-                            if welder_doc:
-                                welder_card_info['welder_info'] = {
-                                    'welder_id': str(welder_doc.get('_id', '')),
-                                    'operator_name': welder_doc.get('operator_name', 'Unknown Welder'),
-                                    'operator_id': welder_doc.get('operator_id', ''),
-                                    'iqama': welder_doc.get('iqama', '')
-                                }
-            except Exception:
-                pass
+            # Welder card and welder information from the embedded snapshot
+            welder_card_info = welder_card_payload(db, cert_doc)
             
             data.append({
                 'id': str(cert_doc.get('_id', '')),
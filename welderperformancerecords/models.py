@@ -2,6 +2,12 @@ from mongoengine import Document, fields, EmbeddedDocument
 from datetime import datetime
 from bson import ObjectId
 
+from lims_backend.utilities.dates import parse_date_string
+
+
+# Date string fields with a '<field>_dt' DateTimeField shadow
+PERFORMANCE_RECORD_DATE_FIELDS = ('date_of_issue', 'date_of_welding')
+
 
 class PerformanceTestResult(EmbeddedDocument):
     """
@@ -27,10 +33,13 @@ class WelderPerformanceRecord(Document):
     Welder operator performance qualification record model
     """
     welder_card_id = fields.ObjectIdField(required=True)  # Reference to WelderCard._id
+    welder_snapshot = fields.DictField()  # Denormalized welder/card fields (welders/snapshots.py)
     certificate_no = fields.StringField(max_length=100)  # Certificate number
     wps_followed_date = fields.StringField(max_length=20)  # Date as string (YYYY-MM-DD format)
     date_of_issue = fields.StringField(max_length=20)  # Date as string (YYYY-MM-DD format)
     date_of_welding = fields.StringField(max_length=20)  # Date as string (YYYY-MM-DD format)
+    date_of_issue_dt = fields.DateTimeField()  # Parsed shadows of the date strings
+    date_of_welding_dt = fields.DateTimeField()
     joint_weld_type = fields.StringField(max_length=200)
     base_metal_spec = fields.StringField(max_length=200)
     base_metal_p_no = fields.StringField(max_length=100)
@@ -52,9 +61,13 @@ class WelderPerformanceRecord(Document):
         'collection': 'welder_performance_records',
         'indexes': [
             'welder_card_id', 
+            'welder_snapshot.welder_id',
+            'welder_snapshot.operator_id',
             'certificate_no',
             'date_of_welding', 
             'date_of_issue',
+            'date_of_welding_dt',
+            'date_of_issue_dt',
             'law_name',
             'tested_by',
             'is_active',
@@ -63,6 +76,8 @@ class WelderPerformanceRecord(Document):
     }
     
     def save(self, *args, **kwargs):
+        for field in PERFORMANCE_RECORD_DATE_FIELDS:
+            setattr(self, f'{field}_dt', parse_date_string(getattr(self, field)))
         self.updated_at = datetime.now()
         return super().save(*args, **kwargs)
         
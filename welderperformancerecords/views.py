@@ -9,11 +9,14 @@ from bson import ObjectId
 from mongoengine import connection
 from mongoengine.errors import DoesNotExist, ValidationError
 
-from .models import WelderPerformanceRecord, PerformanceTestResult, PerformanceTestingVariable
+from .models import WelderPerformanceRecord, PerformanceTestResult, PerformanceTestingVariable, PERFORMANCE_RECORD_DATE_FIELDS
 from weldercards.models import WelderCard
 from welders.models import Welder
 from authentication.decorators import any_authenticated_user, welding_operations_required
 from lims_backend.utilities.pagination import get_pagination_params, create_pagination_response, paginate_queryset
+from welders.snapshots import snapshot_for_card, welder_card_payload, linked_card_conditions
+from lims_backend.utilities.media_urls import media_url
+from lims_backend.utilities.dates import shadow_dates, apply_date_range_filters
 
 
 @csrf_exempt
@@ -51,6 +54,13 @@ def welder_performance_record_list(request):
                 query['tested_by'] = {'$regex': tested_by_search, '$options': 'i'}
             if date_of_welding_search:
                 query['date_of_welding'] = date_of_welding_search
+            try:
+                apply_date_range_filters(request, query, ('date_of_welding', 'date_of_issue'))
+            except ValueError as e:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': str(e)
+                }, status=400)
             
             # Add filtering based on is_active status
             if show_inactive:
@@ -71,49 +81,8 @@ def welder_performance_record_list(request):
             data = []
             
             for record_doc in performance_records:
-                # Get welder card and welder information
-                welder_card_info = {
-                    'card_id': str(record_doc.get('welder_card_id', '')),
-                    'card_no': 'Unknown',
-                    'company': 'Unknown',
-                    'welder_info': {
-                        'welder_id': '',
-                        'operator_name': 'Unknown Welder',
-                        'operator_id': '',
-                        'iqama': ''
-                    }
-                }
-                
-                try:
-                    # Get welder card information
-                    welder_cards_collection = db.welder_cards
-                    card_obj_id = record_doc.get('welder_card_id')
-                    if card_obj_id:
-                        if isinstance(card_obj_id, str):
-                            card_obj_id = ObjectId(card_obj_id)
-                        card_doc = welder_cards_collection.find_one({'_id': card_obj_id})
-                        if card_doc:
-                            welder_card_info.update({
-                                'card_no': card_doc.get('card_no', 'Unknown'),
-                                'company': card_doc.get('company', 'Unknown')
-                            })
-                            
-                            # Get welder information
-                            welder_obj_id = card_doc.get('welder_id')
-                            if welder_obj_id:
-                                if isinstance(welder_obj_id, str):
-                                    welder_obj_id = ObjectId(welder_obj_id)
-                                welders_collection = db.welders
-                                welder_doc = welders_collection.find_one({'_id': welder_obj_id})
-                                if welder_doc:
-                                    welder_card_info['welder_info'] = {
-                                        'welder_id': str(welder_doc.get('_id', '')),
-                                        'operator_name': welder_doc.get('operator_name', 'Unknown Welder'),
-                                        'operator_id': welder_doc.get('operator_id', ''),
-                                        'iqama': welder_doc.get('iqama', '')
-                                    }
-                except Exception:
-                    pass
+                # Welder card and welder information from the embedded snapshot
+                welder_card_info = welder_card_payload(db, record_doc)
                 
                 data.append({
                     'id': str(record_doc.get('_id', '')),
@@ -209,6 +178,7 @@ def welder_performance_record_list(request):
             
             performance_record = WelderPerformanceRecord(
                 welder_card_id=ObjectId(data['welder_card_id']),
+                welder_snapshot=snapshot_for_card(connection.get_db(), welder_card.id) or {},
                 certificate_no=data.get('certificate_no', ''),
                 wps_followed_date=data.get('wps_followed_date', ''),
                 date_of_issue=data.get('date_of_issue', ''),
@@ -332,7 +302,7 @@ def welder_performance_record_detail(request, object_id):
                                     'operator_name': welder_doc.get('operator_name', 'Unknown Welder'),
                                     'operator_id': welder_doc.get('operator_id', ''),
                                     'iqama': welder_doc.get('iqama', ''),
-                                     'profile_image': f"{settings.MEDIA_URL}{welder_doc.get('profile_image', '')}" if welder_doc.get('profile_image', '') else None
+                                     'profile_image': media_url(welder_doc.get('profile_image', ''))
                                 }
             except Exception:
                 pass
@@ -380,6 +350,7 @@ def welder_performance_record_detail(request, object_id):
                     try:
                         welder_card = WelderCard.objects.get(id=ObjectId(data['welder_card_id']))
                         update_doc['welder_card_id'] = ObjectId(data['welder_card_id'])
+                        update_doc['welder_snapshot'] = snapshot_for_card(db, welder_card.id) or {}
                     except (DoesNotExist, Exception):
                         return JsonResponse({
                             'status': 'error',
@@ -397,6 +368,7 @@ def welder_performance_record_detail(request, object_id):
                 for field in update_fields:
                     if field in data:
                         update_doc[field] = data[field]
+                update_doc.update(shadow_dates(update_doc, PERFORMANCE_RECORD_DATE_FIELDS))
                 
                 # Handle tests array update
                 if 'tests' in data:
@@ -530,6 +502,7 @@ def welder_performance_record_search(request):
     - date_of_welding: Search by date of welding (exact match)
     - welder_card_id: Search by welder card ID
     - certificate_no: Search by certificate number (case-insensitive)
+    - date_of_welding_from / date_of_welding_to (also date_of_issue_*): Date range, YYYY-MM-DD inclusive
     - q: Global search across all text fields (certificate_no, law_name, tested_by, witnessed_by, joint_weld_type, base_metal_spec, welder_name)
     """
     try:
@@ -540,6 +513,13 @@ def welder_performance_record_search(request):
         query = {}
         if certificate_no:
             query['certificate_no'] = {'$regex': certificate_no, '$options': 'i'}
+        try:
+            apply_date_range_filters(request, query, ('date_of_welding', 'date_of_issue'))
+        except ValueError as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
         
         # Use raw query to search
         db = connection.get_db()
@@ -547,32 +527,12 @@ def welder_performance_record_search(request):
         # Handle global search parameter 'q'
         if q:
             # Create OR conditions for global search across multiple fields
+            # Welder name/id are matched on the embedded welder snapshot (no joins)
             or_conditions = [
                 {'certificate_no': {'$regex': q, '$options': 'i'}},
+                *linked_card_conditions(db, q, welder_fields=('operator_name', 'operator_id'))
             ]
             
-            # Add welder name to global search
-            try:
-                welders_collection = db.welders
-                welder_docs = welders_collection.find({
-                    '$or': [
-                        {'operator_name': {'$regex': q, '$options': 'i'}},
-                        {'operator_id': {'$regex': q, '$options': 'i'}}
-                    ]
-                })
-                welder_ids = [doc['_id'] for doc in welder_docs]
-                if welder_ids:
-                    # Find welder cards for these welders
-                    welder_cards_collection = db.welder_cards
-                    welder_cards_for_welders = welder_cards_collection.find({
-                        'welder_id': {'$in': welder_ids}
-                    }, {'_id': 1})
-                    welder_card_ids = [card['_id'] for card in welder_cards_for_welders]
-                    if welder_card_ids:
-                        or_conditions.append({'welder_card_id': {'$in': welder_card_ids}})
-            except Exception:
-                pass
-            
             if query:
                 # If we have other specific filters, combine them with AND
                 query['$and'] = [
@@ -588,49 +548,8 @@ def welder_performance_record_search(request):
         
         data = []
         for record_doc in performance_records:
-            # Get welder card and welder information
-            welder_card_info = {
-                'card_id': str(record_doc.get('welder_card_id', '')),
-                'card_no': 'Unknown',
-                'company': 'Unknown',
-                'welder_info': {
-                    'welder_id': '',
-                    'operator_name': 'Unknown Welder',
-                    'operator_id': '',
-                    'iqama': ''
-                }
-            }
-            
-            try:
-                # Get welder card information
-                welder_cards_collection = db.welder_cards
-                card_obj_id = record_doc.get('welder_card_id')
-                if card_obj_id:
-                    if isinstance(card_obj_id, str):
-                        card_obj_id = ObjectId(card_obj_id)
-                    card_doc = welder_cards_collection.find_one({'_id': card_obj_id})
-                    if card_doc:
-                        welder_card_info.update({
-                            'card_no': card_doc.get('card_no', 'Unknown'),
-                            'company': card_doc.get('company', 'Unknown')
-                        })
-                        
-                        # Get welder information
-                        welder_obj_id = card_doc.get('welder_id')
-                        if welder_obj_id:
-                            if isinstance(welder_obj_id, str):
-                                welder_obj_id = ObjectId(welder_obj_id)
-                            welders_collection = db.welders
-                            welder_doc = welders_collection.find_one({'_id': welder_obj_id})
-                            if welder_doc:
-                                welder_card_info['welder_info'] = {
-                                    'welder_id': str(welder_doc.get('_id', '')),
-                                    'operator_name': welder_doc.get('operator_name', 'Unknown Welder'),
-                                    'operator_id': welder_doc.get('operator_id', ''),
-                                    'iqama': welder_doc.get('iqama', '')
-                                }
-            except Exception:
-                pass
+            # Welder card and welder information from the embedded snapshot
+            welder_card_info = welder_card_payload(db, record_doc)
             
             data.append({
                 'id': str(record_doc.get('_id', '')),
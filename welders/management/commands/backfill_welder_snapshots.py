@@ -0,0 +1,68 @@
+"""
+Backfill the embedded welder snapshot on welder cards, welder certificates
+and welder performance records (see welders/snapshots.py)
+
+Snapshots are built per card (one welder lookup per card) and written to the
+card and every certificate/performance record linked to it. Completion is
+recorded in data_migrations; name/company filters stop matching through the
+legacy welder lookup after that (see welders/snapshots.py).
+
+Usage:
+    python manage.py backfill_welder_snapshots
+    python manage.py backfill_welder_snapshots --missing-only
+"""
+
+from django.core.management.base import BaseCommand
+from mongoengine import connection
+from pymongo import UpdateOne, UpdateMany
+
+from welders.snapshots import (
+    SNAPSHOT_FIELD, DEPENDENT_COLLECTIONS, WELDER_FIELDS, build_welder_snapshot, mark_snapshot_backfill_complete
+)
+
+
+class Command(BaseCommand):
+    help = 'Write denormalized welder snapshots on cards, certificates and performance records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing-only', action='store_true', help='Only cards (and their documents) without a snapshot')
+        parser.add_argument('--batch-size', type=int, default=500, help='Cards per bulk write (default 500)')
+
+    def handle(self, *args, **options):
+        db = connection.get_db()
+        card_query = {SNAPSHOT_FIELD: {'$exists': False}} if options['missing_only'] else {}
+
+        card_operations = []
+        dependent_operations = {collection_name: [] for collection_name in DEPENDENT_COLLECTIONS}
+        welder_cache = {}
+        processed = 0
+
+        for card_doc in db.welder_cards.find(card_query, {'welder_id': 1, 'card_no': 1, 'company': 1}).batch_size(options['batch_size']):
+            welder_oid = card_doc.get('welder_id')
+            if welder_oid not in welder_cache:
+                welder_cache[welder_oid] = db.welders.find_one({'_id': welder_oid}, {field: 1 for field in WELDER_FIELDS}) if welder_oid else None
+            snapshot = build_welder_snapshot(welder_cache[welder_oid], card_doc)
+
+            card_operations.append(UpdateOne({'_id': card_doc['_id']}, {'$set': {SNAPSHOT_FIELD: snapshot}}))
+            for collection_name in DEPENDENT_COLLECTIONS:
+                dependent_operations[collection_name].append(
+                    UpdateMany({'welder_card_id': card_doc['_id']}, {'$set': {SNAPSHOT_FIELD: snapshot}})
+                )
+            processed += 1
+
+            if len(card_operations) >= options['batch_size']:
+                self.flush(db, card_operations, dependent_operations)
+                self.stdout.write(f'  {processed} cards')
+
+        self.flush(db, card_operations, dependent_operations)
+        mark_snapshot_backfill_complete(db, processed)
+        self.stdout.write(self.style.SUCCESS(f'Wrote welder snapshots for {processed} welder cards.'))
+
+    def flush(self, db, card_operations, dependent_operations):
+        if card_operations:
+            db.welder_cards.bulk_write(card_operations, ordered=False)
+            card_operations.clear()
+        for collection_name, operations in dependent_operations.items():
+            if operations:
+                db[collection_name].bulk_write(operations, ordered=False)
+                operations.clear()
@@ -0,0 +1,194 @@
+"""
+Welder profile loader
+
+Loads everything needed to review a welder's qualification in one call:
+the welder, cards, welder certificates, performance records, PQRs (summary
+fields only) and testing report results. Independent queries run
+concurrently on a shared thread pool; certificates and performance records
+wait only for the card ids. Each task runs in a copy of the request's
+context so MongoDB command instrumentation still attributes its commands to
+the request.
+"""
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from bson import ObjectId
+from django.conf import settings
+from mongoengine import connection
+
+from lims_backend.utilities.images import get_thumbnail_url
+from lims_backend.utilities.media_urls import media_url
+from pqrs.summary import list_projection, with_summary
+from testingreports.models import TestingReportResult
+from testingreports.results_index import is_results_rebuild_complete
+from .snapshots import SNAPSHOT_FIELD
+
+
+_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'WELDER_PROFILE_WORKERS', 6), thread_name_prefix='welder-profile')
+
+
+def _submit(function, *args):
+    """
+    Run a function on the pool inside a copy of the caller's context
+    """
+    context = contextvars.copy_context()
+    return _executor.submit(context.run, function, *args)
+
+
+def serialize(value):
+    """
+    Convert ObjectIds and datetimes in a document to JSON friendly values
+    """
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {('id' if key == '_id' else key): serialize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [serialize(item) for item in value]
+    return value
+
+
+def _active_filter(include_inactive):
+    return {} if include_inactive else {'is_active': {'$ne': False}}
+
+
+def _load_cards(db, welder_oid, include_inactive):
+    return list(db.welder_cards.find(
+        {'welder_id': welder_oid, **_active_filter(include_inactive)},
+        {SNAPSHOT_FIELD: 0}
+    ).sort('created_at', -1))
+
+
+def _load_card_documents(db, collection_name, welder_oid, card_ids, include_inactive):
+    """
+    Certificates/performance records of the welder's cards (snapshot match covers
+    documents whose card was moved to another welder after the cards were read)
+    """
+    query = {
+        '$or': [{'welder_card_id': {'$in': card_ids}}, {f'{SNAPSHOT_FIELD}.welder_id': welder_oid}],
+        **_active_filter(include_inactive)
+    }
+    return list(db[collection_name].find(query, {SNAPSHOT_FIELD: 0}).sort('created_at', -1))
+
+
+def _load_pqrs(db, welder_oid, include_inactive):
+    return [with_summary(pqr_doc) for pqr_doc in db.pqrs.find(
+        {'welder_id': welder_oid, **_active_filter(include_inactive)},
+        list_projection()
+    ).sort('created_at', -1)]
+
+
+def _scan_testing_results(db, welder_keys):
+    """
+    Testing report results recorded for the welder, from the reports' embedded
+    results (results.welder_id holds the welder's ObjectId string or operator id)
+    """
+    reports = db.testing_reports.find(
+        {'results.welder_id': {'$in': welder_keys}, 'is_active': {'$ne': False}},
+        {'client_name': 1, 'prepared_by': 1, 'project_details': 1, 'results': 1, 'created_at': 1}
+    ).sort('created_at', -1)
+
+    results = []
+    for report_doc in reports:
+        for result in report_doc.get('results', []):
+            if isinstance(result, dict) and result.get('welder_id') in welder_keys:
+                results.append({
+                    'report_id': report_doc['_id'],
+                    'client_name': report_doc.get('client_name', ''),
+                    'prepared_by': report_doc.get('prepared_by', ''),
+                    'project_details': report_doc.get('project_details', ''),
+                    'report_created_at': report_doc.get('created_at'),
+                    'result': result
+                })
+    return results
+
+
+def _load_testing_results(db, welder_oid, welder_keys):
+    """
+    Testing report results recorded for the welder, found through the flattened
+    testing_report_results rows (matched by resolved Welder._id, or by the
+    welder's ObjectId string / operator id as entered on the report)
+    Scans the reports until rebuild_testing_report_results has completed.
+    """
+    if not is_results_rebuild_complete():
+        return _scan_testing_results(db, welder_keys)
+
+    rows = list(TestingReportResult._get_collection().find(
+        {'$or': [{'welder_oid': welder_oid}, {'welder_id': {'$in': welder_keys}}], 'report_is_active': True},
+        {'report_id': 1, 'result_index': 1}
+    ).sort('date_of_inspection_dt', -1))
+
+    reports = {
+        report_doc['_id']: report_doc
+        for report_doc in db.testing_reports.find(
+            {'_id': {'$in': list({row['report_id'] for row in rows})}},
+            {'client_name': 1, 'prepared_by': 1, 'project_details': 1, 'results': 1, 'created_at': 1}
+        )
+    }
+
+    results = []
+    for row in rows:
+        report_doc = reports.get(row['report_id'])
+        report_results = report_doc.get('results', []) if report_doc else []
+        if row.get('result_index', 0) >= len(report_results):
+            continue
+        results.append({
+            'report_id': report_doc['_id'],
+            'client_name': report_doc.get('client_name', ''),
+            'prepared_by': report_doc.get('prepared_by', ''),
+            'project_details': report_doc.get('project_details', ''),
+            'report_created_at': report_doc.get('created_at'),
+            'result': report_results[row.get('result_index', 0)]
+        })
+    return results
+
+
+def load_welder_profile(welder_oid, include_inactive=False):
+    """
+    Returns: profile dict, or None if the welder does not exist
+    """
+    db = connection.get_db()
+    welder_doc = db.welders.find_one({'_id': welder_oid})
+    if not welder_doc:
+        return None
+
+    welder_keys = [str(welder_oid)] + ([welder_doc['operator_id']] if welder_doc.get('operator_id') else [])
+    cards_future = _submit(_load_cards, db, welder_oid, include_inactive)
+    pqrs_future = _submit(_load_pqrs, db, welder_oid, include_inactive)
+    results_future = _submit(_load_testing_results, db, welder_oid, welder_keys)
+
+    cards = cards_future.result()
+    card_ids = [card['_id'] for card in cards]
+    certificates_future = _submit(_load_card_documents, db, 'welder_certificates', welder_oid, card_ids, include_inactive)
+    records_future = _submit(_load_card_documents, db, 'welder_performance_records', welder_oid, card_ids, include_inactive)
+
+    certificates = certificates_future.result()
+    performance_records = records_future.result()
+    pqrs = pqrs_future.result()
+    testing_results = results_future.result()
+
+    profile_image = welder_doc.get('profile_image', '')
+    return {
+        'welder': {
+            **serialize({key: value for key, value in welder_doc.items() if key != 'profile_image'}),
+            'profile_image': profile_image,
+            'profile_image_url': media_url(profile_image),
+            'thumbnail_url': get_thumbnail_url(profile_image)
+        },
+        'cards': serialize(cards),
+        'certificates': serialize(certificates),
+        'performance_records': serialize(performance_records),
+        'pqrs': serialize(pqrs),
+        'testing_results': serialize(testing_results),
+        'counts': {
+            'cards': len(cards),
+            'certificates': len(certificates),
+            'performance_records': len(performance_records),
+            'pqrs': len(pqrs),
+            'testing_results': len(testing_results)
+        }
+    }
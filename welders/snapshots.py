@@ -0,0 +1,215 @@
+"""
+Denormalized welder snapshots
+
+Welder cards, welder certificates and welder performance records carry a
+`welder_snapshot` subdocument with the welder and card fields their lists and
+searches display (operator name/id, iqama, profile image, card number,
+company). Lists read the snapshot instead of joining card -> welder per row.
+
+Snapshots are rewritten in bulk when a welder (welder_detail, image
+management) or a card (welder_card_detail) changes, set on create, and
+backfilled by `python manage.py backfill_welder_snapshots`, which records
+completion in the data_migrations collection. Until then, name/company
+filters also match through the legacy welder -> card lookup
+(welder_card_conditions, linked_card_conditions).
+"""
+
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from mongoengine import connection
+
+from lims_backend.utilities.media_urls import media_url
+
+
+SNAPSHOT_FIELD = 'welder_snapshot'
+WELDER_FIELDS = ('operator_name', 'operator_id', 'iqama', 'profile_image')
+CARD_FIELDS = ('card_no', 'company')
+DEPENDENT_COLLECTIONS = ('welder_certificates', 'welder_performance_records')
+MIGRATION_ID = 'welder_snapshot_backfill'
+STATE_TTL_SECONDS = 60
+
+_backfill_state = {}  # 'complete' -> (is complete, checked at)
+
+
+def _to_object_id(value):
+    if isinstance(value, ObjectId):
+        return value
+    if not value:
+        return None
+    try:
+        return ObjectId(value)
+    except Exception:
+        return None
+
+
+def build_welder_snapshot(welder_doc, card_doc=None):
+    """
+    Snapshot of a welder (and the card it is reached through, if given)
+    """
+    welder_doc = welder_doc or {}
+    snapshot = {'welder_id': welder_doc.get('_id')}
+    for field in WELDER_FIELDS:
+        snapshot[field] = welder_doc.get(field, '') or ''
+    if card_doc is not None:
+        snapshot['card_id'] = card_doc.get('_id')
+        for field in CARD_FIELDS:
+            snapshot[field] = card_doc.get(field, '') or ''
+    return snapshot
+
+
+def snapshot_for_card(db, card_id):
+    """
+    Build the snapshot for documents linked to a welder card
+    Returns: snapshot dict or None if the card does not exist
+    """
+    card_oid = _to_object_id(card_id)
+    card_doc = db.welder_cards.find_one({'_id': card_oid}, {'welder_id': 1, 'card_no': 1, 'company': 1}) if card_oid else None
+    if not card_doc:
+        return None
+    welder_oid = _to_object_id(card_doc.get('welder_id'))
+    welder_doc = db.welders.find_one({'_id': welder_oid}, {field: 1 for field in WELDER_FIELDS}) if welder_oid else None
+    return build_welder_snapshot(welder_doc, card_doc)
+
+
+def refresh_welder_snapshots(welder_id, db=None):
+    """
+    Push a welder's current fields to its cards and their certificates/performance records
+    Never raises, so callers can use it after a successful write.
+    """
+    try:
+        db = db or connection.get_db()
+        welder_oid = _to_object_id(welder_id)
+        welder_doc = db.welders.find_one({'_id': welder_oid}, {field: 1 for field in WELDER_FIELDS})
+        if not welder_doc:
+            return
+        welder_fields = {f'{SNAPSHOT_FIELD}.{field}': welder_doc.get(field, '') or '' for field in WELDER_FIELDS}
+
+        card_ids = [card['_id'] for card in db.welder_cards.find({'welder_id': welder_oid}, {'_id': 1})]
+        if not card_ids:
+            return
+        # Documents without a snapshot yet keep falling back to joins until backfilled
+        has_snapshot = {SNAPSHOT_FIELD: {'$exists': True}}
+        db.welder_cards.update_many({'_id': {'$in': card_ids}, **has_snapshot}, {'$set': welder_fields})
+        for collection_name in DEPENDENT_COLLECTIONS:
+            db[collection_name].update_many({'welder_card_id': {'$in': card_ids}, **has_snapshot}, {'$set': welder_fields})
+    except Exception as e:
+        print(f"Error refreshing welder snapshots for welder {welder_id}: {e}")
+
+
+def refresh_card_snapshots(card_id, db=None):
+    """
+    Rewrite the snapshot of a welder card and of the certificates/performance records linked to it
+    Never raises, so callers can use it after a successful write.
+    """
+    try:
+        db = db or connection.get_db()
+        card_oid = _to_object_id(card_id)
+        snapshot = snapshot_for_card(db, card_oid)
+        if snapshot is None:
+            return
+        db.welder_cards.update_one({'_id': card_oid}, {'$set': {SNAPSHOT_FIELD: snapshot}})
+        for collection_name in DEPENDENT_COLLECTIONS:
+            db[collection_name].update_many({'welder_card_id': card_oid}, {'$set': {SNAPSHOT_FIELD: snapshot}})
+    except Exception as e:
+        print(f"Error refreshing welder snapshots for card {card_id}: {e}")
+
+
+def is_snapshot_backfill_complete():
+    """
+    True once backfill_welder_snapshots has finished (cached per worker)
+    """
+    now = time.monotonic()
+    cached = _backfill_state.get('complete')
+    if cached is not None and (cached[0] or now - cached[1] < STATE_TTL_SECONDS):
+        return cached[0]
+
+    try:
+        state = connection.get_db().data_migrations.find_one({'_id': MIGRATION_ID}, {'completed_at': 1})
+        complete = bool(state and state.get('completed_at'))
+    except Exception as e:
+        print(f"Error reading welder snapshot backfill state: {e}")
+        complete = False
+    _backfill_state['complete'] = (complete, now)
+    return complete
+
+
+def mark_snapshot_backfill_complete(db, card_count):
+    db.data_migrations.update_one(
+        {'_id': MIGRATION_ID},
+        {'$set': {'completed_at': datetime.now(), 'card_count': card_count}},
+        upsert=True
+    )
+    _backfill_state.pop('complete', None)
+
+
+def _regex(value):
+    return {'$regex': value, '$options': 'i'}
+
+
+def _legacy_welder_ids(db, value, welder_fields):
+    return [
+        welder_doc['_id']
+        for welder_doc in db.welders.find({'$or': [{field: _regex(value)} for field in welder_fields]}, {'_id': 1})
+    ]
+
+
+def welder_card_conditions(db, value, welder_fields=('operator_name',)):
+    """
+    $or conditions matching welder cards whose welder fields contain value
+    Until the backfill has completed, cards without a snapshot are matched through their welder.
+    """
+    conditions = [{f'{SNAPSHOT_FIELD}.{field}': _regex(value)} for field in welder_fields]
+    if not is_snapshot_backfill_complete():
+        conditions.append({'welder_id': {'$in': _legacy_welder_ids(db, value, welder_fields)}})
+    return conditions
+
+
+def linked_card_conditions(db, value, welder_fields=(), card_fields=()):
+    """
+    $or conditions matching certificates/performance records whose welder or card fields contain value
+    Until the backfill has completed, documents without a snapshot are matched through their card.
+    """
+    conditions = [{f'{SNAPSHOT_FIELD}.{field}': _regex(value)} for field in welder_fields + card_fields]
+    if not is_snapshot_backfill_complete():
+        card_conditions = [{field: _regex(value)} for field in card_fields]
+        if welder_fields:
+            card_conditions.append({'welder_id': {'$in': _legacy_welder_ids(db, value, welder_fields)}})
+        card_ids = [card_doc['_id'] for card_doc in db.welder_cards.find({'$or': card_conditions}, {'_id': 1})]
+        conditions.append({'welder_card_id': {'$in': card_ids}})
+    return conditions
+
+
+def welder_info_from_snapshot(snapshot, include_image=False):
+    """
+    The 'welder_info' payload of list responses, from a snapshot
+    """
+    welder_info = {
+        'welder_id': str(snapshot.get('welder_id') or ''),
+        'operator_name': snapshot.get('operator_name') or 'Unknown Welder',
+        'operator_id': snapshot.get('operator_id', ''),
+        'iqama': snapshot.get('iqama', '')
+    }
+    if include_image:
+        profile_image = snapshot.get('profile_image', '')
+        welder_info['profile_image'] = media_url(profile_image)
+    return welder_info
+
+
+def welder_card_payload(db, doc):
+    """
+    The 'welder_card_info' payload of certificate/performance record lists
+    Reads the document's snapshot; documents written before snapshots existed
+    fall back to looking up the card and welder.
+    """
+    snapshot = doc.get(SNAPSHOT_FIELD)
+    if not snapshot:
+        snapshot = snapshot_for_card(db, doc.get('welder_card_id')) or {}
+    return {
+        'card_id': str(doc.get('welder_card_id', '')),
+        'card_no': snapshot.get('card_no') or 'Unknown',
+        'company': snapshot.get('company') or 'Unknown',
+        'welder_info': welder_info_from_snapshot(snapshot)
+    }
+
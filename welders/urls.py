@@ -10,4 +10,5 @@ urlpatterns = [
     path('stats/', views.welder_stats, name='welder_stats'),            # GET: Welder statistics
     path('<str:object_id>/', views.welder_detail, name='welder_detail'), # GET/PUT/DELETE: Welder details
     path('<str:object_id>/image/', views.welder_image_management, name='welder_image_management'), # POST/DELETE: Image management
+    path('<str:object_id>/profile/', views.welder_profile, name='welder_profile'), # GET: Full welder profile
 ]
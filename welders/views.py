@@ -10,10 +10,16 @@ import json
 import os
 import uuid
 from datetime import datetime
+from bson import ObjectId
 from .models import Welder
+from .snapshots import refresh_welder_snapshots
+from .profile import load_welder_profile
 from mongoengine.errors import DoesNotExist, ValidationError
 from authentication.decorators import any_authenticated_user, welding_operations_required
 from lims_backend.utilities.pagination import get_pagination_params, create_pagination_response, paginate_queryset
+from lims_backend.utilities.multipart import parse_multipart_data as parse_multipart_body, MultiPartParserError
+from lims_backend.utilities.images import generate_derivatives, delete_derivatives, get_thumbnail_url
+from lims_backend.utilities.media_urls import media_url
 
 
 def handle_image_upload(image_file, welder_id=None):
@@ -40,8 +46,12 @@ def handle_image_upload(image_file, welder_id=None):
         for chunk in image_file.chunks():
             destination.write(chunk)
     
+    # Generate the thumbnail up front
+    relative_path = os.path.join('welders', unique_filename)
+    generate_derivatives(relative_path)
+    
     # Return relative path for database storage
-    return os.path.join('welders', unique_filename)
+    return relative_path
 
 
 def delete_old_image(image_path):
@@ -53,47 +63,20 @@ def delete_old_image(image_path):
             full_path = os.path.join(settings.MEDIA_ROOT, image_path)
             if os.path.exists(full_path):
                 os.remove(full_path)
+            delete_derivatives(image_path)
         except Exception as e:
             print(f"Error deleting old image: {e}")
 
 
 def parse_multipart_data(request):
     """
-    Parse multipart form data for PUT requests using Django's built-in utilities
+    Parse multipart form data for POST/PUT requests without buffering the whole body
     """
-    if request.content_type and 'multipart/form-data' in request.content_type:
-        try:
-            # Use Django's built-in multipart parser with proper setup
-            from django.http.multipartparser import MultiPartParser
-            from django.core.files.uploadhandler import MemoryFileUploadHandler
-            from django.http import QueryDict
-            from io import BytesIO
-            
-            # Create upload handlers
-            upload_handlers = [MemoryFileUploadHandler()]
-            
-            # Create a file-like object from the request body
-            body_file = BytesIO(request.body)
-            
-            # Parse the multipart data
-            parser = MultiPartParser(request.META, body_file, upload_handlers)
-            parsed_data, files = parser.parse()
-            
-            # Convert QueryDict to regular dict for easier handling
-            form_data = {}
-            for key, value in parsed_data.items():
-                if isinstance(value, list) and len(value) == 1:
-                    form_data[key] = value[0]
-                else:
-                    form_data[key] = value
-            
-            return form_data, files
-            
-        except Exception as e:
-            print(f"Error parsing multipart data: {e}")
-            return {}, {}
-    
-    return None, None
+    try:
+        return parse_multipart_body(request)
+    except MultiPartParserError as e:
+        print(f"Error parsing multipart data: {e}")
+        return {}, {}
 
 
 @csrf_exempt
@@ -135,7 +118,8 @@ def welder_list(request):
                     'operator_id': welder.operator_id,
                     'iqama': welder.iqama,
                     'profile_image': welder.profile_image,
-                    'profile_image_url': f"{settings.MEDIA_URL}{welder.profile_image}" if welder.profile_image else None,
+                    'profile_image_url': media_url(welder.profile_image),
+                    'thumbnail_url': get_thumbnail_url(welder.profile_image),
                     'is_active': welder.is_active,
                     'created_at': welder.created_at.isoformat(),
                     'updated_at': welder.updated_at.isoformat()
@@ -223,7 +207,7 @@ def welder_list(request):
                         'operator_id': welder.operator_id,
                         'iqama': welder.iqama,
                         'profile_image': welder.profile_image,
-                        'profile_image_url': f"{settings.MEDIA_URL}{welder.profile_image}" if welder.profile_image else None
+                        'profile_image_url': media_url(welder.profile_image)
                     }
                 }, status=201)
             
@@ -258,7 +242,7 @@ def welder_list(request):
                         'operator_id': welder.operator_id,
                         'iqama': welder.iqama,
                         'profile_image': welder.profile_image,
-                        'profile_image_url': f"{settings.MEDIA_URL}{welder.profile_image}" if welder.profile_image else None
+                        'profile_image_url': media_url(welder.profile_image)
                     }
                 }, status=201)
             
@@ -311,7 +295,8 @@ def welder_detail(request, object_id):
                     'operator_id': welder.operator_id,
                     'iqama': welder.iqama,
                     'profile_image': welder.profile_image,
-                    'profile_image_url': f"{settings.MEDIA_URL}{welder.profile_image}" if welder.profile_image else None,
+                    'profile_image_url': media_url(welder.profile_image),
+                    'thumbnail_url': get_thumbnail_url(welder.profile_image),
                     'is_active': welder.is_active,
                     'created_at': welder.created_at.isoformat(),
                     'updated_at': welder.updated_at.isoformat()
@@ -371,6 +356,7 @@ def welder_detail(request, object_id):
                     if update_doc:
                         welder.update(**update_doc)
                         welder.reload()
+                        refresh_welder_snapshots(welder.id)
                     
                     return JsonResponse({
                         'status': 'success',
@@ -381,7 +367,7 @@ def welder_detail(request, object_id):
                             'operator_id': welder.operator_id,
                             'iqama': welder.iqama,
                             'profile_image': welder.profile_image,
-                            'profile_image_url': f"{settings.MEDIA_URL}{welder.profile_image}" if welder.profile_image else None,
+                            'profile_image_url': media_url(welder.profile_image),
                             'is_active': welder.is_active,
                             'created_at': welder.created_at.isoformat(),
                             'updated_at': welder.updated_at.isoformat()
@@ -420,6 +406,7 @@ def welder_detail(request, object_id):
                         welder.update(**update_doc)
                         # Refresh the welder object to get updated data
                         welder.reload()
+                        refresh_welder_snapshots(welder.id)
                     
                     return JsonResponse({
                         'status': 'success',
@@ -430,7 +417,7 @@ def welder_detail(request, object_id):
                             'operator_id': welder.operator_id,
                             'iqama': welder.iqama,
                             'profile_image': welder.profile_image,
-                            'profile_image_url': f"{settings.MEDIA_URL}{welder.profile_image}" if welder.profile_image else None,
+                            'profile_image_url': media_url(welder.profile_image),
                             'is_active': welder.is_active,
                             'created_at': welder.created_at.isoformat(),
                             'updated_at': welder.updated_at.isoformat()
@@ -535,7 +522,8 @@ def welder_search(request):
                 'operator_id': welder.operator_id,
                 'iqama': welder.iqama,
                 'profile_image': welder.profile_image,
-                'profile_image_url': f"{settings.MEDIA_URL}{welder.profile_image}" if welder.profile_image else None,
+                'profile_image_url': media_url(welder.profile_image),
+                'thumbnail_url': get_thumbnail_url(welder.profile_image),
                 'is_active': welder.is_active,
                 'created_at': welder.created_at.isoformat(),
                 'updated_at': welder.updated_at.isoformat()
@@ -757,6 +745,7 @@ def welder_image_management(request, object_id):
                     updated_at=datetime.now()
                 )
                 welder.reload()
+                refresh_welder_snapshots(welder.id)
                 
                 return JsonResponse({
                     'status': 'success',
@@ -764,7 +753,7 @@ def welder_image_management(request, object_id):
                     'data': {
                         'id': str(welder.id),
                         'profile_image': welder.profile_image,
-                        'profile_image_url': f"{settings.MEDIA_URL}{welder.profile_image}",
+                        'profile_image_url': media_url(welder.profile_image),
                         'updated_at': welder.updated_at.isoformat()
                     }
                 })
@@ -792,6 +781,7 @@ def welder_image_management(request, object_id):
                 updated_at=datetime.now()
             )
             welder.reload()
+            refresh_welder_snapshots(welder.id)
             
             return JsonResponse({
                 'status': 'success',
@@ -813,4 +803,41 @@ def welder_image_management(request, object_id):
         return JsonResponse({
             'status': 'error',
             'message': str(e)
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@any_authenticated_user
+def welder_profile(request, object_id):
+    """
+    Full welder profile in one response: welder, cards, certificates,
+    performance records, PQRs (summary fields) and testing report results
+    Query params: include_inactive=true to include soft-deleted documents
+    """
+    try:
+        try:
+            object_id = ObjectId(object_id)
+        except Exception as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'Invalid ObjectId format: {str(e)}'
+            }, status=400)
+
+        include_inactive = request.GET.get('include_inactive', '').lower() == 'true'
+        profile = load_welder_profile(object_id, include_inactive=include_inactive)
+        if profile is None:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Welder not found'
+            }, status=404)
+
+        return JsonResponse({
+            'status': 'success',
+            'data': profile
+        })
+
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)